@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+'''
+Mide el tiempo de arranque del camino de lectura de `configurador`.
+
+Se mide el tiempo real de importar el modulo configurador en un interprete
+nuevo (lo que paga la UI cada vez que ejecuta `configurador`) y se verifica
+que no se importen los modulos que solo necesita `configurador --set`. Si el
+interprete soporta `-X importtime` (Python >= 3.7) se muestran ademas los
+modulos mas costosos.
+
+Devuelve codigo de salida distinto de cero si falla la importacion o si se
+supera el presupuesto:
+
+    python benchmarks/bench_arranque.py --presupuesto 150
+'''
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# modulos que no deben importarse en el camino de lectura
+MODULOS_PROHIBIDOS = (
+    'jinja2',
+    'configparser',
+    'netcop.configurador.config',
+    'netcop.configurador.plantillas',
+)
+
+IMPORTAR = 'import netcop.configurador.configurador'
+VERIFICAR = IMPORTAR + '''
+import sys
+print(",".join(m for m in %r if m in sys.modules))
+''' % (MODULOS_PROHIBIDOS,)
+
+
+def ejecutar(codigo, *opciones):
+    '''
+    Ejecuta `codigo` en un interprete nuevo. Devuelve tupla (codigo de
+    salida, salida, errores).
+    '''
+    comando = [sys.executable] + list(opciones) + ['-c', codigo]
+    proceso = subprocess.Popen(comando, cwd=RAIZ, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    salida, errores = proceso.communicate()
+    return proceso.returncode, salida, errores
+
+
+def fallo(codigo, retorno, errores):
+    '''
+    Devuelve el mensaje de error de una ejecucion de `codigo` que termino
+    con codigo de salida `retorno`.
+    '''
+    ultima = (errores.decode('utf-8').strip().splitlines() or [''])[-1]
+    return '%r termino con codigo %d: %s' % (codigo.strip().splitlines()[0],
+                                             retorno, ultima)
+
+
+def medir(codigo, repeticiones):
+    '''
+    Devuelve la mediana del tiempo real, en milisegundos, de ejecutar
+    `codigo` en un interprete nuevo. Lanza RuntimeError si la ejecucion
+    falla, ya que un error en la importacion la haria parecer rapida.
+    '''
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.time()
+        retorno, _, errores = ejecutar(codigo)
+        tiempos.append((time.time() - inicio) * 1000)
+        if retorno:
+            raise RuntimeError(fallo(codigo, retorno, errores))
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2]
+
+
+def importtime(cantidad):
+    '''
+    Devuelve los `cantidad` modulos con mayor tiempo acumulado de importacion
+    segun `-X importtime`, o una lista vacia si no esta soportado.
+    '''
+    if sys.version_info < (3, 7):
+        return []
+    _, _, salida = ejecutar(IMPORTAR, '-X', 'importtime')
+    modulos = []
+    for linea in salida.decode('utf-8').splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        _, acumulado, modulo = linea[len('import time:'):].split('|')
+        modulos.append((int(acumulado) / 1000.0, modulo.strip()))
+    return sorted(modulos, reverse=True)[:cantidad]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeticiones', type=int, default=15)
+    parser.add_argument('--presupuesto', type=float, default=None,
+                        help='tiempo maximo permitido en milisegundos')
+    args = parser.parse_args()
+
+    try:
+        base = medir('pass', args.repeticiones)
+        total = medir(IMPORTAR, args.repeticiones)
+    except RuntimeError as e:
+        print('ERROR: %s' % e)
+        return 1
+    print('interprete vacio    %8.1f ms' % base)
+    print('camino de lectura   %8.1f ms' % total)
+    for acumulado, modulo in importtime(10):
+        print('  %8.1f ms  %s' % (acumulado, modulo))
+
+    errores = []
+    retorno, salida, error = ejecutar(VERIFICAR)
+    importados = salida.decode('utf-8').strip()
+    if retorno:
+        errores.append(fallo(VERIFICAR, retorno, error))
+    elif importados:
+        errores.append('se importaron modulos innecesarios: %s' % importados)
+    if args.presupuesto is not None and total > args.presupuesto:
+        errores.append('%.1f ms supera el presupuesto de %.1f ms' %
+                       (total, args.presupuesto))
+    for error in errores:
+        print('ERROR: %s' % error)
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
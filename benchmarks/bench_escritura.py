@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+'''
+Compara el costo de escribir los archivos de configuracion con
+`escritura.escribir()` contra el ciclo de escritura anterior
+(`open(path, 'w')` sin sincronizar) y contra un fsync por archivo.
+
+Para obtener valores representativos se debe ejecutar sobre el mismo
+almacenamiento que utiliza el equipo, por ejemplo:
+
+    python benchmarks/bench_escritura.py --directorio /etc/netcop/bench
+'''
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from netcop.configurador import escritura  # noqa
+
+# tamanio aproximado de br0, resolv.conf y netcop.config
+ARCHIVOS = (
+    ('br0', b'x' * 400),
+    ('resolv.conf', b'x' * 300),
+    ('netcop.config', b'x' * 1100),
+)
+
+
+def ciclo_anterior(archivos):
+    for path, contenido in archivos:
+        with open(path, 'wb') as f:
+            f.write(contenido)
+
+
+def fsync_por_archivo(archivos):
+    for path, contenido in archivos:
+        with open(path, 'wb') as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def medir(funcion, archivos, repeticiones):
+    inicio = time.time()
+    for _ in range(repeticiones):
+        funcion(archivos)
+    return (time.time() - inicio) / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--directorio', default=None,
+                        help='directorio donde escribir los archivos')
+    parser.add_argument('--repeticiones', type=int, default=100)
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(dir=args.directorio)
+    try:
+        archivos = [(os.path.join(directorio, nombre), contenido)
+                    for nombre, contenido in ARCHIVOS]
+        for nombre, funcion in (('ciclo anterior', ciclo_anterior),
+                                ('fsync por archivo', fsync_por_archivo),
+                                ('escritura atomica', escritura.escribir)):
+            tiempo = medir(funcion, archivos, args.repeticiones)
+            print('%-20s %10.3f ms' % (nombre, tiempo * 1000))
+    finally:
+        shutil.rmtree(directorio)
+
+
+if __name__ == '__main__':
+    main()
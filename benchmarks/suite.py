@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+'''
+Suite de benchmarks de los caminos de lectura y aplicacion de la
+configuracion.
+
+Las mediciones se realizan sobre un arbol /etc falso creado en un directorio
+temporal y con la salida del comando `ip` precargada, por lo que no se
+modifica la configuracion del equipo ni se depende de su estado de red. La
+cache de la configuracion y la de templates tambien se guardan en el
+directorio temporal.
+
+Los resultados se escriben en formato JSON. Con `--base` se comparan contra
+una ejecucion anterior y se devuelve codigo de salida distinto de cero si
+alguna medicion empeora mas que el umbral:
+
+    python benchmarks/suite.py --salida base.json
+    python benchmarks/suite.py --base base.json --umbral 0.2
+
+Tambien se mide, en un proceso aparte por cada cantidad, cuanto crece el pico
+de memoria al renderizar y escribir la configuracion con INTERFACES y con
+INTERFACES * ESCALA_MEMORIA subinterfaces VLAN. Si la diferencia supera
+LIMITE_MEMORIA se informa como regresion aunque no se indique `--base`.
+'''
+import gc
+import os
+import sys
+import json
+import time
+import resource
+import socket
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, RAIZ)
+from netcop.configurador import cache, configurador, escritura  # noqa
+from netcop.configurador import netlink, plantillas  # noqa
+
+TEMPORAL = '''dhcp=no
+ip=192.168.1.122
+mascara=255.255.255.0
+gateway=192.168.1.1
+dns1=192.168.1.1
+dns2=8.8.8.8
+bajada=3
+subida=0.5
+'''
+
+# cantidad de subinterfaces VLAN de los benchmarks de muchas interfaces
+INTERFACES = 1000
+# la memoria de renderizar y escribir la configuracion se compara entre
+# INTERFACES y INTERFACES * ESCALA_MEMORIA subinterfaces, y no debe crecer mas
+# que LIMITE_MEMORIA KiB (el texto del contexto ocupa unos 250 KiB)
+ESCALA_MEMORIA = 10
+LIMITE_MEMORIA = 2048
+# VLAN por interfaz fisica (los id validos van de 1 a 4094)
+VLANS_INTERFAZ = 4000
+
+SALIDA_IP = b'''
+7: br0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc noqueue state UP
+    link/ether 52:54:00:57:39:99 brd ff:ff:ff:ff:ff:ff
+    inet 192.168.1.122/24 brd 192.168.1.255 scope global br0
+       valid_lft forever preferred_lft forever
+
+8.8.8.8 via 192.168.1.1 dev br0  src 192.168.1.122
+    cache
+'''
+
+
+def check_output(*args, **kwargs):
+    return SALIDA_IP
+
+
+def sin_netlink():
+    raise socket.error('deshabilitado en benchmarks')
+
+
+@contextlib.contextmanager
+def reemplazos(valores):
+    '''
+    Reemplaza temporalmente los atributos indicados en la lista de tuplas
+    (objeto, atributo, valor).
+    '''
+    anteriores = [(o, a, getattr(o, a)) for o, a, _ in valores]
+    for objeto, atributo, valor in valores:
+        setattr(objeto, atributo, valor)
+    try:
+        yield
+    finally:
+        for objeto, atributo, valor in anteriores:
+            setattr(objeto, atributo, valor)
+
+
+def paths_falsos(raiz):
+    '''
+    Devuelve lista de tuplas (objeto, atributo, valor) con los archivos y
+    directorios del configurador redirigidos hacia el directorio `raiz`.
+    '''
+    paths = {
+        'TMP_CONFIG_FILE': os.path.join(raiz, 'tmp', 'netcop-cfg.tmp'),
+        'NETWORK_CONFIG_FILE': os.path.join(raiz, 'etc', 'network',
+                                            'interfaces.d', 'br0'),
+        'DNS_CONFIG_FILE': os.path.join(raiz, 'etc', 'resolv.conf'),
+        'NETCOP_CONFIG_FILE': os.path.join(raiz, 'etc', 'netcop',
+                                           'netcop.config'),
+        'SYSCTL_CONFIG_FILE': os.path.join(raiz, 'etc', 'sysctl.d',
+                                           '90-netcop.conf'),
+        # se crea el directorio de dnsmasq para que las mediciones no
+        # dependan de si esta instalado en el equipo
+        'DNSMASQ_CONFIG_FILE': os.path.join(raiz, 'etc', 'dnsmasq.d',
+                                            'netcop.conf'),
+        'DNSMASQ_RESOLV_FILE': os.path.join(raiz, 'etc', 'netcop',
+                                            'dnsmasq.resolv'),
+    }
+    valores = [(configurador, k, v) for k, v in sorted(paths.items())]
+    valores.append((cache, 'DIRECTORIO', os.path.join(raiz, 'run', 'netcop')))
+    valores.append((plantillas, 'DIRECTORIO_CACHE',
+                    os.path.join(raiz, 'var', 'cache', 'netcop',
+                                 'templates')))
+    return valores
+
+
+@contextlib.contextmanager
+def entorno_falso():
+    '''
+    Crea un arbol /etc falso con la configuracion de un equipo y redirige el
+    configurador hacia el. La consulta de red devuelve la salida precargada
+    del comando `ip`.
+    '''
+    raiz = tempfile.mkdtemp()
+    valores = paths_falsos(raiz)
+    paths = dict((atributo, valor) for objeto, atributo, valor in valores
+                 if objeto is configurador)
+    valores.append((subprocess, 'check_output', check_output))
+    valores.append((netlink, 'consultar', sin_netlink))
+    try:
+        for path in paths.values():
+            # varios archivos comparten directorio
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+        with open(paths['TMP_CONFIG_FILE'], 'w') as f:
+            f.write(TEMPORAL)
+        with reemplazos(valores):
+            # genera la configuracion inicial del equipo
+            contexto = configurador.obtener_contexto()
+            escritura.escribir(configurador.renderizar(contexto))
+            yield raiz
+    finally:
+        shutil.rmtree(raiz)
+
+
+def medir(funcion, minimo=0.2, repeticiones=5):
+    '''
+    Ejecuta `funcion` repetidamente y devuelve diccionario con la mediana y
+    el minimo del tiempo por llamada en microsegundos.
+    '''
+    # calibra la cantidad de llamadas por repeticion
+    llamadas = 1
+    while True:
+        inicio = time.time()
+        for _ in range(llamadas):
+            funcion()
+        if time.time() - inicio >= minimo / repeticiones:
+            break
+        llamadas *= 2
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.time()
+        for _ in range(llamadas):
+            funcion()
+        tiempos.append((time.time() - inicio) / llamadas * 1e6)
+    tiempos.sort()
+    return {
+        'mediana_us': round(tiempos[len(tiempos) // 2], 3),
+        'min_us': round(tiempos[0], 3),
+        'llamadas': llamadas * repeticiones,
+    }
+
+
+# ejecuta el script redirigido al arbol falso, como lo consulta la UI
+PRELUDIO_CLI = '''
+import sys
+from netcop.configurador import cache, configurador, plantillas
+modulos = {'cache': cache, 'configurador': configurador,
+           'plantillas': plantillas}
+for modulo, atributo, valor in %r:
+    setattr(modulos[modulo], atributo, valor)
+sys.argv = [%r, '--json']
+exec(compile(open(sys.argv[0]).read(), sys.argv[0], 'exec'))
+'''
+
+
+def arranque_cli(raiz):
+    '''
+    Ejecuta la consulta de la UI (`configurador --json`) sobre el arbol
+    falso en `raiz`, desde el arranque del interprete.
+    '''
+    script = os.path.join(RAIZ, 'scripts', 'configurador')
+    valores = [(objeto.__name__.rpartition('.')[2], atributo, valor)
+               for objeto, atributo, valor in paths_falsos(raiz)]
+    with open(os.devnull, 'w') as nulo:
+        subprocess.check_call([sys.executable, '-c',
+                               PRELUDIO_CLI % (valores, script)],
+                              stdout=nulo, cwd=RAIZ,
+                              env=dict(os.environ, PYTHONPATH=RAIZ))
+
+
+def renderizar(contexto):
+    '''
+    Renderiza los templates consumiendo el contenido generado.
+    '''
+    return [b''.join(contenido)
+            for _, contenido in configurador.renderizar(contexto)]
+
+
+def contexto_interfaces(cantidad):
+    '''
+    Devuelve un contexto con `cantidad` subinterfaces VLAN repartidas en
+    pares de interfaces fisicas y un bridge por cada par de VLAN.
+    '''
+    # cada par de interfaces fisicas tiene hasta VLANS_INTERFAZ VLAN
+    pares = [('eth%d' % (i // VLANS_INTERFAZ * 2),
+              'eth%d' % (i // VLANS_INTERFAZ * 2 + 1),
+              i % VLANS_INTERFAZ + 1) for i in range(cantidad // 2)]
+    contexto = configurador.obtener_contexto()
+    contexto['vlans'] = ' '.join('%s.%d %s.%d' % (a, n, b, n)
+                                 for a, b, n in pares)
+    contexto['puentes'] = ' '.join('br%d:%s.%d,%s.%d' % (i + 1, a, n, b, n)
+                                   for i, (a, b, n) in enumerate(pares))
+    return contexto
+
+
+def benchmarks():
+    '''
+    Devuelve lista de tuplas (nombre, funcion) con los benchmarks a medir.
+    Deben ejecutarse dentro de `entorno_falso()`.
+    '''
+    parametros = configurador.leer_temporal()
+    contexto = configurador.obtener_contexto()
+    interfaces = contexto_interfaces(INTERFACES)
+    parametros_interfaces = dict(parametros, vlans=interfaces['vlans'],
+                                 puentes=interfaces['puentes'])
+    return [
+        ('leer_temporal', configurador.leer_temporal),
+        ('validar', lambda: configurador.validar(parametros)),
+        ('obtener_config_red', configurador.obtener_config_red),
+        ('obtener_config', configurador.obtener_config),
+        ('renderizar', lambda: renderizar(contexto)),
+        ('configurar', lambda: configurador.configurar(contexto)),
+        ('validar_%d_interfaces' % INTERFACES,
+         lambda: configurador.validar(parametros_interfaces)),
+        ('renderizar_%d_interfaces' % INTERFACES,
+         lambda: renderizar(interfaces)),
+        ('configurar_%d_interfaces' % INTERFACES,
+         lambda: configurador.configurar(interfaces)),
+    ]
+
+
+def memoria(cantidad):
+    '''
+    Devuelve los KiB que crece el pico de memoria del proceso al renderizar y
+    escribir la configuracion con `cantidad` subinterfaces VLAN.
+    '''
+    with entorno_falso():
+        contexto = contexto_interfaces(cantidad)
+        gc.collect()
+        antes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        escritura.escribir(configurador.renderizar(contexto))
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - antes
+
+
+def pico_memoria(cantidad):
+    '''
+    Ejecuta `memoria(cantidad)` en un proceso aparte, ya que el pico de
+    memoria de un proceso no se puede reiniciar.
+    '''
+    salida = subprocess.check_output([
+        sys.executable, os.path.join(RAIZ, 'benchmarks', 'suite.py'),
+        '--memoria', str(cantidad)])
+    return int(salida)
+
+
+def verificar_memoria(resultados):
+    '''
+    Devuelve lista de mensajes si la memoria de renderizar y escribir la
+    configuracion crece con la cantidad de interfaces.
+    '''
+    pocas = resultados['memoria_%d_interfaces' % INTERFACES]
+    muchas = resultados['memoria_%d_interfaces' % (INTERFACES *
+                                                   ESCALA_MEMORIA)]
+    if muchas - pocas > LIMITE_MEMORIA:
+        return ['memoria: %d KiB con %d interfaces, %d KiB con %d' % (
+            pocas, INTERFACES, muchas, INTERFACES * ESCALA_MEMORIA)]
+    return []
+
+
+def ejecutar(minimo, filtro=None):
+    resultados = {}
+    with entorno_falso() as raiz:
+        for nombre, funcion in benchmarks():
+            if not filtro or filtro in nombre:
+                resultados[nombre] = medir(funcion, minimo)
+        if not filtro or filtro in 'arranque_cli':
+            # la cache queda completa luego de aplicar la configuracion
+            configurador.actualizar_cache()
+            resultados['arranque_cli'] = medir(lambda: arranque_cli(raiz),
+                                               minimo, 3)
+    if not filtro or filtro in 'memoria':
+        for cantidad in (INTERFACES, INTERFACES * ESCALA_MEMORIA):
+            resultados['memoria_%d_interfaces' % cantidad] = pico_memoria(
+                cantidad)
+    return resultados
+
+
+def comparar(resultados, base, umbral):
+    '''
+    Devuelve lista de mensajes con las mediciones que empeoraron mas que el
+    umbral respecto de la base.
+    '''
+    regresiones = []
+    for nombre, actual in sorted(resultados.items()):
+        anterior = base.get(nombre)
+        if not anterior or not isinstance(actual, dict):
+            continue
+        variacion = actual['mediana_us'] / anterior['mediana_us'] - 1
+        if variacion > umbral:
+            regresiones.append('%s: %.1f us -> %.1f us (%+.0f%%)' % (
+                nombre, anterior['mediana_us'], actual['mediana_us'],
+                variacion * 100))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--salida', help='archivo JSON donde guardar los '
+                        'resultados (por defecto se muestran por pantalla)')
+    parser.add_argument('--base', help='archivo JSON de una ejecucion '
+                        'anterior contra el cual comparar')
+    parser.add_argument('--umbral', type=float, default=0.1,
+                        help='empeoramiento maximo permitido (0.1 = 10%%)')
+    parser.add_argument('--minimo', type=float, default=0.2,
+                        help='segundos minimos de medicion por benchmark')
+    parser.add_argument('--filtro', help='solo ejecuta los benchmarks que '
+                        'contengan este texto')
+    parser.add_argument('--memoria', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.memoria:
+        print(memoria(args.memoria))
+        return 0
+
+    informe = {
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'resultados': ejecutar(args.minimo, args.filtro),
+    }
+    salida = json.dumps(informe, indent=2, sort_keys=True,
+                        separators=(',', ': '))
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            f.write(salida + '\n')
+    else:
+        print(salida)
+
+    regresiones = []
+    if 'memoria_%d_interfaces' % INTERFACES in informe['resultados']:
+        regresiones.extend(verificar_memoria(informe['resultados']))
+    if args.base:
+        with open(args.base) as f:
+            base = json.load(f)['resultados']
+        regresiones.extend(comparar(informe['resultados'], base, args.umbral))
+    for regresion in regresiones:
+        sys.stderr.write('REGRESION %s\n' % regresion)
+    return 1 if regresiones else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
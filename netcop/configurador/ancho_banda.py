@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+'''
+Notificacion de cambios de ancho de banda al limitador de trafico de netcop.
+
+Cuando cambian las velocidades de bajada o subida, en lugar de esperar a que
+netcop vuelva a leer netcop.config, se le informan los nuevos valores para que
+los aplique de inmediato. La red no se modifica.
+
+Se intenta primero el socket de control de netcop. Protocolo: el cliente envia
+una linea con el objeto JSON
+
+    {"comando": "velocidades", "bajada": 3.0, "subida": 0.5}
+
+y netcop responde una linea con `{"ok": true}` una vez aplicadas las
+velocidades, o `{"ok": false, "error": "..."}`.
+
+Si el socket no existe se envia SIGHUP al proceso indicado en el archivo de
+pid de netcop, que vuelve a leer netcop.config. En ese caso no hay
+confirmacion de que se hayan aplicado los valores.
+'''
+import os
+import json
+import errno
+import signal
+import socket
+import syslog
+
+# socket de control de netcop
+SOCKET = '/run/netcop/netcop.sock'
+# archivo con el pid de netcop
+PIDFILE = '/run/netcop/netcop.pid'
+# tiempo maximo de espera de la confirmacion en segundos
+TIMEOUT = 0.5
+
+# resultados de la notificacion
+CONFIRMADO = 'confirmado'
+SIN_CONFIRMACION = 'sin confirmacion'
+NO_NOTIFICADO = 'no notificado'
+
+
+def enviar_socket(bajada, subida, path=None, timeout=TIMEOUT):
+    '''
+    Envia las velocidades por el socket de control y espera la confirmacion.
+    Lanza RuntimeError si netcop informa un error.
+    '''
+    mensaje = json.dumps({'comando': 'velocidades', 'bajada': float(bajada),
+                          'subida': float(subida)})
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(path or SOCKET)
+        sock.sendall((mensaje + '\n').encode('utf-8'))
+        datos = b''
+        while not datos.endswith(b'\n'):
+            parte = sock.recv(4096)
+            if not parte:
+                break
+            datos += parte
+    finally:
+        sock.close()
+    respuesta = json.loads(datos.decode('utf-8'))
+    if not respuesta.get('ok'):
+        raise RuntimeError(respuesta.get('error', 'respuesta invalida'))
+
+
+def enviar_senal(path=None):
+    '''
+    Envia SIGHUP al proceso de netcop. Devuelve False si no esta en ejecucion.
+    '''
+    try:
+        with open(path or PIDFILE) as f:
+            pid = int(f.read().strip())
+    except (IOError, ValueError):
+        return False
+    try:
+        os.kill(pid, signal.SIGHUP)
+    except OSError as e:
+        if e.errno == errno.ESRCH:
+            return False
+        raise
+    return True
+
+
+def notificar(bajada, subida):
+    '''
+    Informa las nuevas velocidades a netcop. Devuelve CONFIRMADO si netcop
+    confirmo que las aplico, SIN_CONFIRMACION si se le envio la senal y
+    NO_NOTIFICADO si no se pudo notificar.
+    '''
+    try:
+        enviar_socket(bajada, subida)
+        return CONFIRMADO
+    except (socket.error, ValueError, RuntimeError) as e:
+        syslog.syslog(syslog.LOG_DEBUG,
+                      "socket de netcop: %s. Se enviara SIGHUP" % str(e))
+    try:
+        if enviar_senal():
+            return SIN_CONFIRMACION
+    except OSError as e:
+        syslog.syslog(syslog.LOG_WARNING,
+                      "No se pudo enviar SIGHUP a netcop: %s" % str(e))
+    return NO_NOTIFICADO
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+'''
+Cache del resultado de `obtener_config()`.
+
+La configuracion aplicada casi nunca cambia entre dos consultas de la UI, por
+lo que se guarda el ultimo resultado junto con una clave formada por:
+
+* (inodo, mtime, tamanio) de cada archivo de configuracion leido.
+* Una huella del estado de red del kernel (tabla de rutas y direcciones
+  locales leidas desde /proc), que cambia si se modifica la direccion o el
+  gateway aunque no cambien los archivos.
+
+Si la clave coincide, la consulta cuesta unas pocas llamadas a `stat()` y la
+lectura de la cache. La cache se guarda en un directorio en memoria que debe
+pertenecer a root, por lo que si no es posible utilizarla simplemente se
+ignora.
+
+Solo los procesos de root escriben la cache: el directorio se crea con
+permisos 0755 y el archivo con 0644, por lo que la UI (www-data) puede leerla
+pero no actualizarla. Por eso, luego de aplicar o restaurar una
+configuracion, el configurador vuelve a leerla y la guarda en la cache
+(`configurador.actualizar_cache()`); las consultas de la UI encuentran la
+cache completa sin que antes haya consultado un proceso de root.
+'''
+import os
+import json
+import hashlib
+import tempfile
+from . import escritura
+
+# directorio donde se guarda la cache
+DIRECTORIO = '/run/netcop'
+# nombre del archivo de cache
+NOMBRE = 'config.cache'
+# archivos de /proc que reflejan el estado de red del kernel
+ESTADO_RED = ('/proc/net/route', '/proc/net/fib_trie')
+
+
+def ruta():
+    '''
+    Devuelve la ruta del archivo de cache.
+    '''
+    return os.path.join(DIRECTORIO, NOMBRE)
+
+
+def huella_red():
+    '''
+    Devuelve una huella del estado de rutas y direcciones del kernel.
+    '''
+    h = hashlib.sha1()
+    for path in ESTADO_RED:
+        try:
+            with open(path, 'rb') as f:
+                h.update(f.read())
+        except IOError:
+            pass
+    return h.hexdigest()
+
+
+def clave(archivos):
+    '''
+    Calcula la clave de la cache para la lista de archivos.
+    '''
+    valores = []
+    for path in archivos:
+        try:
+            info = os.stat(path)
+        except OSError:
+            valores.append(None)
+        else:
+            valores.append([info.st_ino, info.st_mtime, info.st_size])
+    valores.append(huella_red())
+    return valores
+
+
+def leer(clave):
+    '''
+    Devuelve la configuracion guardada si corresponde a `clave` o None en
+    caso contrario.
+    '''
+    if not escritura.directorio_seguro(DIRECTORIO):
+        return None
+    try:
+        with open(ruta()) as f:
+            datos = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if not isinstance(datos, dict) or datos.get('clave') != clave:
+        return None
+    return datos.get('config')
+
+
+def guardar(clave, config):
+    '''
+    Guarda la configuracion asociada a `clave`. Si no es posible escribir la
+    cache no se hace nada.
+    '''
+    if not escritura.directorio_seguro(DIRECTORIO):
+        return False
+    try:
+        fd, temporal = tempfile.mkstemp(prefix='.%s.' % NOMBRE,
+                                        dir=DIRECTORIO)
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'clave': clave, 'config': config}, f)
+        os.chmod(temporal, 0o644)
+        os.rename(temporal, ruta())
+    except (IOError, OSError):
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def invalidar():
+    '''
+    Borra la cache.
+    '''
+    try:
+        os.remove(ruta())
+    except OSError:
+        pass
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+'''
+Cola de envios de configuracion de la UI.
+
+Si el administrador guarda varias veces seguidas, o `cron` ejecuta
+`configurador --set` mientras otra ejecucion todavia esta aplicando la
+configuracion, las ejecuciones se pisan sobre el archivo temporal y los
+archivos de /etc y cada una reinicia la red.
+
+Cada envio se numera con un numero de secuencia y se copia el archivo
+temporal a una instantanea pendiente, reemplazando a la anterior: los envios
+que todavia no empezaron a aplicarse quedan absorbidos por el ultimo. La
+aplicacion se realiza bajo un bloqueo exclusivo, por lo que en una rafaga de
+envios hay como maximo la aplicacion en curso y una mas con el ultimo envio.
+
+Quien envia la configuracion espera a obtener el bloqueo de aplicacion; si al
+obtenerlo su envio ya fue aplicado por otra ejecucion, devuelve el resultado
+de esa ejecucion, y en caso contrario aplica la ultima instantanea pendiente.
+
+Si la aplicacion falla, la instantanea vuelve a quedar pendiente (salvo que
+mientras tanto haya llegado un envio mas nuevo) y la proxima ejecucion la
+vuelve a aplicar aunque no exista el archivo temporal de la UI.
+
+El estado de la cola se guarda en /run/netcop:
+
+* cola.lock: bloqueo del estado de la cola (se mantiene por poco tiempo).
+* aplicacion.lock: bloqueo que se mantiene mientras se aplica la
+  configuracion.
+* cola.json: ultima secuencia enviada y aplicada, y resultados de las
+  ultimas ejecuciones.
+* pendiente.tmp: instantanea del ultimo envio que todavia no se aplico.
+* aplicando.tmp: instantanea que se esta aplicando.
+'''
+import os
+import json
+import fcntl
+import tempfile
+import contextlib
+from . import configurador
+from . import escritura
+
+# directorio donde se guarda el estado de la cola
+DIRECTORIO = '/run/netcop'
+# cantidad de resultados de ejecuciones que se conservan
+RESULTADOS = 16
+
+
+def ruta(nombre):
+    return os.path.join(DIRECTORIO, nombre)
+
+
+@contextlib.contextmanager
+def bloqueo(nombre):
+    '''
+    Obtiene el bloqueo exclusivo del archivo `nombre`, esperando si otro
+    proceso lo tiene.
+    '''
+    if not escritura.directorio_seguro(DIRECTORIO):
+        raise RuntimeError('%s no es un directorio seguro' % DIRECTORIO)
+    fd = os.open(ruta(nombre), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def leer_estado():
+    '''
+    Devuelve el estado de la cola. Debe llamarse con el bloqueo de la cola.
+    '''
+    try:
+        with open(ruta('cola.json')) as f:
+            estado = json.load(f)
+    except (IOError, ValueError):
+        estado = {}
+    estado.setdefault('enviado', 0)
+    estado.setdefault('aplicado', 0)
+    estado.setdefault('resultados', [])
+    return estado
+
+
+def guardar_estado(estado):
+    '''
+    Guarda el estado de la cola. Debe llamarse con el bloqueo de la cola.
+    '''
+    fd, temporal = tempfile.mkstemp(dir=DIRECTORIO)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(estado, f, sort_keys=True)
+    os.rename(temporal, ruta('cola.json'))
+
+
+def encolar():
+    '''
+    Toma el archivo temporal escrito por la UI como un nuevo envio. Devuelve
+    el numero de secuencia del envio o None si no existe el archivo.
+    '''
+    with bloqueo('cola.lock'):
+        try:
+            with open(configurador.TMP_CONFIG_FILE, 'rb') as f:
+                contenido = f.read()
+        except IOError:
+            return None
+        estado = leer_estado()
+        estado['enviado'] += 1
+        # reemplaza la instantanea del envio anterior si no se aplico
+        escritura.escribir([(ruta('pendiente.tmp'), contenido)])
+        guardar_estado(estado)
+        # a partir de aqui la UI puede escribir un nuevo envio
+        configurador.borrar_temporal()
+        return estado['enviado']
+
+
+def pendiente():
+    '''
+    Indica si hay una instantanea sin aplicar, por ejemplo la de una
+    aplicacion que fallo.
+    '''
+    return os.path.exists(ruta('pendiente.tmp'))
+
+
+def buscar_resultado(estado, secuencia):
+    '''
+    Devuelve el resultado de la ejecucion que aplico el envio `secuencia`.
+    '''
+    for resultado in estado['resultados']:
+        if resultado['desde'] <= secuencia <= resultado['hasta']:
+            return resultado
+    return {'desde': secuencia, 'hasta': secuencia, 'acciones': [],
+            'error': 'No se encontro el resultado del envio %d' % secuencia}
+
+
+def aplicar():
+    '''
+    Aplica la instantanea pendiente. Debe llamarse con el bloqueo de
+    aplicacion. Devuelve el resultado de la ejecucion.
+    '''
+    with bloqueo('cola.lock'):
+        estado = leer_estado()
+        hasta = estado['enviado']
+        # los nuevos envios se guardan en una nueva instantanea
+        os.rename(ruta('pendiente.tmp'), ruta('aplicando.tmp'))
+    # al reintentar una aplicacion que fallo no hay envios nuevos
+    resultado = {'desde': min(estado['aplicado'] + 1, hasta), 'hasta': hasta,
+                 'acciones': [], 'error': None}
+    try:
+        resultado['acciones'] = configurador.procesar_temporal(
+            ruta('aplicando.tmp'))
+    except Exception as e:
+        resultado['error'] = '%s - %s' % (e.__class__.__name__, str(e))
+        raise
+    finally:
+        with bloqueo('cola.lock'):
+            if os.path.exists(ruta('aplicando.tmp')):
+                if resultado['error'] and not pendiente():
+                    # se reintenta en la proxima ejecucion, salvo que haya
+                    # un envio mas nuevo que lo reemplace
+                    os.rename(ruta('aplicando.tmp'), ruta('pendiente.tmp'))
+                else:
+                    os.remove(ruta('aplicando.tmp'))
+            estado = leer_estado()
+            estado['aplicado'] = hasta
+            estado['resultados'] = ([resultado] +
+                                    estado['resultados'])[:RESULTADOS]
+            guardar_estado(estado)
+    return resultado
+
+
+def esperar(secuencia):
+    '''
+    Espera a que se aplique el envio `secuencia`, aplicandolo si ninguna
+    otra ejecucion lo hizo. Devuelve el resultado de la ejecucion que lo
+    aplico con las claves desde, hasta, acciones y error.
+
+    Si el envio fue aplicado por otra ejecucion que fallo, lanza
+    RuntimeError.
+    '''
+    with bloqueo('aplicacion.lock'):
+        with bloqueo('cola.lock'):
+            estado = leer_estado()
+        if estado['aplicado'] < secuencia:
+            return aplicar()
+    resultado = buscar_resultado(estado, secuencia)
+    if resultado['error']:
+        raise RuntimeError(resultado['error'])
+    return resultado
+
+
+def reintentar():
+    '''
+    Vuelve a aplicar la instantanea pendiente de una aplicacion que fallo.
+    Devuelve el resultado de la ejecucion o None si no hay instantanea
+    pendiente.
+    '''
+    with bloqueo('aplicacion.lock'):
+        if not pendiente():
+            return None
+        return aplicar()
+
+
+def enviar():
+    '''
+    Encola el archivo temporal y espera el resultado de su aplicacion. Si no
+    existe el archivo temporal se reintenta la instantanea pendiente, si la
+    hay. Devuelve None si no hay nada que aplicar.
+    '''
+    secuencia = encolar()
+    if secuencia is None:
+        return reintentar()
+    return esperar(secuencia)
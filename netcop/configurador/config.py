@@ -19,8 +19,18 @@ El formato del archivo esperado es
     user=netcop
     password=netcop
 ```
+
+El archivo se lee recien la primera vez que se consultan los valores y se
+vuelve a leer cuando cambia su fecha de modificacion, por lo que el demonio y
+el servidor ven los cambios sin reiniciarse con el costo de un `stat()` por
+consulta. Las secciones o claves que no esten en el archivo toman los valores
+de `Default`.
+
+    from netcop.configurador import config
+    config.CONFIGURACION.DATABASE['user']
 '''
-import configparser
+import os
+import threading
 
 NETCOP_CONFIG = '/etc/netcop/netcop.config'
 
@@ -41,20 +51,81 @@ class Default:
         'inside': 'eth1',
     }
 
-config = configparser.ConfigParser()
-config.read(NETCOP_CONFIG, encoding='utf8')
 
-# guarda el resto de las configuraciones del modulo
-for section in config.sections():
-    conf = dict()
-    for item in config.items(section):
-        conf[item[0].lower()] = item[1]
-    globals()[section.upper()] = conf
+def leer(path=None):
+    '''
+    Lee el archivo de configuracion y devuelve diccionario con las secciones
+    en mayusculas completadas con los valores de `Default`.
+    '''
+    import configparser
+    config = configparser.ConfigParser()
+    config.read(path or NETCOP_CONFIG, encoding='utf8')
+    secciones = dict((seccion, dict(getattr(Default, seccion)))
+                     for seccion in dir(Default)
+                     if not seccion.startswith('__'))
+    for seccion in config.sections():
+        conf = secciones.setdefault(seccion.upper(), {})
+        for clave, valor in config.items(seccion):
+            conf[clave.lower()] = valor
+    return secciones
+
+
+def firma(path):
+    '''
+    Devuelve la fecha de modificacion, tamanio e inodo del archivo o None si
+    no existe.
+    '''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size, st.st_ino)
+
+
+class Configuracion(object):
+    '''
+    Configuracion de netcop leida bajo demanda. Cada seccion se obtiene como
+    atributo (`DATABASE`, `NETCOP`) y es una copia, por lo que los valores
+    leidos no cambian hasta que se modifique el archivo.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self._bloqueo = threading.Lock()
+        # tupla (firma, secciones) que se reemplaza entera al recargar
+        self._cargada = None
+
+    def secciones(self):
+        '''
+        Devuelve una copia de las secciones leidas, volviendo a leer el
+        archivo si cambio desde la ultima lectura. Modificar la copia no
+        altera la configuracion cargada.
+        '''
+        return dict((nombre, dict(valores))
+                    for nombre, valores in self._secciones().items())
+
+    def _secciones(self):
+        '''
+        Devuelve las secciones cargadas, que no deben modificarse.
+        '''
+        path = self.path or NETCOP_CONFIG
+        actual = firma(path)
+        cargada = self._cargada
+        if cargada is not None and cargada[0] == actual:
+            return cargada[1]
+        with self._bloqueo:
+            # otro hilo pudo haberlo recargado mientras se esperaba
+            if self._cargada is None or self._cargada[0] != actual:
+                self._cargada = (actual, leer(path))
+            return self._cargada[1]
+
+    def __getattr__(self, nombre):
+        if nombre.startswith('_'):
+            raise AttributeError(nombre)
+        try:
+            return dict(self._secciones()[nombre])
+        except KeyError:
+            raise AttributeError(nombre)
 
-# establece opciones por default
-sections = [a for a in dir(Default) if not a.startswith('__')]
-for section in sections:
-    if globals().get(section) is None:
-        globals()[section] = getattr(Default, section)
 
-del config, sections
+CONFIGURACION = Configuracion()
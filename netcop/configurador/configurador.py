@@ -7,6 +7,11 @@ Por razones de seguridad el script lee el archivo  temporal
 `/tmp/netcop-cfg.tmp` (generado por la interfaz de usuario por el usuario sin
 privilegio `www-data`) y escribe los archivos correspondientes con privilegio
 de Administrador.
+
+La lectura de la configuracion aplicada (`configurador` sin parametros) se
+ejecuta en cada pagina de la UI, por lo que los modulos que solo se utilizan
+al aplicar la configuracion (jinja2, configparser y el modulo config) se
+importan recien cuando se necesitan.
 '''
 import os
 import re
@@ -14,9 +19,12 @@ import socket
 import struct
 import syslog
 import subprocess
-import configparser
-from . import config
-from jinja2 import Environment, PackageLoader
+from . import cache
+from . import escritura
+from . import netlink
+from . import sondeo
+from . import tiempos
+from . import validacion
 
 # Ubicacion de arhivos
 # -------------------------------------------------------------------------
@@ -28,6 +36,52 @@ NETWORK_CONFIG_FILE = '/etc/network/interfaces.d/br0'
 DNS_CONFIG_FILE = '/etc/resolv.conf'
 # archivo de configuracion de netcop
 NETCOP_CONFIG_FILE = '/etc/netcop/netcop.config'
+# archivo de configuracion de la cache de nombres local (dnsmasq). Solo se
+# genera si dnsmasq esta instalado
+DNSMASQ_CONFIG_FILE = '/etc/dnsmasq.d/netcop.conf'
+# servidores de nombres a los que consulta la cache local (resolv-file)
+DNSMASQ_RESOLV_FILE = '/etc/netcop/dnsmasq.resolv'
+# ajustes del kernel calculados segun el ancho de banda (ver sysctl.py)
+SYSCTL_CONFIG_FILE = '/etc/sysctl.d/90-netcop.conf'
+
+# Cache de nombres local
+# -------------------------------------------------------------------------
+# direccion en la que atiende la cache local
+DIRECCION_CACHE_DNS = '127.0.0.1'
+# cantidad de nombres que guarda la cache si no se especifica
+CACHE_DNS_TAMANIO = 1000
+# segundos que se recuerdan las respuestas negativas si no se especifica
+CACHE_DNS_TTL_NEGATIVO = 60
+
+# Ajustes del bridge y de las placas de red
+# -------------------------------------------------------------------------
+# perfil que se utiliza si no se especifica (ver validacion.PERFILES_RED).
+# Desactiva gro/gso/tso/lro, lo que aumenta el uso de CPU por paquete
+PERFIL_RED = 'baja_latencia'
+# parametros de ajuste que se pueden especificar en lugar del valor del perfil
+AJUSTES_RED = ('bridge_stp', 'bridge_fd', 'bridge_maxwait', 'mtu',
+               'txqueuelen', 'offloads', 'anillos')
+
+# Expresiones regulares
+# -------------------------------------------------------------------------
+# lectura de la configuracion aplicada
+REGEX_IFACE = re.compile(
+    r'^\s*iface\s+(?P<nombre>\S+)\s+inet\s+(?P<metodo>\w+)')
+REGEX_VLAN_RAW_DEVICE = re.compile(r'^\s*vlan-raw-device\s+\S+')
+REGEX_BRIDGE_PORTS = re.compile(r'^\s*bridge_ports\s+(?P<puertos>\S.*?)\s*$')
+REGEX_VELOCIDAD_NETCOP = re.compile(
+    r'^\s*velocidad_(?P<clave>bajada|subida)\s*=\s*(?P<valor>\d+(\.\d+)?)')
+REGEX_HORARIO_NETCOP = re.compile(r'^\s*horario\s*=\s*(?P<valor>\S.*?)\s*$')
+REGEX_DNSMASQ = re.compile(
+    r'^\s*(?P<clave>cache-size|neg-ttl)\s*=\s*(?P<valor>\d+)')
+REGEX_SYSCTL = re.compile(
+    r'^\s*-?[\w.]+\.(?P<clave>\w+)\s*=\s*(?P<valor>\S.*?)\s*$')
+REGEX_HOSTS_SYSCTL = re.compile(r'^#\s*hosts\s*=\s*(?P<hosts>\d+)')
+REGEX_NAMESERVER = re.compile(r'^\s*nameserver\s+(?P<dns>(\d+\.?){4})')
+# salida del comando ip
+REGEX_IP_INFO = re.compile(r'inet\s+(?P<ip>(\d+\.?){4})/(?P<prefijo>\d+)')
+REGEX_GATEWAY_INFO = re.compile(
+    r'via\s+(?P<gateway>(\d+\.?){4})\s+dev\s+(?P<dev>\w+)')
 
 
 def existe_archivo_temporal():
@@ -43,54 +97,30 @@ def validar(parametros):
     correctos.
 
     En caso de que los parametros sean incorrectos, lanza ValueError
+    (validacion.ErrorValidacion) con todos los errores encontrados.
+    '''
+    return validacion.validar(parametros)
+
+
+def leer_temporal(path=None):
     '''
-    regex_dhcp = re.compile('^(si|no)$', flags=re.I)
-    regex_ip = re.compile('^(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}'
-                          '(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$')
-    regex_velocidad = re.compile('^\d+$')
-    FIELDS = (('dhcp', regex_dhcp),
-              ('ip', regex_ip),
-              ('mascara', regex_ip),
-              ('gateway', regex_ip),
-              ('dns1', regex_ip),
-              ('dns2', regex_ip),
-              ('subida', regex_velocidad),
-              ('bajada', regex_velocidad),)
-    # valida formato de los parametros
-    for field, regex in FIELDS:
-        if parametros.get(field) and not regex.match(parametros.get(field)):
-            raise ValueError('{field} {value}: formato invalido'.format(
-                field=field,
-                value=parametros.get(field)
-            ))
-    # si se ingresa ip, se debe ingresar mascara, gateway y dns1
-    if parametros.get('ip') or parametros.get('mascara'):
-        if not (parametros.get('ip') and parametros.get('mascara')):
-            raise ValueError('Debe ingresar ip y mascara de subred')
-    # subida y bajada son obligatorios
-    if not parametros.get('bajada') or not parametros.get('subida'):
-        raise ValueError('bajada y subida son obligatorios')
-    return True
-
-
-def leer_temporal():
-    '''
-    Lee configuracion desde archivo temporal creado por UI y devuelve
-    diccionario con los parametros leidos.
+    Lee configuracion desde archivo temporal creado por UI, o desde `path`
+    si se especifica, y devuelve diccionario con los parametros leidos.
     '''
+    import configparser
     # agrega una seccion dummy porque asi lo espera el configparser
-    with open(TMP_CONFIG_FILE, 'r') as f:
+    with open(path or TMP_CONFIG_FILE, 'r') as f:
         config_string = u'[netcop]\n' + f.read()
     config = configparser.ConfigParser()
     config.read_string(config_string)
     return {key: value for key, value in config.items('netcop')}
 
 
-def borrar_temporal():
+def borrar_temporal(path=None):
     '''
-    Borra archivo temporal creado por UI
+    Borra archivo temporal creado por UI, o `path` si se especifica
     '''
-    return os.remove(TMP_CONFIG_FILE)
+    return os.remove(path or TMP_CONFIG_FILE)
 
 
 def procesar_parametros(config, parametros):
@@ -106,13 +136,12 @@ def procesar_parametros(config, parametros):
     config.update(parametros)
 
 
-def parse_cmd(command, pattern):
+def parse_cmd(command, regex):
     '''
     Ejecuta el comando ´command´ y lo parsea con la expresion regular ´regex´.
     Devuelve objeto re.Matchcmd
     '''
     output = subprocess.check_output(command, shell=True)
-    regex = re.compile(pattern)
     return regex.search(output)
 
 
@@ -128,17 +157,28 @@ def obtener_config_red():
     '''
     Lee la configuracion de red aplicada actualmente y devuelve diccionario
     que contiene la ip, mascara y gateway.
+
+    Consulta directamente al kernel mediante netlink y, si no esta disponible,
+    utiliza el comando `ip`.
+    '''
+    try:
+        gateway, ip, prefijo = netlink.consultar()
+    except (socket.error, OSError, ValueError) as e:
+        syslog.syslog(syslog.LOG_DEBUG,
+                      "netlink: %s. Se utilizara el comando ip" % str(e))
+        return obtener_config_red_ip()
+    return {'gateway': gateway, 'ip': ip, 'mascara': get_mascara(prefijo)}
+
+
+def obtener_config_red_ip():
+    '''
+    Lee la configuracion de red aplicada actualmente ejecutando el comando `ip`
+    y devuelve diccionario que contiene la ip, mascara y gateway.
     '''
     # comando para obtener ip y prefijo
-    IP_INFO = (
-        'ip addr show primary ',
-        'inet\s+(?P<ip>(\d+\.?){4})/(?P<prefijo>\d+)'
-    )
+    IP_INFO = ('ip addr show primary ', REGEX_IP_INFO)
     # comando para obtener gateway
-    GATEWAY_INFO = (
-        'ip -4 route get 8.8.8.8',
-        'via\s+(?P<gateway>(\d+\.?){4})\s+dev\s+(?P<dev>\w+)'
-    )
+    GATEWAY_INFO = ('ip -4 route get 8.8.8.8', REGEX_GATEWAY_INFO)
     # obtengo el gateway
     cmd, pattern = GATEWAY_INFO
     m = parse_cmd(cmd, pattern)
@@ -152,71 +192,651 @@ def obtener_config_red():
     return data
 
 
-def obtener_config():
+def debug_habilitado():
+    '''
+    Indica si la mascara de syslog permite registrar mensajes de depuracion.
+    '''
+    return bool(syslog.setlogmask(0) & syslog.LOG_MASK(syslog.LOG_DEBUG))
+
+
+def parsear_red(lineas):
+    '''
+    Obtiene los parametros de la configuracion de red: si br0 utiliza DHCP,
+    las subinterfaces VLAN y los bridges adicionales.
+    '''
+    params = {}
+    vlans = []
+    puentes = []
+    iface = None
+    for linea in lineas:
+        m = REGEX_IFACE.match(linea)
+        if m:
+            iface = m.group('nombre')
+            if iface == validacion.BRIDGE_PRINCIPAL and \
+                    m.group('metodo') == 'dhcp':
+                params['dhcp'] = 'dhcp'
+            continue
+        if iface is None or iface == validacion.BRIDGE_PRINCIPAL:
+            continue
+        if REGEX_VLAN_RAW_DEVICE.match(linea):
+            vlans.append(iface)
+            continue
+        m = REGEX_BRIDGE_PORTS.match(linea)
+        if m:
+            puentes.append('%s:%s' % (iface,
+                                      ','.join(m.group('puertos').split())))
+    if vlans:
+        params['vlans'] = ' '.join(vlans)
+    if puentes:
+        params['puentes'] = ' '.join(puentes)
+    return params
+
+
+def parsear_netcop(lineas):
+    '''
+    Obtiene las velocidades de bajada y subida y el horario semanal de la
+    configuracion de netcop.
+    '''
+    params = {}
+    for linea in lineas:
+        m = REGEX_VELOCIDAD_NETCOP.match(linea)
+        if m:
+            params[m.group('clave')] = m.group('valor')
+            continue
+        m = REGEX_HORARIO_NETCOP.match(linea)
+        if m:
+            params['horario'] = m.group('valor')
+    return params
+
+
+def parsear_dns(lineas):
+    '''
+    Obtiene los servidores de nombre (dns1 y dns2) de resolv.conf.
+    '''
+    params = {}
+    for linea in lineas:
+        m = REGEX_NAMESERVER.match(linea)
+        if m:
+            procesar_parametros(params, {'dns': m.group('dns')})
+    return params
+
+
+def parsear_dnsmasq(lineas):
+    '''
+    Obtiene el tamanio de la cache y el tiempo de las respuestas negativas de
+    la configuracion de dnsmasq.
+    '''
+    claves = {'cache-size': 'cache_dns_tamanio',
+              'neg-ttl': 'cache_dns_ttl_negativo'}
+    params = {}
+    for linea in lineas:
+        m = REGEX_DNSMASQ.match(linea)
+        if m:
+            params[claves[m.group('clave')]] = m.group('valor')
+    return params
+
+
+def leer_cache_dns():
+    '''
+    Devuelve diccionario con los servidores de nombres a los que consulta la
+    cache local y su configuracion. Si no se pueden leer devuelve un
+    diccionario vacio.
+    '''
+    params = {}
+    for path, parsear in ((DNSMASQ_RESOLV_FILE, parsear_dns),
+                          (DNSMASQ_CONFIG_FILE, parsear_dnsmasq)):
+        try:
+            with open(path) as f:
+                params.update(parsear(f))
+        except IOError:
+            continue
+    return params
+
+
+def parsear_sysctl(lineas):
+    '''
+    Obtiene la cantidad de hosts y los ajustes del kernel calculados, con el
+    ultimo componente de la clave de sysctl como nombre.
+    '''
+    params = {}
+    for linea in lineas:
+        m = REGEX_HOSTS_SYSCTL.match(linea)
+        if m:
+            params['hosts'] = m.group('hosts')
+            continue
+        m = REGEX_SYSCTL.match(linea)
+        if m:
+            params[m.group('clave')] = m.group('valor')
+    return params
+
+
+def leer_sysctl():
+    '''
+    Devuelve diccionario con los ajustes del kernel generados. Si el archivo
+    no existe (todavia no se aplico la configuracion) devuelve un diccionario
+    vacio.
+    '''
+    try:
+        with open(SYSCTL_CONFIG_FILE) as f:
+            return parsear_sysctl(f)
+    except IOError:
+        return {}
+
+
+def obtener_config(usar_cache=False):
     '''
     Lee configuraciones actualmente aplicadas.
+
+    Si `usar_cache` es verdadero se devuelve el ultimo resultado guardado
+    mientras no cambien los archivos de configuracion ni el estado de red.
     '''
-    regex = re.compile('''(
-            bajada=(?P<bajada>\d+) |          # bajada
-            subida=(?P<subida>\d+) |          # subida
-            (?P<dhcp>dhcp) |                  # dhcp
-            nameserver\s+(?P<dns>(\d+\.?){4}) # dns1 o dns2
-        )''',
-        flags=re.M | re.X
-    )
+    # cada archivo se lee con sus propias reglas
+    lectores = ((NETWORK_CONFIG_FILE, parsear_red),
+                (NETCOP_CONFIG_FILE, parsear_netcop),
+                (DNS_CONFIG_FILE, parsear_dns))
+    # si resolv.conf apunta a la cache local se informan sus servidores
+    archivos = [path for path, _ in lectores] + [DNSMASQ_RESOLV_FILE,
+                                                 DNSMASQ_CONFIG_FILE,
+                                                 SYSCTL_CONFIG_FILE]
+    if usar_cache:
+        # la clave se calcula antes de leer para no asociar un resultado
+        # viejo a archivos modificados durante la lectura
+        clave = cache.clave(archivos)
+        config = cache.leer(clave)
+        if config is not None:
+            return config
     config = {}
-    for path in (NETWORK_CONFIG_FILE, NETCOP_CONFIG_FILE, DNS_CONFIG_FILE):
+    for path, parsear in lectores:
         with open(path) as f:
-            for m in regex.finditer(f.read()):
-                params = {k: v for k, v in m.groupdict().items() if v}
-                procesar_parametros(config, params)
-                syslog.syslog(syslog.LOG_DEBUG,
-                              "{0}: {1}".format(path, str(config)))
+            params = parsear(f)
+        if debug_habilitado():
+            syslog.syslog(syslog.LOG_DEBUG, "%s: %s" % (path, str(params)))
+        config.update(params)
     config.update(obtener_config_red())
+    config.update(leer_sysctl())
     # corrijo valor para dhcp
     config['dhcp'] = 'si' if config.get('dhcp') else 'no'
-    syslog.syslog(syslog.LOG_DEBUG, "Config: %s" % str(config))
+    config['cache_dns'] = 'no'
+    if config.get('dns1') == DIRECCION_CACHE_DNS:
+        config.pop('dns1')
+        config.update(leer_cache_dns())
+        config['cache_dns'] = 'si'
+    if debug_habilitado():
+        syslog.syslog(syslog.LOG_DEBUG, "Config: %s" % str(config))
+    if usar_cache:
+        cache.guardar(clave, config)
     return config
 
 
-def aplicar_cambios():
+def aplicar_cambios(cambios=None, contexto=None):
+    '''
+    Aplica los archivos de configuracion modificados realizando la accion mas
+    liviana posible para cada uno. Devuelve lista con las acciones realizadas.
+
+    Solo se recarga la configuracion de red si cambio la configuracion del
+    bridge. Los cambios en resolv.conf y en netcop.config no requieren
+    reiniciar la red. Si no se especifican los cambios se recarga la
+    configuracion de red.
+
+    Si cambia la configuracion de la cache de nombres local se reinicia
+    dnsmasq (o se detiene si se deshabilito la cache); si solo cambian sus
+    servidores de nombres se le indica que los vuelva a leer.
+
+    Los ajustes del kernel se aplican recargando solo su archivo con sysctl.
+
+    Si se especifica el contexto, los cambios de direccion, gateway y DHCP se
+    aplican en caliente sobre el bridge sin reiniciar la red. Si no es
+    posible se reinicia la red. Los cambios de ancho de banda se notifican a
+    netcop, y la accion informa si netcop confirmo que los aplico.
+    '''
+    acciones = []
+    if cambios is None:
+        return aplicar_red()
+    if NETWORK_CONFIG_FILE in cambios:
+        acciones.extend(aplicar_red(contexto))
+    if DNSMASQ_CONFIG_FILE in cambios:
+        # dnsmasq solo vuelve a leer su configuracion al reiniciarse
+        accion = 'restart' if contexto is None or \
+            cache_dns_activa(contexto) else 'stop'
+        acciones.append(servicio_dnsmasq(accion))
+    elif DNSMASQ_RESOLV_FILE in cambios and cache_dns_activa(contexto):
+        # con SIGHUP vuelve a leer los servidores sin perder el socket
+        acciones.append(servicio_dnsmasq('reload'))
+    if SYSCTL_CONFIG_FILE in cambios:
+        acciones.append(aplicar_sysctl())
+    if NETCOP_CONFIG_FILE in cambios and contexto is not None:
+        from . import ancho_banda
+        from . import horario
+        # si hay horario semanal se informan las velocidades de la franja
+        # activa
+        bajada, subida = horario.perfil_contexto(contexto)
+        with tiempos.fase('notificar netcop'):
+            resultado = ancho_banda.notificar(bajada, subida)
+        acciones.append('notificar velocidades a netcop (%s)' % resultado)
+    return acciones
+
+
+def aplicar_red(contexto=None):
+    '''
+    Aplica la configuracion de red en caliente si se especifica el contexto y
+    en caso contrario, o si no es posible, reinicia la red. Devuelve lista con
+    las acciones realizadas.
+    '''
+    if contexto:
+        from . import red
+        try:
+            return red.aplicar(contexto)
+        except RuntimeError as e:
+            syslog.syslog(syslog.LOG_WARNING,
+                          "No se pudo aplicar la configuracion de red en "
+                          "caliente: %s. Se reiniciara la red" % str(e))
+    reiniciar_red()
+    return ['reiniciar networking.service']
+
+
+def servicio_dnsmasq(accion):
+    '''
+    Ejecuta `systemctl <accion>` sobre dnsmasq. Devuelve la accion realizada.
+    '''
+    with tiempos.fase('%s dnsmasq.service' % accion):
+        retcode = subprocess.call(['systemctl', accion, 'dnsmasq.service'])
+    if retcode != 0:
+        raise RuntimeError('No se pudo ejecutar %s de dnsmasq.service' %
+                           accion)
+    return '%s dnsmasq.service' % accion
+
+
+def aplicar_sysctl():
+    '''
+    Aplica los ajustes del kernel. Las claves que no existen en el kernel se
+    ignoran. Devuelve la accion realizada.
+    '''
+    with tiempos.fase('aplicar sysctl'):
+        retcode = subprocess.call(['sysctl', '-q', '-e', '-p',
+                                   SYSCTL_CONFIG_FILE])
+    if retcode != 0:
+        raise RuntimeError('No se pudieron aplicar los ajustes del kernel de '
+                           '%s' % SYSCTL_CONFIG_FILE)
+    return 'aplicar %s' % SYSCTL_CONFIG_FILE
+
+
+def reiniciar_red():
     '''
     Solicita al sistema operativo que recargue la configuracion de red.
     '''
-    retcode = subprocess.call(['systemctl', 'restart', 'networking.service'])
+    with tiempos.fase('reiniciar networking.service'):
+        retcode = subprocess.call(['systemctl', 'restart',
+                                   'networking.service'])
     if retcode != 0:
         raise RuntimeError('No se pudo recargar la configuración de red. '
                            'Verifique privilegios.')
 
 
-def obtener_contexto():
+def obtener_contexto(temporal=None):
     '''
-    Obtiene el contexto que se le proveerá a los templates.
+    Obtiene el contexto que se le proveerá a los templates a partir del
+    archivo temporal o de `temporal` si se especifica.
     '''
-    contexto = leer_temporal()
-    validar(contexto)
+    from . import config
+    with tiempos.fase('leer_temporal'):
+        contexto = leer_temporal(temporal)
+    with tiempos.fase('validar'):
+        validar(contexto)
+    if cache_dns_activa(contexto) and not dnsmasq_instalado():
+        raise validacion.ErrorValidacion(['cache_dns: dnsmasq no esta '
+                                          'instalado'])
     # si no se especifica configuracion de red, utilizo la configuracion de red
     # actualmente aplicada
     if not contexto.get('dhcp') and not contexto.get('ip'):
-        contexto.update(obtener_config_red())
-    contexto.update(config.DATABASE)
-    contexto.update(config.NETCOP)
+        with tiempos.fase('obtener_config_red'):
+            contexto.update(obtener_config_red())
+    # un unico stat() de netcop.config para ambas secciones
+    secciones = config.CONFIGURACION.secciones()
+    contexto.update(secciones['DATABASE'])
+    contexto.update(secciones['NETCOP'])
     return contexto
 
 
-def configurar():
+def archivos_configuracion(todos=False):
     '''
-    Escribe configuracion en los archivos correspondientes.
+    Devuelve tupla de tuplas (path, template) con los archivos de
+    configuracion generados a partir de templates. Los de la cache de nombres
+    local solo se incluyen si dnsmasq esta instalado o si `todos` es
+    verdadero (configuraciones para otros equipos).
     '''
-    FILES = (
+    archivos = (
         (NETWORK_CONFIG_FILE, 'br0.jinja'),
         (DNS_CONFIG_FILE, 'resolv.jinja'),
         (NETCOP_CONFIG_FILE, 'netcop.jinja'),
+        (SYSCTL_CONFIG_FILE, 'sysctl.jinja'),
     )
-    contexto = obtener_contexto()
-    env = Environment(loader=PackageLoader(__package__))
-    for path, template_name in FILES:
-        template = env.get_template(template_name)
-        config = template.render(**contexto)
-        with open(path, 'w') as f:
-            f.write(config.encode('utf-8'))
+    if todos or dnsmasq_instalado():
+        archivos += (
+            (DNSMASQ_CONFIG_FILE, 'dnsmasq.jinja'),
+            (DNSMASQ_RESOLV_FILE, 'dnsmasq.resolv.jinja'),
+        )
+    return archivos
+
+
+def dnsmasq_instalado():
+    '''
+    Indica si existe el directorio de configuracion de dnsmasq.
+    '''
+    return os.path.isdir(os.path.dirname(DNSMASQ_CONFIG_FILE))
+
+
+def cache_dns_activa(contexto):
+    '''
+    Indica si el contexto habilita la cache de nombres local.
+    '''
+    return str((contexto or {}).get('cache_dns', '')).lower() == 'si'
+
+
+def modelo_dns(contexto):
+    '''
+    Devuelve diccionario con la configuracion de la cache de nombres local
+    para los templates.
+    '''
+    return {
+        'cache_dns': cache_dns_activa(contexto),
+        'direccion_cache_dns': DIRECCION_CACHE_DNS,
+        'cache_dns_tamanio': (contexto.get('cache_dns_tamanio') or
+                              CACHE_DNS_TAMANIO),
+        'cache_dns_ttl_negativo': (contexto.get('cache_dns_ttl_negativo') or
+                                   CACHE_DNS_TTL_NEGATIVO),
+        'dnsmasq_resolv': DNSMASQ_RESOLV_FILE,
+    }
+
+
+def modelo_sondeo(contexto, sondear=True):
+    '''
+    Devuelve diccionario con `dns_opciones` para resolv.conf y, si se
+    especifico `dns_sondeo=si` y `sondear` es verdadero, con dns1 y dns2
+    ordenados por latencia. Las opciones solo se calculan aqui y reemplazan
+    cualquier valor del contexto.
+    '''
+    valores = {'dns_opciones': None}
+    if sondear and str(contexto.get('dns_sondeo', '')).lower() == 'si':
+        with tiempos.fase('sondeo dns'):
+            valores.update(sondeo.ordenar_contexto(contexto))
+    return valores
+
+
+class Recorrido(object):
+    '''
+    Secuencia que se genera nuevamente cada vez que se recorre llamando a
+    `funcion(*argumentos)`. Los templates pueden recorrerla tantas veces como
+    necesiten sin que los elementos se guarden en memoria.
+    '''
+    def __init__(self, funcion, *argumentos):
+        self.funcion = funcion
+        self.argumentos = argumentos
+
+    def __iter__(self):
+        return iter(self.funcion(*self.argumentos))
+
+
+def recorrer_vlans(valor):
+    for nombre, dispositivo, id_vlan in validacion.recorrer_vlans(valor):
+        yield {'nombre': nombre, 'dispositivo': dispositivo, 'id': id_vlan}
+
+
+def recorrer_puentes(valor):
+    for nombre, puertos in validacion.recorrer_puentes(valor):
+        yield {'nombre': nombre, 'puertos': puertos}
+
+
+def modelo_red(contexto):
+    '''
+    Devuelve diccionario con las subinterfaces VLAN (`vlans`) y los bridges
+    adicionales (`puentes`) del contexto como secuencias de diccionarios que
+    se generan a medida que se recorren, por lo que solo el texto del
+    contexto ocupa memoria proporcional a la cantidad de interfaces.
+    '''
+    return {
+        'vlans': Recorrido(recorrer_vlans, contexto.get('vlans') or ''),
+        'puentes': Recorrido(recorrer_puentes, contexto.get('puentes') or ''),
+    }
+
+
+def modelo_ajustes(contexto):
+    '''
+    Devuelve diccionario `ajustes` con los ajustes del bridge y de las
+    placas de red: los del perfil de ajuste (`perfil_red`) reemplazados por
+    los que se especifiquen en el contexto. Los ajustes sin valor son None y
+    mantienen el valor del kernel.
+    '''
+    valores = dict(validacion.PERFILES_RED[contexto.get('perfil_red') or
+                                           PERFIL_RED])
+    valores.update((clave, contexto[clave]) for clave in AJUSTES_RED
+                   if contexto.get(clave))
+    ajustes = dict((clave, None) for clave in AJUSTES_RED)
+    if valores.get('bridge_stp'):
+        ajustes['bridge_stp'] = validacion.booleano(valores['bridge_stp'])
+    for clave in ('bridge_fd', 'bridge_maxwait', 'mtu', 'txqueuelen'):
+        if valores.get(clave):
+            ajustes[clave] = int(valores[clave])
+    if ajustes['bridge_stp'] and 'bridge_fd' not in contexto and \
+            ajustes['bridge_fd'] is not None and ajustes['bridge_fd'] < 2:
+        # con STP el kernel no acepta la demora de reenvio del perfil
+        ajustes['bridge_fd'] = None
+    ajustes['offloads'] = validacion.offloads(valores['offloads']) \
+        if valores.get('offloads') else []
+    ajustes['anillos'] = validacion.anillos(valores['anillos']) \
+        if valores.get('anillos') else []
+    return {'ajustes': ajustes}
+
+
+def modelo_sysctl(contexto, flota=False):
+    '''
+    Devuelve diccionario `sysctl` con la lista de tuplas (clave, valor) de los
+    ajustes del kernel, vacia si no se especificaron las velocidades, y
+    `hosts` con la cantidad de hosts utilizada. Con `flota` el control de
+    congestion no depende del kernel de este equipo.
+    '''
+    from . import sysctl
+    ajustes = []
+    if contexto.get('bajada') and contexto.get('subida'):
+        ajustes = sysctl.calcular_contexto(
+            contexto, sysctl.CONGESTION_FLOTA if flota else None)
+    return {'sysctl': ajustes, 'hosts': contexto.get('hosts') or sysctl.HOSTS}
+
+
+def generar(template, variables):
+    '''
+    Renderiza el template a medida que se consume el generador, devolviendo
+    bloques de bytes. Los fragmentos generados se agrupan en bloques de
+    escritura.TAMANIO_BUFFER caracteres antes de codificarlos.
+    '''
+    partes = []
+    tamanio = 0
+    for parte in template.generate(**variables):
+        partes.append(parte)
+        tamanio += len(parte)
+        if tamanio >= escritura.TAMANIO_BUFFER:
+            yield u''.join(partes).encode('utf-8')
+            partes = []
+            tamanio = 0
+    if partes:
+        yield u''.join(partes).encode('utf-8')
+
+
+def renderizar(contexto, flota=False):
+    '''
+    Devuelve lista de tuplas (path, contenido) con el contenido que debe tener
+    cada archivo. El contenido es un generador de bloques de bytes que
+    renderiza el template a medida que se escribe el archivo, por lo que la
+    memoria utilizada, ademas del texto del contexto, no depende de la
+    cantidad de interfaces.
+
+    Con `flota` el contenido no depende del equipo que genera la
+    configuracion: se generan todos los archivos aunque dnsmasq no este
+    instalado localmente, no se miden los servidores de nombres y el control
+    de congestion es fijo.
+    '''
+    from . import plantillas
+    variables = dict(contexto)
+    variables.update(modelo_red(contexto))
+    variables.update(modelo_dns(contexto))
+    variables.update(modelo_sondeo(contexto, sondear=not flota))
+    variables.update(modelo_ajustes(contexto))
+    variables.update(modelo_sysctl(contexto, flota=flota))
+    archivos = []
+    for path, template_name in archivos_configuracion(todos=flota):
+        with tiempos.fase('cargar %s' % template_name):
+            template = plantillas.obtener_template(template_name)
+        archivos.append((path, generar(template, variables)))
+    return archivos
+
+
+def configurar(contexto=None, archivos=None):
+    '''
+    Escribe configuracion en los archivos correspondientes. Solo se reemplazan
+    los archivos cuyo contenido cambio y se reemplazan todos juntos de forma
+    atomica. Si se especifica la lista de tuplas (path, contenido) `archivos`
+    no se renderizan los templates.
+
+    El contenido de cada archivo se sigue generando a medida que se escribe;
+    el tiempo de generar cada bloque se suma a la fase `renderizar <path>`,
+    incluida dentro de la fase de escritura del archivo.
+
+    Devuelve lista con los archivos modificados.
+    '''
+    if archivos is None:
+        if contexto is None:
+            contexto = obtener_contexto()
+        archivos = [(path, tiempos.iterar('renderizar %s' % path, contenido))
+                    for path, contenido in renderizar(contexto)]
+    modificados = escritura.escribir(archivos, comparar=True)
+    cache.invalidar()
+    return modificados
+
+
+def actualizar_cache():
+    '''
+    Guarda en la cache la configuracion recien aplicada. La UI consulta la
+    configuracion sin permisos para escribir en el directorio de la cache,
+    por lo que la completa el proceso que aplica los cambios. Un error al
+    leer la configuracion no afecta la aplicacion de los cambios.
+    '''
+    try:
+        obtener_config(usar_cache=True)
+    except Exception as e:
+        syslog.syslog(syslog.LOG_WARNING,
+                      "No se pudo actualizar la cache: %s" % str(e))
+
+
+def estado_anterior(contexto):
+    '''
+    Devuelve tupla (archivos, contexto) con el contenido actual de los
+    archivos de configuracion y el contexto aplicado, para restaurarlos si la
+    nueva configuracion no supera la verificacion. Si no se pudo leer la
+    configuracion aplicada el contexto es None.
+    '''
+    archivos = []
+    for path, _ in archivos_configuracion():
+        try:
+            with open(path, 'rb') as f:
+                archivos.append((path, f.read()))
+        except IOError:
+            continue
+    try:
+        aplicado = obtener_config()
+    except Exception as e:
+        syslog.syslog(syslog.LOG_WARNING,
+                      "No se pudo leer la configuracion aplicada: %s" % str(e))
+        return archivos, None
+    anterior = dict((clave, valor) for clave, valor in contexto.items()
+                    if clave not in ('dns1', 'dns2', 'vlans', 'puentes',
+                                     'cache_dns_tamanio',
+                                     'cache_dns_ttl_negativo'))
+    anterior.update(aplicado)
+    return archivos, anterior
+
+
+def verificar_cambios(cambios, contexto, anterior):
+    '''
+    Verifica la red si cambio la configuracion de red, de los servidores de
+    nombres o de la cache de nombres local. Si la verificacion falla restaura
+    los archivos y el contexto de `anterior` (ver estado_anterior), los
+    vuelve a aplicar y lanza RuntimeError con los errores encontrados.
+
+    Devuelve lista con las acciones realizadas.
+    '''
+    verificados = (NETWORK_CONFIG_FILE, DNS_CONFIG_FILE, DNSMASQ_CONFIG_FILE,
+                   DNSMASQ_RESOLV_FILE)
+    if anterior is None or not any(path in cambios for path in verificados):
+        return []
+    from . import verificacion
+    with tiempos.fase('verificar red'):
+        errores = verificacion.verificar(contexto)
+    if not errores:
+        return ['verificar red']
+    syslog.syslog(syslog.LOG_ERR, "[*] La red no supero la verificacion: %s. "
+                  "Se restaurara la configuracion anterior" %
+                  '; '.join(errores))
+    archivos, contexto_anterior = anterior
+    with tiempos.fase('restaurar configuracion anterior'):
+        restaurados = configurar(contexto_anterior, archivos)
+        aplicar_cambios(restaurados, contexto_anterior)
+    raise RuntimeError('La red no supero la verificacion (%s). Se restauro '
+                       'la configuracion anterior' % '; '.join(errores))
+
+
+def procesar_temporal(temporal=None):
+    '''
+    Aplica la configuracion detallada en el archivo temporal creado por la UI,
+    o en `temporal` si se especifica: lee y valida los parametros, escribe los
+    archivos de configuracion, recarga la red, verifica que el equipo siga
+    conectado (salvo con `verificar=no`) y finalmente borra el archivo
+    temporal. Si la verificacion falla se restaura la configuracion anterior
+    y se lanza RuntimeError.
+
+    Devuelve lista con las acciones realizadas para aplicar los cambios.
+    '''
+    syslog.syslog(syslog.LOG_DEBUG, "[*] Iniciando configuracion")
+    from . import historial
+    contexto = obtener_contexto(temporal)
+    anterior = None
+    if str(contexto.get('verificar', '')).lower() != 'no':
+        with tiempos.fase('leer configuracion anterior'):
+            anterior = estado_anterior(contexto)
+    cambios = configurar(contexto)
+    syslog.syslog(syslog.LOG_INFO, "[*] Archivos modificados: %s" %
+                  (', '.join(cambios) or 'ninguno'))
+    syslog.syslog(syslog.LOG_DEBUG, "[*] Aplicando cambios")
+    acciones = aplicar_cambios(cambios, contexto)
+    acciones.extend(verificar_cambios(cambios, contexto, anterior))
+    syslog.syslog(syslog.LOG_INFO, "[*] Acciones realizadas: %s" %
+                  (', '.join(acciones) or 'ninguna'))
+    with tiempos.fase('registrar historial'):
+        historial.registrar(contexto, [path for path, _
+                                       in archivos_configuracion()])
+    with tiempos.fase('actualizar cache'):
+        actualizar_cache()
+    syslog.syslog(syslog.LOG_DEBUG, "[*] Borrando archivo temporal")
+    with tiempos.fase('borrar_temporal'):
+        borrar_temporal(temporal)
+    syslog.syslog(syslog.LOG_INFO, "[*] Configuracion realizada con exito")
+    return acciones
+
+
+def restaurar(version):
+    '''
+    Vuelve a aplicar los archivos de configuracion guardados en el historial
+    para la version indicada, sin renderizar los templates. La restauracion se
+    registra como una nueva version.
+
+    Devuelve lista con las acciones realizadas para aplicar los cambios.
+    '''
+    from . import historial
+    entrada = historial.obtener(version)
+    archivos = historial.leer_archivos(entrada)
+    cambios = configurar(entrada['contexto'], archivos)
+    syslog.syslog(syslog.LOG_INFO, "[*] Restaurando version %d: %s" %
+                  (version, ', '.join(cambios) or 'sin cambios'))
+    acciones = aplicar_cambios(cambios, entrada['contexto'])
+    historial.registrar(entrada['contexto'], [path for path, _ in archivos],
+                        origen=version)
+    actualizar_cache()
+    return acciones
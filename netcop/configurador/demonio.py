@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+'''
+Modo demonio del configurador.
+
+En lugar de esperar a que `cron` ejecute `configurador --set`, el demonio se
+suscribe mediante inotify al directorio que contiene el archivo temporal
+escrito por la UI y aplica la configuracion apenas la UI termina de escribirlo.
+
+Solo se atienden los eventos IN_CLOSE_WRITE (la UI cerro el archivo) e
+IN_MOVED_TO (la UI lo renombro atomicamente), de modo que nunca se lee un
+archivo escrito a medias. Mientras no hay eventos el proceso queda bloqueado
+sin consumir CPU.
+
+Si netcop.config tiene un horario semanal de velocidades, la espera se limita
+hasta la proxima transicion del horario, en la que se informan a netcop las
+velocidades del nuevo perfil sin reiniciar la red.
+'''
+import os
+import time
+import errno
+import select
+import ctypes
+import ctypes.util
+import struct
+import syslog
+from . import ancho_banda
+from . import cola
+from . import configurador
+from . import horario
+from . import tiempos
+
+# Constantes de inotify (ver <sys/inotify.h>)
+# -------------------------------------------------------------------------
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+EVENTO = struct.Struct('iIII')
+TAMANO_BUFFER = 4096
+
+# segundos hasta volver a notificar a netcop el perfil del horario si fallo
+# la notificacion (por ejemplo porque netcop se esta reiniciando)
+REINTENTO_HORARIO = 30
+
+_libc = None
+# tupla (clave, planificador) del horario de netcop.config
+_planificador = (None, None)
+
+
+def _obtener_libc():
+    '''
+    Carga la libreria de C que expone las llamadas al sistema de inotify.
+    '''
+    global _libc
+    if _libc is None:
+        nombre = ctypes.util.find_library('c') or 'libc.so.6'
+        _libc = ctypes.CDLL(nombre, use_errno=True)
+    return _libc
+
+
+def iniciar_inotify(directorio):
+    '''
+    Crea una instancia de inotify que observa `directorio` y devuelve su
+    descriptor de archivo.
+
+    En caso de error lanza OSError.
+    '''
+    libc = _obtener_libc()
+    fd = libc.inotify_init1(IN_CLOEXEC)
+    if fd < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    wd = libc.inotify_add_watch(fd, directorio.encode('utf-8'),
+                                IN_CLOSE_WRITE | IN_MOVED_TO)
+    if wd < 0:
+        err = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(err, '%s: %s' % (directorio, os.strerror(err)))
+    return fd
+
+
+def leer_eventos(fd):
+    '''
+    Bloquea hasta que haya eventos disponibles y devuelve una lista de tuplas
+    (mascara, nombre) con los eventos leidos.
+    '''
+    while True:
+        try:
+            buf = os.read(fd, TAMANO_BUFFER)
+            break
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+    eventos = []
+    offset = 0
+    while offset + EVENTO.size <= len(buf):
+        _, mascara, _, longitud = EVENTO.unpack_from(buf, offset)
+        offset += EVENTO.size
+        nombre = buf[offset:offset + longitud].rstrip(b'\0')
+        offset += longitud
+        eventos.append((mascara, nombre.decode('utf-8', 'replace')))
+    return eventos
+
+
+def esperar_eventos(fd, timeout):
+    '''
+    Espera hasta `timeout` segundos a que haya eventos disponibles. Devuelve
+    False si no los hay.
+    '''
+    limite = time.time() + timeout
+    while True:
+        restante = limite - time.time()
+        if restante <= 0:
+            return False
+        try:
+            return bool(select.select([fd], [], [], restante)[0])
+        except select.error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+
+
+def esperar_archivo(fd, nombre, timeout=None):
+    '''
+    Bloquea hasta que el archivo `nombre` haya sido cerrado luego de ser
+    escrito o movido al directorio observado. Si se especifica `timeout`
+    espera como maximo esa cantidad de segundos y devuelve False si el
+    archivo no fue escrito.
+    '''
+    limite = None if timeout is None else time.time() + timeout
+    while True:
+        if limite is not None and \
+                not esperar_eventos(fd, limite - time.time()):
+            return False
+        for mascara, evento in leer_eventos(fd):
+            # si se desborda la cola de eventos no se puede saber que archivo
+            # cambio, por lo que se asume que pudo ser el temporal
+            if mascara & IN_Q_OVERFLOW or evento == nombre:
+                return True
+
+
+def planificador():
+    '''
+    Devuelve el planificador del horario de velocidades de netcop.config o
+    None si no hay horario. Se vuelve a crear solo si cambian el horario o
+    las velocidades.
+    '''
+    global _planificador
+    from . import config
+    netcop = config.CONFIGURACION.NETCOP
+    clave = (netcop.get('horario'), netcop.get('velocidad_bajada'),
+             netcop.get('velocidad_subida'))
+    if not all(clave):
+        return None
+    if _planificador[0] != clave:
+        try:
+            _planificador = (clave, horario.Planificador(*clave))
+        except ValueError:
+            syslog.syslog(syslog.LOG_WARNING, "Horario invalido en "
+                          "netcop.config: %s" % clave[0])
+            _planificador = (clave, None)
+    return _planificador[1]
+
+
+def aplicar_horario(notificado=None):
+    '''
+    Informa a netcop las velocidades del perfil activo del horario si
+    difieren de `notificado`. Devuelve tupla (perfil notificado, segundos
+    hasta la proxima transicion o None si no hay horario). Si la notificacion
+    falla se espera como maximo REINTENTO_HORARIO segundos para reintentarla.
+    '''
+    plan = planificador()
+    if plan is None:
+        return None, None
+    perfil = plan.perfil()
+    if perfil != notificado:
+        resultado = ancho_banda.notificar(*perfil)
+        syslog.syslog(syslog.LOG_INFO, "[*] Horario: bajada %s subida %s "
+                      "(%s)" % (perfil[0], perfil[1], resultado))
+        if resultado == ancho_banda.NO_NOTIFICADO:
+            return None, min(plan.siguiente(), REINTENTO_HORARIO)
+    return perfil, plan.siguiente()
+
+
+def procesar(medir=False):
+    '''
+    Aplica el archivo temporal si existe, o reintenta la ultima aplicacion si
+    fallo. Los errores se registran en syslog sin detener el demonio. Los
+    tiempos de cada fase se registran siempre y si `medir` es verdadero
+    tambien se muestran por pantalla.
+    '''
+    if not configurador.existe_archivo_temporal() and not cola.pendiente():
+        return False
+    syslog.syslog(syslog.LOG_DEBUG, "[*] Se encontro archivo temporal")
+    try:
+        with tiempos.medicion(mostrar=medir):
+            cola.enviar()
+    except Exception as e:
+        syslog.syslog(syslog.LOG_CRIT, "%s - %s" % (e.__class__, str(e)))
+        return False
+    return True
+
+
+def ejecutar(medir=False):
+    '''
+    Bucle principal del demonio. Nunca retorna.
+    '''
+    directorio, nombre = os.path.split(configurador.TMP_CONFIG_FILE)
+    fd = iniciar_inotify(directorio)
+    syslog.syslog(syslog.LOG_INFO, "[*] Observando %s" %
+                  configurador.TMP_CONFIG_FILE)
+    notificado = None
+    try:
+        while True:
+            # la UI pudo haber escrito el archivo antes de que se inicie el
+            # demonio o mientras se aplicaba la configuracion anterior
+            procesar(medir)
+            notificado, espera = aplicar_horario(notificado)
+            esperar_archivo(fd, nombre, espera)
+    finally:
+        os.close(fd)
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+'''
+Escritura atomica de varios archivos de configuracion.
+
+Escribir los archivos con `open(path, 'w')` los trunca en el lugar, por lo que
+un corte de energia puede dejar un archivo vacio o escrito a medias. En su
+lugar, cada archivo se escribe en un temporal dentro del mismo directorio y
+luego se lo renombra sobre el archivo destino.
+
+Para no pagar un fsync completo por archivo, la sincronizacion se hace en
+lotes:
+
+1. Se escriben todos los temporales.
+2. Se llama a fdatasync sobre cada temporal.
+3. Se renombran todos los temporales sobre sus destinos.
+4. Se llama a fsync una sola vez por cada directorio involucrado.
+
+Si algo falla antes de renombrar, se borran los temporales y los archivos
+destino quedan intactos.
+
+El contenido puede ser un generador de bloques (por ejemplo la salida de
+`Template.generate()`), que se escribe a medida que se genera, de modo que la
+memoria utilizada no depende del tamanio del archivo. Para no reemplazar los
+archivos que no cambiaron, el contenido se compara contra el archivo actual a
+medida que se genera y solo se crea el temporal al encontrar una diferencia.
+'''
+import os
+import stat
+import hashlib
+import tempfile
+import itertools
+from . import tiempos
+
+# permisos de los archivos que no existian previamente
+PERMISOS_POR_DEFECTO = 0o644
+# tamanio de los bloques de lectura y escritura
+TAMANIO_BUFFER = 64 * 1024
+
+
+def _destino(path):
+    '''
+    Resuelve enlaces simbolicos, de modo que se reemplace el archivo apuntado
+    (por ejemplo /etc/resolv.conf suele ser un enlace) y no el enlace.
+    '''
+    if os.path.islink(path):
+        return os.path.realpath(path)
+    return path
+
+
+def _escribir_todo(fd, contenido):
+    vista = memoryview(contenido)
+    while vista:
+        vista = vista[os.write(fd, vista):]
+
+
+def _bloques(contenido):
+    '''
+    Devuelve un iterable de bloques de bytes a partir de una cadena de bytes
+    o de un iterable de cadenas de bytes.
+    '''
+    if isinstance(contenido, bytes):
+        return (contenido,)
+    return contenido
+
+
+def _agrupar(contenido):
+    '''
+    Agrupa los bloques chicos del contenido (por ejemplo los fragmentos que
+    genera un template) en bloques de TAMANIO_BUFFER bytes.
+    '''
+    buffer = []
+    tamanio = 0
+    for bloque in _bloques(contenido):
+        buffer.append(bloque)
+        tamanio += len(bloque)
+        if tamanio >= TAMANIO_BUFFER:
+            yield b''.join(buffer)
+            buffer = []
+            tamanio = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _escribir_bloques(fd, contenido):
+    '''
+    Escribe el contenido en `fd` realizando una llamada a write() por cada
+    bloque agrupado.
+    '''
+    for bloque in _agrupar(contenido):
+        _escribir_todo(fd, bloque)
+
+
+def _crear_temporal(path, contenido):
+    '''
+    Escribe `contenido` en un archivo temporal en el mismo directorio que
+    `path`, con los mismos permisos y duenio. Devuelve tupla (fd, temporal).
+    '''
+    directorio, nombre = os.path.split(path)
+    fd, temporal = tempfile.mkstemp(prefix='.%s.' % nombre, dir=directorio)
+    try:
+        try:
+            actual = os.stat(path)
+        except OSError:
+            os.fchmod(fd, PERMISOS_POR_DEFECTO)
+        else:
+            os.fchmod(fd, stat.S_IMODE(actual.st_mode))
+            if (actual.st_uid, actual.st_gid) != (os.geteuid(),
+                                                  os.getegid()):
+                os.fchown(fd, actual.st_uid, actual.st_gid)
+        _escribir_bloques(fd, contenido)
+    except Exception:
+        os.close(fd)
+        os.remove(temporal)
+        raise
+    return fd, temporal
+
+
+def _leer_prefijo(path, tamanio):
+    '''
+    Devuelve un iterador de bloques de los primeros `tamanio` bytes del
+    archivo.
+    '''
+    with open(path, 'rb') as f:
+        while tamanio > 0:
+            bloque = f.read(min(tamanio, TAMANIO_BUFFER))
+            if not bloque:
+                break
+            tamanio -= len(bloque)
+            yield bloque
+
+
+def _comparar(path, contenido):
+    '''
+    Compara el contenido con el del archivo `path` a medida que se genera,
+    sin crear un temporal. Devuelve None si son iguales o, en caso contrario,
+    un iterable con el contenido completo, cuyo prefijo coincidente se vuelve
+    a leer del archivo en lugar de guardarlo en memoria.
+    '''
+    bloques = _agrupar(contenido)
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        return bloques
+    with f:
+        leidos = 0
+        for bloque in bloques:
+            if f.read(len(bloque)) != bloque:
+                return itertools.chain(_leer_prefijo(path, leidos), [bloque],
+                                       bloques)
+            leidos += len(bloque)
+        if not f.read(1):
+            return None
+    # el archivo actual es mas largo que el contenido
+    return _leer_prefijo(path, leidos)
+
+
+def hash_archivo(path):
+    '''
+    Devuelve el hash SHA-256 del contenido del archivo o None si no existe.
+    '''
+    h = hashlib.sha256()
+    try:
+        for bloque in leer_bloques(path):
+            h.update(bloque)
+    except IOError:
+        return None
+    return h.hexdigest()
+
+
+def leer_bloques(path):
+    '''
+    Devuelve un iterador de bloques del contenido del archivo, que se lee a
+    medida que se consume.
+    '''
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANIO_BUFFER), b''):
+            yield bloque
+
+
+def directorio_seguro(directorio):
+    '''
+    Verifica que el directorio exista, pertenezca a root o al usuario actual y
+    que ningun otro usuario pueda escribir en el. Si no existe intenta
+    crearlo.
+    '''
+    try:
+        os.makedirs(directorio, 0o755)
+    except OSError:
+        pass
+    try:
+        info = os.lstat(directorio)
+    except OSError:
+        return False
+    return (stat.S_ISDIR(info.st_mode) and
+            info.st_uid in (0, os.geteuid()) and
+            not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+
+def sincronizar_directorio(directorio):
+    '''
+    Persiste las entradas del directorio (los renombres realizados).
+    '''
+    fd = os.open(directorio, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def escribir(archivos, comparar=False):
+    '''
+    Escribe atomicamente la lista de tuplas (path, contenido). `contenido`
+    debe ser una cadena de bytes o un iterable de cadenas de bytes, que se
+    escribe a medida que se genera.
+
+    Si `comparar` es verdadero no se reemplazan los archivos cuyo contenido
+    no cambio. Devuelve la lista de archivos escritos.
+
+    Ante un error lanza la excepcion correspondiente sin dejar archivos
+    truncados ni temporales.
+    '''
+    descriptores = []
+    pendientes = []
+    escritos = []
+    try:
+        # escribe y sincroniza todos los temporales
+        for path, contenido in archivos:
+            destino = _destino(path)
+            with tiempos.fase('escribir %s' % path):
+                if comparar:
+                    contenido = _comparar(destino, contenido)
+                    if contenido is None:
+                        continue
+                fd, temporal = _crear_temporal(destino, contenido)
+            descriptores.append(fd)
+            pendientes.append((temporal, destino))
+            escritos.append(path)
+        with tiempos.fase('fdatasync'):
+            for fd in descriptores:
+                os.fdatasync(fd)
+        while descriptores:
+            os.close(descriptores.pop())
+        # renombra todos los temporales sobre sus destinos
+        directorios = set(os.path.dirname(d) for _, d in pendientes)
+        with tiempos.fase('renombrar'):
+            while pendientes:
+                temporal, destino = pendientes[0]
+                os.rename(temporal, destino)
+                pendientes.pop(0)
+    finally:
+        for fd in descriptores:
+            os.close(fd)
+        for temporal, _ in pendientes:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+    # persiste los renombres una vez por directorio
+    with tiempos.fase('sincronizar directorios'):
+        for directorio in sorted(directorios):
+            sincronizar_directorio(directorio)
+    return escritos
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+'''
+Generacion de configuraciones para muchos equipos a la vez.
+
+Lee un archivo CSV (con encabezado) o JSONL con un conjunto de parametros por
+fila, uno por equipo, valida cada fila y escribe los archivos de
+configuracion de cada equipo en un arbol propio dentro del directorio
+destino:
+
+    <destino>/<nombre>/etc/network/interfaces.d/br0
+    <destino>/<nombre>/etc/resolv.conf
+    <destino>/<nombre>/etc/netcop/netcop.config
+    <destino>/<nombre>/etc/sysctl.d/90-netcop.conf
+    <destino>/<nombre>/etc/dnsmasq.d/netcop.conf
+    <destino>/<nombre>/etc/netcop/dnsmasq.resolv
+
+Los archivos de la cache de nombres local (dnsmasq) se generan siempre, sin
+importar si dnsmasq esta instalado en el equipo que genera las
+configuraciones; con `cache_dns=no` indican que la cache esta deshabilitada.
+Con `dns_sondeo=si` no se miden los servidores de nombres, ya que la
+latencia desde este equipo no es la del equipo configurado, y el control de
+congestion TCP de sysctl es siempre CUBIC, disponible en cualquier kernel.
+
+Ademas de los parametros del archivo temporal, cada fila puede tener la
+columna `nombre` (por defecto se utiliza el numero de fila) y cualquier valor
+de netcop.config (`outside`, `inside`, `database`, etc.); las demas columnas
+se informan como error, igual que en el archivo temporal. Los nombres no se
+pueden repetir: las filas con un nombre ya utilizado se informan como error
+en lugar de sobrescribir la configuracion de la primera.
+
+El trabajo se reparte en un pool de procesos; cada proceso crea una unica vez
+el entorno de templates compilados. Las filas se leen y procesan de a lotes
+acotados, por lo que la memoria utilizada solo depende de la cantidad de
+filas por los nombres que se recuerdan para detectar los repetidos.
+'''
+import os
+import re
+import csv
+import json
+import itertools
+import multiprocessing
+from . import config
+from . import configurador
+from . import plantillas
+from . import validacion
+
+# filas enviadas a cada proceso por vez
+TAMANO_CHUNK = 64
+# nombres de equipo permitidos (se utilizan como nombre de directorio)
+REGEX_NOMBRE = re.compile(r'^\w[\w.-]*$')
+# columnas permitidas ademas de los parametros del archivo temporal
+COLUMNAS = (('nombre',) + tuple(sorted(config.Default.DATABASE)) +
+            tuple(sorted(config.Default.NETCOP)))
+
+try:
+    TEXTO = basestring
+except NameError:
+    TEXTO = str
+
+
+def leer_filas(archivo, formato=None):
+    '''
+    Devuelve un iterador de diccionarios con los parametros de cada fila.
+    El formato (csv o jsonl) se deduce de la extension si no se especifica.
+    '''
+    if formato is None:
+        formato = 'jsonl' if archivo.endswith(('.jsonl', '.json')) else 'csv'
+    with open(archivo) as f:
+        if formato == 'csv':
+            for fila in csv.DictReader(f):
+                yield dict((k, v) for k, v in fila.items() if k and v)
+        else:
+            for linea in f:
+                if linea.strip():
+                    fila = json.loads(linea)
+                    yield dict((k, v if isinstance(v, TEXTO) else str(v))
+                               for k, v in fila.items())
+
+
+def contexto(fila):
+    '''
+    Obtiene el contexto que se le proveera a los templates para una fila.
+    '''
+    contexto = dict(config.Default.DATABASE)
+    contexto.update(config.Default.NETCOP)
+    contexto.update(fila)
+    return contexto
+
+
+def nombre_fila(numero, fila):
+    '''
+    Devuelve el nombre del equipo de la fila.
+    '''
+    return fila.get('nombre') or str(numero)
+
+
+def errores_fila(nombre, fila, repetido=False):
+    '''
+    Devuelve la lista de errores de una fila. Con `repetido` el nombre ya fue
+    utilizado por una fila anterior.
+    '''
+    errores = validacion.validar_lote([fila], permitidas=COLUMNAS)[0]
+    if not REGEX_NOMBRE.match(nombre):
+        errores.append('nombre {0}: formato invalido'.format(nombre))
+    elif repetido:
+        errores.append('nombre {0}: repetido'.format(nombre))
+    dhcp = str(fila.get('dhcp', '')).lower() == 'si'
+    if not dhcp and not fila.get('ip'):
+        errores.append('Debe ingresar ip o dhcp=si')
+    return errores
+
+
+def iniciar_proceso():
+    '''
+    Compila los templates una unica vez en cada proceso del pool.
+    '''
+    for _, nombre in configurador.archivos_configuracion(todos=True):
+        plantillas.obtener_template(nombre)
+
+
+def procesar_fila(trabajo):
+    '''
+    Valida y genera los archivos de configuracion de una fila. `trabajo` es
+    una tupla (destino, numero, fila, repetido). Devuelve tupla (numero,
+    nombre, errores).
+    '''
+    destino, numero, fila, repetido = trabajo
+    nombre = nombre_fila(numero, fila)
+    errores = errores_fila(nombre, fila, repetido)
+    if errores:
+        return numero, nombre, errores
+    try:
+        for path, contenido in configurador.renderizar(contexto(fila),
+                                                       flota=True):
+            salida = os.path.join(destino, nombre, path.lstrip('/'))
+            directorio = os.path.dirname(salida)
+            if not os.path.isdir(directorio):
+                os.makedirs(directorio)
+            with open(salida, 'wb') as f:
+                for bloque in contenido:
+                    f.write(bloque)
+    except Exception as e:
+        return numero, nombre, ['%s - %s' % (e.__class__.__name__, str(e))]
+    return numero, nombre, []
+
+
+def generar(filas, destino, procesos=None, tamano_chunk=TAMANO_CHUNK):
+    '''
+    Genera las configuraciones de todas las filas en `destino`. Devuelve un
+    iterador de tuplas (numero, nombre, errores) en el orden de las filas.
+    '''
+    procesos = procesos or multiprocessing.cpu_count()
+    nombres = set()
+
+    def trabajo(numero, fila):
+        # el primer equipo con cada nombre es el que se genera
+        nombre = nombre_fila(numero, fila)
+        repetido = nombre in nombres
+        nombres.add(nombre)
+        return destino, numero, fila, repetido
+
+    trabajos = (trabajo(numero, fila) for numero, fila in enumerate(filas, 1))
+    # se envian lotes acotados para no cargar todas las filas en memoria
+    tamano_lote = procesos * tamano_chunk * 4
+    pool = multiprocessing.Pool(procesos, initializer=iniciar_proceso)
+    try:
+        while True:
+            lote = list(itertools.islice(trabajos, tamano_lote))
+            if not lote:
+                break
+            for resultado in pool.imap(procesar_fila, lote, tamano_chunk):
+                yield resultado
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def ejecutar(archivo, destino, procesos=None, formato=None):
+    '''
+    Genera las configuraciones e imprime un informe con los errores de cada
+    fila. Devuelve la cantidad de filas con errores.
+    '''
+    generadas = 0
+    fallidas = 0
+    for numero, nombre, errores in generar(leer_filas(archivo, formato),
+                                           destino, procesos):
+        if errores:
+            fallidas += 1
+            for error in errores:
+                print('fila %d (%s): %s' % (numero, nombre, error))
+        else:
+            generadas += 1
+    print('%d configuraciones generadas, %d con errores' %
+          (generadas, fallidas))
+    return fallidas
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+'''
+Historial de versiones de la configuracion aplicada.
+
+Cada vez que se aplica una configuracion se agrega una entrada al final del
+archivo historial.jsonl con el numero de version, la fecha, el contexto
+validado y el hash SHA-256 del contenido de cada archivo generado:
+
+    {"version": 7, "fecha": "2016-05-02T10:20:30", "origen": null,
+     "contexto": {...}, "archivos": {"/etc/resolv.conf": "9f86d0...", ...}}
+
+El contenido de los archivos se guarda en objetos/<hash>, por lo que los
+archivos que no cambian entre versiones se guardan una unica vez.
+
+Para volver a una version anterior se copian los objetos guardados sobre los
+archivos de configuracion, sin volver a generar los templates. La restauracion
+se registra como una nueva version cuyo origen es la version restaurada.
+
+Para no ocupar la memoria flash, cuando el historial duplica la cantidad de
+versiones a conservar se reescribe con las ultimas versiones y se borran los
+objetos que ya no se utilizan.
+'''
+import os
+import json
+import time
+import errno
+import syslog
+from . import escritura
+
+# directorio donde se guarda el historial
+DIRECTORIO = '/var/lib/netcop/historial'
+# cantidad de versiones que se conservan al compactar
+CONSERVAR = 20
+
+
+def ruta(*partes):
+    return os.path.join(DIRECTORIO, *partes)
+
+
+def preparar_directorio():
+    '''
+    Crea el directorio del historial con acceso solo para root, ya que el
+    contexto y netcop.config contienen la contrasenia de la base de datos.
+    '''
+    if not escritura.directorio_seguro(DIRECTORIO):
+        raise OSError(errno.EPERM, '%s no es un directorio seguro' %
+                      DIRECTORIO)
+    os.chmod(DIRECTORIO, 0o700)
+    if not os.path.isdir(ruta('objetos')):
+        os.mkdir(ruta('objetos'), 0o700)
+
+
+def listar():
+    '''
+    Devuelve la lista de entradas del historial, de la mas antigua a la mas
+    reciente.
+    '''
+    entradas = []
+    try:
+        with open(ruta('historial.jsonl')) as f:
+            for linea in f:
+                try:
+                    entradas.append(json.loads(linea))
+                except ValueError:
+                    # linea incompleta por un corte de energia
+                    continue
+    except IOError:
+        pass
+    return entradas
+
+
+def obtener(version):
+    '''
+    Devuelve la entrada de la version indicada. Lanza ValueError si no
+    existe.
+    '''
+    for entrada in listar():
+        if entrada['version'] == version:
+            return entrada
+    raise ValueError('No existe la version %d en el historial' % version)
+
+
+def leer_archivos(entrada):
+    '''
+    Devuelve lista de tuplas (path, contenido) con los archivos guardados de
+    una entrada. El contenido es un generador de bloques que se lee a medida
+    que se consume.
+    '''
+    archivos = []
+    for path, clave in sorted(entrada['archivos'].items()):
+        if not os.path.isfile(ruta('objetos', clave)):
+            raise ValueError('No se encuentra el contenido de %s' % path)
+        archivos.append((path, escritura.leer_bloques(ruta('objetos',
+                                                           clave))))
+    return archivos
+
+
+def registrar(contexto, archivos, origen=None):
+    '''
+    Agrega una nueva version al historial con el contexto y el contenido
+    actual de la lista de archivos de configuracion. Devuelve el numero de
+    version o None si no se pudo registrar. Los errores se registran en
+    syslog sin interrumpir la aplicacion de la configuracion.
+    '''
+    try:
+        preparar_directorio()
+        entradas = listar()
+        objetos = {}
+        nuevos = []
+        for path in archivos:
+            clave = escritura.hash_archivo(path)
+            if clave is None:
+                raise IOError(errno.ENOENT, 'No existe %s' % path)
+            objetos[path] = clave
+            if not os.path.exists(ruta('objetos', clave)):
+                nuevos.append((ruta('objetos', clave),
+                               escritura.leer_bloques(path)))
+        escritura.escribir(nuevos)
+        entrada = {
+            'version': entradas[-1]['version'] + 1 if entradas else 1,
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'origen': origen,
+            'contexto': contexto,
+            'archivos': objetos,
+        }
+        fd = os.open(ruta('historial.jsonl'),
+                     os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, (json.dumps(entrada, sort_keys=True) +
+                          '\n').encode('utf-8'))
+            os.fdatasync(fd)
+        finally:
+            os.close(fd)
+        if len(entradas) + 1 >= 2 * CONSERVAR:
+            compactar(entradas + [entrada])
+        return entrada['version']
+    except (IOError, OSError) as e:
+        syslog.syslog(syslog.LOG_WARNING,
+                      "No se pudo registrar la version en el historial: %s" %
+                      str(e))
+        return None
+
+
+def compactar(entradas=None, conservar=None):
+    '''
+    Reescribe el historial con las ultimas `conservar` versiones y borra los
+    objetos que ya no se utilizan.
+    '''
+    if entradas is None:
+        entradas = listar()
+    entradas = entradas[-(conservar or CONSERVAR):]
+    contenido = ''.join(json.dumps(entrada, sort_keys=True) + '\n'
+                        for entrada in entradas)
+    escritura.escribir([(ruta('historial.jsonl'), contenido.encode('utf-8'))])
+    utilizados = set(clave for entrada in entradas
+                     for clave in entrada['archivos'].values())
+    for clave in os.listdir(ruta('objetos')):
+        if clave not in utilizados:
+            os.remove(ruta('objetos', clave))
+
+
+def resumen(entrada):
+    '''
+    Devuelve una descripcion de una linea de la entrada.
+    '''
+    contexto = entrada['contexto']
+    if str(contexto.get('dhcp', '')).lower() == 'si':
+        red = 'dhcp'
+    else:
+        red = '%s/%s gw %s' % (contexto.get('ip'), contexto.get('mascara'),
+                               contexto.get('gateway'))
+    texto = '%4d  %s  %s  bajada %s subida %s' % (
+        entrada['version'], entrada['fecha'], red, contexto.get('bajada'),
+        contexto.get('subida'))
+    if entrada.get('origen'):
+        texto += '  (restaura la version %d)' % entrada['origen']
+    return texto
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+'''
+Horario semanal de velocidades del enlace de Internet.
+
+El parametro `horario` define franjas semanales con velocidades propias, por
+ejemplo `lun-vie@08:00-18:00=10/2 sab,dom@00:00-24:00=50/10`. Fuera de las
+franjas se utilizan `bajada` y `subida`. El horario se escribe en
+netcop.config (clave `horario` de la seccion [netcop]).
+
+Al crear el planificador se calculan una unica vez las transiciones de la
+semana, ordenadas por minuto de la semana. El planificador recuerda el perfil
+activo y el instante de la proxima transicion, por lo que consultar el perfil
+activo es O(1) salvo al cruzar una transicion, donde se busca la siguiente
+con bisect.
+
+El demonio espera hasta la proxima transicion y le informa a netcop las
+nuevas velocidades sin reiniciar la red.
+'''
+import time
+import bisect
+from . import validacion
+
+MINUTOS_DIA = 24 * 60
+MINUTOS_SEMANA = 7 * MINUTOS_DIA
+
+
+def transiciones(franjas, bajada, subida):
+    '''
+    Devuelve lista ordenada de tuplas (minuto de la semana, (bajada, subida))
+    con los cambios de perfil de la semana a partir de las franjas
+    convertidas por validacion.horario.
+    '''
+    base = (float(bajada), float(subida))
+    intervalos = sorted((dia * MINUTOS_DIA + inicio, dia * MINUTOS_DIA + fin,
+                         (franja_bajada, franja_subida))
+                        for numeros, inicio, fin, franja_bajada, franja_subida
+                        in franjas for dia in numeros)
+    cambios = []
+    for inicio, fin, perfil in intervalos:
+        if cambios and cambios[-1][0] == inicio:
+            # la franja anterior termina donde empieza esta
+            cambios.pop()
+        cambios.append((inicio, perfil))
+        cambios.append((fin % MINUTOS_SEMANA, base))
+    # una franja que termina el domingo a las 24:00 vuelve al lunes a las 0
+    if len(cambios) > 1 and cambios[-1][0] == cambios[0][0]:
+        cambios.pop()
+    cambios.sort(key=lambda cambio: cambio[0])
+    # quita los cambios que no modifican el perfil
+    resultado = []
+    for minuto, perfil in cambios:
+        if not resultado or resultado[-1][1] != perfil:
+            resultado.append((minuto, perfil))
+    if len(resultado) > 1 and resultado[0][1] == resultado[-1][1]:
+        resultado.pop(0)
+    return resultado
+
+
+class Planificador(object):
+    '''
+    Perfil de velocidades activo segun el horario semanal.
+    '''
+
+    def __init__(self, horario, bajada, subida):
+        self.base = (float(bajada), float(subida))
+        self.transiciones = transiciones(validacion.horario(horario or ''),
+                                         bajada, subida)
+        self.minutos = [minuto for minuto, _ in self.transiciones]
+        self._desde = self._hasta = None
+        self._perfil = self.base
+
+    def perfil(self, ahora=None):
+        '''
+        Devuelve la tupla (bajada, subida) activa en el instante `ahora`.
+        '''
+        ahora = time.time() if ahora is None else ahora
+        if self._desde is None or not self._desde <= ahora < self._hasta:
+            self._actualizar(ahora)
+        return self._perfil
+
+    def siguiente(self, ahora=None):
+        '''
+        Devuelve los segundos que faltan para la proxima transicion o None si
+        no hay horario.
+        '''
+        ahora = time.time() if ahora is None else ahora
+        self.perfil(ahora)
+        if self._hasta == float('inf'):
+            return None
+        return self._hasta - ahora
+
+    def _actualizar(self, ahora):
+        '''
+        Busca el perfil activo en `ahora` y el instante de la proxima
+        transicion.
+        '''
+        self._desde = ahora
+        if not self.transiciones:
+            self._perfil, self._hasta = self.base, float('inf')
+            return
+        local = time.localtime(ahora)
+        minuto = (local.tm_wday * MINUTOS_DIA + local.tm_hour * 60 +
+                  local.tm_min)
+        # comienzo del minuto actual
+        inicio = ahora - local.tm_sec - (ahora % 1)
+        indice = bisect.bisect_right(self.minutos, minuto) - 1
+        # antes de la primera transicion rige la ultima de la semana anterior
+        self._perfil = self.transiciones[indice][1]
+        if indice + 1 < len(self.minutos):
+            proximo = self.minutos[indice + 1]
+        else:
+            proximo = self.minutos[0] + MINUTOS_SEMANA
+        self._hasta = inicio + (proximo - minuto) * 60
+
+
+def perfil_contexto(contexto, ahora=None):
+    '''
+    Devuelve la tupla (bajada, subida) activa para el contexto.
+    '''
+    return Planificador(contexto.get('horario'), contexto['bajada'],
+                        contexto['subida']).perfil(ahora)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+'''
+Obtiene la configuracion de red aplicada consultando directamente al kernel
+mediante rtnetlink, sin ejecutar `ip` a traves de un shell.
+
+En un mismo datagrama se envian dos solicitudes:
+
+* RTM_GETROUTE hacia 8.8.8.8 para obtener el gateway y la interfaz de salida.
+* RTM_GETADDR (dump) para obtener las direcciones IPv4 de todas las
+  interfaces, de las que luego se elige la primaria de la interfaz de salida.
+
+De esta forma la consulta completa se resuelve en un solo viaje al kernel.
+'''
+import socket
+import struct
+
+# Constantes de netlink (ver <linux/netlink.h> y <linux/rtnetlink.h>)
+# -------------------------------------------------------------------------
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x001
+NLM_F_DUMP = 0x300
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_GETROUTE = 26
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_F_SECONDARY = 0x01
+
+# numeros de secuencia de cada solicitud
+SEQ_RUTA = 1
+SEQ_DIRECCIONES = 2
+
+# destino utilizado para obtener la ruta por defecto
+DESTINO = '8.8.8.8'
+TIMEOUT = 1.0
+
+NLMSGHDR = struct.Struct('=IHHII')
+RTMSG = struct.Struct('=BBBBBBBBI')
+IFADDRMSG = struct.Struct('=BBBBI')
+RTATTR = struct.Struct('=HH')
+
+
+def _alinear(longitud):
+    return (longitud + 3) & ~3
+
+
+def mensaje(tipo, flags, seq, payload):
+    '''
+    Arma un mensaje netlink con su cabecera.
+    '''
+    longitud = NLMSGHDR.size + len(payload)
+    cabecera = NLMSGHDR.pack(longitud, tipo, flags, seq, 0)
+    return cabecera + payload + b'\0' * (_alinear(longitud) - longitud)
+
+
+def atributo(tipo, valor):
+    '''
+    Arma un atributo rtattr.
+    '''
+    longitud = RTATTR.size + len(valor)
+    return (RTATTR.pack(longitud, tipo) + valor +
+            b'\0' * (_alinear(longitud) - longitud))
+
+
+def parsear_mensajes(datos):
+    '''
+    Devuelve una lista de tuplas (tipo, seq, payload) con los mensajes
+    contenidos en `datos`.
+    '''
+    mensajes = []
+    offset = 0
+    while offset + NLMSGHDR.size <= len(datos):
+        longitud, tipo, _, seq, _ = NLMSGHDR.unpack_from(datos, offset)
+        if longitud < NLMSGHDR.size:
+            break
+        payload = datos[offset + NLMSGHDR.size:offset + longitud]
+        mensajes.append((tipo, seq, payload))
+        offset += _alinear(longitud)
+    return mensajes
+
+
+def parsear_atributos(datos):
+    '''
+    Devuelve un diccionario tipo -> valor con los atributos rtattr contenidos
+    en `datos`.
+    '''
+    atributos = {}
+    offset = 0
+    while offset + RTATTR.size <= len(datos):
+        longitud, tipo = RTATTR.unpack_from(datos, offset)
+        if longitud < RTATTR.size:
+            break
+        atributos.setdefault(tipo, datos[offset + RTATTR.size:
+                                         offset + longitud])
+        offset += _alinear(longitud)
+    return atributos
+
+
+def solicitud():
+    '''
+    Arma el datagrama con las solicitudes de ruta y direcciones.
+    '''
+    ruta = RTMSG.pack(socket.AF_INET, 32, 0, 0, 0, 0, 0, 0, 0)
+    ruta += atributo(RTA_DST, socket.inet_aton(DESTINO))
+    direcciones = IFADDRMSG.pack(socket.AF_INET, 0, 0, 0, 0)
+    return (mensaje(RTM_GETROUTE, NLM_F_REQUEST, SEQ_RUTA, ruta) +
+            mensaje(RTM_GETADDR, NLM_F_REQUEST | NLM_F_DUMP, SEQ_DIRECCIONES,
+                    direcciones))
+
+
+class Respuesta(object):
+    '''
+    Acumula los mensajes recibidos del kernel hasta completar la consulta.
+    '''
+
+    def __init__(self):
+        self.gateway = None
+        self.interfaz = None
+        self.direcciones = []
+        self.ruta_recibida = False
+        self.dump_terminado = False
+
+    @property
+    def completa(self):
+        return self.ruta_recibida and self.dump_terminado
+
+    def procesar(self, datos):
+        '''
+        Procesa un datagrama recibido del kernel.
+
+        En caso de que el kernel devuelva un error lanza OSError.
+        '''
+        for tipo, seq, payload in parsear_mensajes(datos):
+            if tipo == NLMSG_ERROR:
+                error = struct.unpack_from('=i', payload)[0]
+                if error:
+                    raise OSError(-error, 'netlink: %s' % DESTINO)
+            elif tipo == NLMSG_DONE and seq == SEQ_DIRECCIONES:
+                self.dump_terminado = True
+            elif tipo == RTM_NEWROUTE and seq == SEQ_RUTA:
+                self._procesar_ruta(payload)
+            elif tipo == RTM_NEWADDR and seq == SEQ_DIRECCIONES:
+                self._procesar_direccion(payload)
+
+    def _procesar_ruta(self, payload):
+        attrs = parsear_atributos(payload[RTMSG.size:])
+        if RTA_GATEWAY in attrs:
+            self.gateway = socket.inet_ntoa(attrs[RTA_GATEWAY])
+        if RTA_OIF in attrs:
+            self.interfaz = struct.unpack('=i', attrs[RTA_OIF])[0]
+        self.ruta_recibida = True
+
+    def _procesar_direccion(self, payload):
+        familia, prefijo, flags, _, indice = IFADDRMSG.unpack_from(payload)
+        if familia != socket.AF_INET or flags & IFA_F_SECONDARY:
+            return
+        attrs = parsear_atributos(payload[IFADDRMSG.size:])
+        ip = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+        if ip:
+            self.direcciones.append((indice, socket.inet_ntoa(ip), prefijo))
+
+    def resultado(self):
+        '''
+        Devuelve tupla (gateway, ip, prefijo) de la interfaz de salida.
+
+        En caso de que no haya gateway o direccion lanza ValueError.
+        '''
+        if self.gateway is None:
+            raise ValueError('No existe ruta por defecto hacia %s' % DESTINO)
+        for indice, ip, prefijo in self.direcciones:
+            if indice == self.interfaz:
+                return self.gateway, ip, prefijo
+        raise ValueError('La interfaz de salida no posee direccion IPv4')
+
+
+def consultar():
+    '''
+    Consulta al kernel y devuelve tupla (gateway, ip, prefijo) de la interfaz
+    por donde sale la ruta por defecto.
+
+    Lanza socket.error u OSError si no es posible utilizar netlink.
+    '''
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+    try:
+        sock.settimeout(TIMEOUT)
+        sock.bind((0, 0))
+        sock.sendto(solicitud(), (0, 0))
+        respuesta = Respuesta()
+        while not respuesta.completa:
+            respuesta.procesar(sock.recv(65536))
+        return respuesta.resultado()
+    finally:
+        sock.close()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+'''
+Entorno de Jinja2 compartido por todo el modulo.
+
+El entorno se crea una unica vez por proceso, por lo que cada template se
+parsea y compila a lo sumo una vez. Ademas, el codigo compilado de los
+templates se guarda en un directorio de cache para que las siguientes
+ejecuciones de `configurador --set` no tengan que volver a compilarlos.
+
+Como el codigo guardado en la cache se ejecuta con privilegio de
+Administrador, la cache solo se utiliza si el directorio pertenece a root o al
+usuario que ejecuta el proceso y no puede ser escrito por otros usuarios.
+
+Definiendo la variable de entorno NETCOP_TEMPLATES_DEBUG=1 se desactiva la
+cache y los templates se recargan desde su codigo fuente cada vez que cambian.
+'''
+import os
+from jinja2 import Environment, PackageLoader, FileSystemBytecodeCache
+from . import escritura
+
+# directorio donde se guarda el codigo compilado de los templates
+DIRECTORIO_CACHE = '/var/cache/netcop/templates'
+# variable de entorno que desactiva la cache
+VARIABLE_DEBUG = 'NETCOP_TEMPLATES_DEBUG'
+
+_entorno = None
+
+
+def modo_debug():
+    '''
+    Indica si se deben utilizar los templates desde su codigo fuente.
+    '''
+    return os.environ.get(VARIABLE_DEBUG, '') not in ('', '0')
+
+
+def crear_entorno(debug=False, directorio_cache=None):
+    '''
+    Crea un entorno de Jinja2 para los templates del paquete.
+    '''
+    directorio_cache = directorio_cache or DIRECTORIO_CACHE
+    loader = PackageLoader(__package__)
+    if debug:
+        return Environment(loader=loader, auto_reload=True)
+    cache = None
+    if escritura.directorio_seguro(directorio_cache):
+        cache = FileSystemBytecodeCache(directorio_cache)
+    return Environment(loader=loader, auto_reload=False, bytecode_cache=cache)
+
+
+def obtener_entorno():
+    '''
+    Devuelve el entorno compartido, creandolo en el primer uso.
+    '''
+    global _entorno
+    if _entorno is None:
+        _entorno = crear_entorno(debug=modo_debug())
+    return _entorno
+
+
+def obtener_template(nombre):
+    '''
+    Devuelve el template `nombre` compilado.
+    '''
+    return obtener_entorno().get_template(nombre)
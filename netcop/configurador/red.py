@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+'''
+Aplicacion en caliente de la configuracion de red.
+
+Reiniciar networking.service baja y vuelve a levantar el bridge, cortando por
+unos segundos todo el trafico de la red local. Cuando solo cambian la
+direccion, la mascara, el gateway o el uso de DHCP, se calcula la diferencia
+entre la configuracion aplicada y la nueva y se aplica sobre el bridge
+existente con el comando `ip` y el cliente DHCP, sin bajar la interfaz.
+
+El trafico que atraviesa el bridge no depende de la direccion del bridge, por
+lo que cambiarla no interrumpe la red local. La nueva direccion se agrega
+antes de quitar la anterior, de modo que el equipo siempre sigue accesible.
+
+Los ajustes del bridge (STP y demora de reenvio) y de las placas de red (MTU,
+txqueuelen, offloads y colas) tambien se comparan con los valores actuales
+del kernel y se aplican en caliente con `ip` y `ethtool`.
+
+Si la diferencia no puede aplicarse en caliente (por ejemplo, cambiaron las
+interfaces del bridge, las VLAN o los bridges adicionales) o alguno de los
+comandos falla, `aplicar()` lanza RuntimeError y el configurador reinicia la
+red.
+'''
+import os
+import errno
+import subprocess
+from . import configurador
+from . import tiempos
+from . import validacion
+
+INTERFAZ = 'br0'
+# archivos utilizados por ifupdown para el cliente DHCP del bridge
+DHCLIENT_PID = '/run/dhclient.%s.pid' % INTERFAZ
+DHCLIENT_LEASES = '/var/lib/dhcp/dhclient.%s.leases' % INTERFAZ
+# interfaces de red del sistema
+INTERFACES = '/sys/class/net'
+# interfaces que forman parte del bridge
+PUERTOS_BRIDGE = '/sys/class/net/%s/brif' % INTERFAZ
+# subinterfaces VLAN creadas
+VLANS = '/proc/net/vlan/config'
+# ajustes del bridge
+AJUSTES_BRIDGE = '/sys/class/net/%s/bridge' % INTERFAZ
+# nombres de los offloads en la salida de `ethtool -k`
+NOMBRES_OFFLOADS = {
+    'rx-checksumming': 'rx',
+    'tx-checksumming': 'tx',
+    'scatter-gather': 'sg',
+    'tcp-segmentation-offload': 'tso',
+    'generic-segmentation-offload': 'gso',
+    'generic-receive-offload': 'gro',
+    'large-receive-offload': 'lro',
+    'rx-vlan-offload': 'rxvlan',
+    'tx-vlan-offload': 'txvlan',
+}
+# nombres de las colas en la salida de `ethtool -g`
+NOMBRES_ANILLOS = {'RX': 'rx', 'RX Mini': 'rx-mini', 'RX Jumbo': 'rx-jumbo',
+                   'TX': 'tx'}
+
+
+def get_prefijo(mascara):
+    '''
+    Devuelve el prefijo (cantidad de bits en 1) de una mascara de subred.
+    '''
+    return bin(validacion.mascara_a_entero(mascara)).count('1')
+
+
+def dhcp_activo():
+    '''
+    Indica si el cliente DHCP del bridge se esta ejecutando.
+    '''
+    try:
+        with open(DHCLIENT_PID) as f:
+            pid = int(f.read().strip())
+    except (IOError, ValueError):
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def puertos_bridge():
+    '''
+    Devuelve el conjunto de interfaces que forman parte del bridge o None si
+    el bridge no existe.
+    '''
+    try:
+        return set(os.listdir(PUERTOS_BRIDGE))
+    except OSError:
+        return None
+
+
+def vlans_actuales():
+    '''
+    Devuelve el conjunto de subinterfaces VLAN creadas.
+    '''
+    try:
+        with open(VLANS) as f:
+            # las dos primeras lineas son encabezados
+            lineas = f.readlines()[2:]
+    except IOError:
+        return set()
+    return set(linea.split('|')[0].strip() for linea in lineas
+               if '|' in linea)
+
+
+def puentes_actuales():
+    '''
+    Devuelve diccionario con los bridges adicionales creados y el conjunto
+    de interfaces de cada uno.
+    '''
+    puentes = {}
+    for nombre in os.listdir(INTERFACES):
+        puertos = os.path.join(INTERFACES, nombre, 'brif')
+        if nombre != INTERFAZ and os.path.isdir(puertos):
+            puentes[nombre] = set(os.listdir(puertos))
+    return puentes
+
+
+def leer_entero(path):
+    '''
+    Devuelve el entero contenido en el archivo o None si no se puede leer.
+    '''
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (IOError, ValueError):
+        return None
+
+
+def ethtool(*argumentos):
+    '''
+    Devuelve la salida de ethtool o None si no se pudo ejecutar.
+    '''
+    try:
+        with open(os.devnull, 'w') as nulo:
+            return subprocess.check_output(('ethtool',) + argumentos,
+                                           stderr=nulo).decode('utf-8')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def offloads_actuales(interfaz):
+    '''
+    Devuelve diccionario offload -> activo con los offloads de la interfaz
+    que se pueden modificar. Los offloads fijos de la placa se omiten.
+    '''
+    salida = ethtool('-k', interfaz) or ''
+    offloads = {}
+    for linea in salida.splitlines():
+        nombre, _, estado = linea.partition(':')
+        estado = estado.split()
+        if nombre.strip() in NOMBRES_OFFLOADS and estado and \
+                '[fixed]' not in estado:
+            offloads[NOMBRES_OFFLOADS[nombre.strip()]] = estado[0] == 'on'
+    return offloads
+
+
+def anillos_actuales(interfaz):
+    '''
+    Devuelve diccionario cola -> tamanio con el tamanio actual de las colas
+    de la interfaz.
+    '''
+    salida = ethtool('-g', interfaz) or ''
+    # los valores actuales se informan luego de los maximos
+    _, _, actuales = salida.partition('Current hardware settings:')
+    anillos = {}
+    for linea in actuales.splitlines():
+        nombre, _, tamanio = linea.partition(':')
+        if nombre.strip() in NOMBRES_ANILLOS and tamanio.strip().isdigit():
+            anillos[NOMBRES_ANILLOS[nombre.strip()]] = int(tamanio)
+    return anillos
+
+
+def ajustes_actuales(puertos):
+    '''
+    Devuelve diccionario con los ajustes actuales del bridge (stp y
+    forward_delay en centesimas de segundo) y de cada puerto (mtu,
+    txqueuelen, offloads y anillos).
+    '''
+    stp = leer_entero(os.path.join(AJUSTES_BRIDGE, 'stp_state'))
+    ajustes = {
+        'stp': None if stp is None else bool(stp),
+        'forward_delay': leer_entero(os.path.join(AJUSTES_BRIDGE,
+                                                  'forward_delay')),
+        'puertos': {},
+    }
+    for puerto in puertos or []:
+        ajustes['puertos'][puerto] = {
+            'mtu': leer_entero(os.path.join(INTERFACES, puerto, 'mtu')),
+            'txqueuelen': leer_entero(os.path.join(INTERFACES, puerto,
+                                                   'tx_queue_len')),
+            'offloads': offloads_actuales(puerto),
+            'anillos': anillos_actuales(puerto),
+        }
+    return ajustes
+
+
+def delta_ajustes(actual, ajustes, puertos):
+    '''
+    Calcula los comandos necesarios para llevar los ajustes `actual`
+    (ver ajustes_actuales) a los `ajustes` del contexto (ver
+    configurador.modelo_ajustes). Los valores que no se pudieron leer no se
+    modifican.
+    '''
+    comandos = []
+    bridge = []
+    if ajustes['bridge_stp'] is not None and actual['stp'] is not None and \
+            ajustes['bridge_stp'] != actual['stp']:
+        bridge += ['stp_state', '1' if ajustes['bridge_stp'] else '0']
+    if ajustes['bridge_fd'] is not None and \
+            actual['forward_delay'] is not None and \
+            ajustes['bridge_fd'] * 100 != actual['forward_delay']:
+        bridge += ['forward_delay', str(ajustes['bridge_fd'] * 100)]
+    if bridge:
+        comandos.append(['ip', 'link', 'set', 'dev', INTERFAZ, 'type',
+                         'bridge'] + bridge)
+    for puerto in puertos:
+        estado = actual['puertos'].get(puerto)
+        if estado is None:
+            continue
+        enlace = []
+        for clave in ('mtu', 'txqueuelen'):
+            if ajustes[clave] is not None and estado[clave] is not None and \
+                    ajustes[clave] != estado[clave]:
+                enlace += [clave, str(ajustes[clave])]
+        if enlace:
+            comandos.append(['ip', 'link', 'set', 'dev', puerto] + enlace)
+        offloads = []
+        for nombre, activo in ajustes['offloads']:
+            if estado['offloads'].get(nombre, activo) != activo:
+                offloads += [nombre, 'on' if activo else 'off']
+        if offloads:
+            comandos.append(['ethtool', '-K', puerto] + offloads)
+        anillos = []
+        for nombre, tamanio in ajustes['anillos']:
+            if estado['anillos'].get(nombre, tamanio) != tamanio:
+                anillos += [nombre, str(tamanio)]
+        if anillos:
+            comandos.append(['ethtool', '-G', puerto] + anillos)
+    return comandos
+
+
+def estado_actual():
+    '''
+    Devuelve diccionario con la configuracion de red aplicada actualmente:
+    ip, mascara, gateway, dhcp (booleano), puertos del bridge, subinterfaces
+    VLAN, bridges adicionales y ajustes del bridge y de sus puertos.
+    '''
+    estado = configurador.obtener_config_red()
+    estado['dhcp'] = dhcp_activo()
+    estado['puertos'] = puertos_bridge()
+    estado['vlans'] = vlans_actuales()
+    estado['puentes'] = puentes_actuales()
+    estado['ajustes'] = ajustes_actuales(estado['puertos'])
+    return estado
+
+
+def calcular_delta(actual, contexto):
+    '''
+    Calcula los comandos necesarios para pasar de la configuracion `actual`
+    a la del `contexto`. Devuelve lista de comandos (listas de argumentos).
+
+    Lanza RuntimeError si el cambio no puede aplicarse en caliente.
+    '''
+    puertos = set([contexto.get('outside'), contexto.get('inside')])
+    if actual.get('puertos') != puertos:
+        raise RuntimeError('Cambiaron las interfaces del bridge')
+    vlans = set(nombre for nombre, _, _
+                in validacion.vlans(contexto.get('vlans') or ''))
+    puentes = dict((nombre, set(puertos)) for nombre, puertos
+                   in validacion.puentes(contexto.get('puentes') or ''))
+    if actual.get('vlans', set()) != vlans or \
+            actual.get('puentes', {}) != puentes:
+        raise RuntimeError('Cambiaron las VLAN o los bridges adicionales')
+
+    dhcp = str(contexto.get('dhcp') or '').lower() == 'si'
+    dhclient = ['dhclient', '-pf', DHCLIENT_PID, '-lf', DHCLIENT_LEASES]
+    anterior = '%s/%d' % (actual['ip'], get_prefijo(actual['mascara']))
+    comandos = []
+    if actual.get('ajustes') is not None:
+        ajustes = configurador.modelo_ajustes(contexto)['ajustes']
+        comandos.extend(delta_ajustes(
+            actual['ajustes'], ajustes,
+            [contexto.get('outside'), contexto.get('inside')]))
+    if dhcp:
+        if not actual['dhcp']:
+            # el cliente DHCP no quita la direccion estatica al obtener la
+            # concesion
+            comandos.append(['ip', 'addr', 'del', anterior, 'dev', INTERFAZ])
+            comandos.append(dhclient + ['-1', INTERFAZ])
+        return comandos
+
+    if actual['dhcp']:
+        # detiene el cliente DHCP sin liberar la direccion para no dejar al
+        # bridge sin direccion hasta que se aplique la estatica
+        comandos.append(dhclient + ['-x', INTERFAZ])
+    nueva = '%s/%d' % (contexto['ip'], get_prefijo(contexto['mascara']))
+    cambio_direccion = nueva != anterior
+    if cambio_direccion:
+        # se agrega la nueva direccion antes de quitar la anterior para no
+        # dejar al bridge sin direccion. Si esta en la misma red queda como
+        # secundaria, y sin promote_secondaries el kernel la eliminaria junto
+        # con la anterior
+        comandos.append(['sysctl', '-q', '-w',
+                         'net.ipv4.conf.%s.promote_secondaries=1' % INTERFAZ])
+        comandos.append(['ip', 'addr', 'replace', nueva, 'dev', INTERFAZ])
+        comandos.append(['ip', 'addr', 'del', anterior, 'dev', INTERFAZ])
+    # al quitar la direccion anterior el kernel elimina las rutas asociadas
+    if contexto.get('gateway') and (cambio_direccion or
+                                    contexto['gateway'] != actual['gateway']):
+        comandos.append(['ip', 'route', 'replace', 'default', 'via',
+                         contexto['gateway'], 'dev', INTERFAZ])
+    return comandos
+
+
+def aplicar(contexto):
+    '''
+    Aplica en caliente la configuracion de red del contexto. Devuelve lista
+    con las acciones realizadas.
+
+    Lanza RuntimeError si no se puede aplicar sin reiniciar la red.
+    '''
+    try:
+        actual = estado_actual()
+    except Exception as e:
+        raise RuntimeError('No se pudo obtener la configuracion de red '
+                           'aplicada: %s' % str(e))
+    comandos = calcular_delta(actual, contexto)
+    acciones = []
+    for comando in comandos:
+        accion = ' '.join(comando)
+        with tiempos.fase(accion):
+            try:
+                retcode = subprocess.call(comando)
+            except OSError as e:
+                raise RuntimeError('%s: %s' % (accion, str(e)))
+        if retcode != 0:
+            raise RuntimeError('%s: codigo de salida %d' % (accion, retcode))
+        acciones.append(accion)
+    return acciones
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+'''
+Servicio de consulta de la configuracion aplicada.
+
+La UI consulta la configuracion en cada pagina; ejecutar `configurador` en
+cada consulta implica iniciar un interprete de Python nuevo. En su lugar, este
+servicio queda ejecutandose y responde el resultado de `obtener_config()` en
+formato JSON a traves de un socket de unix.
+
+Protocolo: el cliente se conecta, el servidor envia una linea con el objeto
+JSON y cierra la conexion. Por ejemplo, desde PHP:
+
+```php
+$sock = stream_socket_client('unix:///run/netcop/configurador.sock');
+$config = json_decode(stream_get_contents($sock), true);
+```
+
+o desde el shell:
+
+```bash
+socat - UNIX-CONNECT:/run/netcop/configurador.sock
+```
+
+Cada cliente se atiende en un hilo propio, por lo que un cliente lento no
+bloquea a los demas.
+'''
+import os
+import json
+import grp
+import socket
+import syslog
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+from . import configurador
+
+# ubicacion del socket
+SOCKET = '/run/netcop/configurador.sock'
+# grupo que puede conectarse al socket (usuario de la UI)
+GRUPO = 'www-data'
+# permisos del socket: solo root y el grupo de la UI
+PERMISOS = 0o660
+# tiempo maximo de espera del cliente en segundos
+TIMEOUT = 5.0
+
+
+def serializar(config):
+    '''
+    Devuelve la configuracion en formato JSON.
+    '''
+    return json.dumps(config, sort_keys=True)
+
+
+class Manejador(socketserver.BaseRequestHandler):
+    '''
+    Responde la configuracion aplicada a cada cliente.
+    '''
+
+    def handle(self):
+        try:
+            respuesta = serializar(configurador.obtener_config(
+                usar_cache=True))
+        except Exception as e:
+            syslog.syslog(syslog.LOG_ERR, "%s - %s" % (e.__class__, str(e)))
+            respuesta = json.dumps({'error': str(e)})
+        self.request.sendall((respuesta + '\n').encode('utf-8'))
+
+
+class Servidor(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def crear_servidor(path=SOCKET, grupo=GRUPO):
+    '''
+    Crea el servidor escuchando en el socket `path` con permisos restringidos
+    al usuario root y al grupo `grupo`.
+    '''
+    directorio = os.path.dirname(path)
+    if not os.path.isdir(directorio):
+        os.makedirs(directorio, 0o755)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    # se crea el socket con permisos restringidos desde el principio
+    umask = os.umask(0o777 & ~PERMISOS)
+    try:
+        servidor = Servidor(path, Manejador)
+    finally:
+        os.umask(umask)
+    if grupo:
+        try:
+            os.chown(path, -1, grp.getgrnam(grupo).gr_gid)
+        except KeyError:
+            syslog.syslog(syslog.LOG_WARNING,
+                          "No existe el grupo %s" % grupo)
+    os.chmod(path, PERMISOS)
+    return servidor
+
+
+def ejecutar(path=SOCKET, grupo=GRUPO):
+    '''
+    Atiende consultas hasta que se interrumpa el proceso.
+    '''
+    servidor = crear_servidor(path, grupo)
+    syslog.syslog(syslog.LOG_INFO, "[*] Escuchando en %s" % path)
+    try:
+        servidor.serve_forever()
+    finally:
+        servidor.server_close()
+        os.remove(path)
+
+
+def consultar(path=SOCKET, timeout=TIMEOUT):
+    '''
+    Cliente: obtiene la configuracion aplicada desde el servidor y la
+    devuelve como diccionario.
+    '''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        partes = []
+        while True:
+            datos = sock.recv(4096)
+            if not datos:
+                break
+            partes.append(datos)
+    finally:
+        sock.close()
+    respuesta = json.loads(b''.join(partes).decode('utf-8'))
+    if 'error' in respuesta:
+        raise RuntimeError(respuesta['error'])
+    return respuesta
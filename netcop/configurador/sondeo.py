@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+'''
+Ordenamiento de los servidores de nombres por latencia.
+
+glibc consulta siempre al primer `nameserver` de resolv.conf y solo pasa al
+siguiente cuando se agota el tiempo de espera, por lo que un servidor
+primario lento agrega demora a cada consulta que realiza el equipo.
+
+Con el parametro `dns_sondeo=si` se envian consultas UDP concurrentes a todos
+los servidores (varias muestras con un tiempo de espera corto) y se ordenan
+por tasa de respuesta y latencia mediana. Se consulta por los servidores de
+la zona raiz (`. NS`), que cualquier servidor recursivo responde sin depender
+de un dominio en particular.
+
+Si los servidores responden con latencias similares se respeta el orden
+indicado por el usuario y se agrega `rotate` para repartir las consultas; en
+ese caso el orden no cambia entre ejecuciones por variaciones de la medicion.
+'''
+import os
+import time
+import errno
+import select
+import socket
+import struct
+
+# puerto de los servidores de nombres
+PUERTO = 53
+# cantidad de consultas que se envian a cada servidor
+MUESTRAS = 3
+# tiempo maximo de espera de cada ronda de consultas en segundos
+TIMEOUT = 0.3
+# dos latencias son similares si difieren en menos de este factor...
+FACTOR_SIMILAR = 1.5
+# ...o en menos de estos segundos
+DIFERENCIA_SIMILAR = 0.005
+# opciones de resolv.conf: espera de 1 segundo antes de pasar al siguiente
+# servidor (por defecto 5) y 2 intentos por servidor
+OPCIONES = 'timeout:1 attempts:2'
+
+# consulta de tipo NS (2) clase IN (1) por la zona raiz
+PREGUNTA = b'\x00' + struct.pack('!HH', 2, 1)
+# respuestas con codigo NOERROR (0) o NXDOMAIN (3)
+CODIGOS_VALIDOS = (0, 3)
+
+
+def consulta(identificador):
+    '''
+    Devuelve el paquete de la consulta con el identificador indicado y el
+    bit de recursion deseada.
+    '''
+    return struct.pack('!HHHHHH', identificador, 0x0100, 1, 0, 0, 0) + \
+        PREGUNTA
+
+
+def es_respuesta(datos, identificador):
+    '''
+    Indica si el paquete es una respuesta valida a la consulta.
+    '''
+    if len(datos) < 12:
+        return False
+    recibido, banderas = struct.unpack('!HH', datos[:4])
+    return (recibido == identificador and bool(banderas & 0x8000) and
+            banderas & 0x000f in CODIGOS_VALIDOS)
+
+
+def medir(servidores, muestras=None, timeout=None, puerto=None):
+    '''
+    Envia `muestras` rondas de consultas concurrentes a los servidores.
+    Devuelve diccionario servidor -> lista con la latencia en segundos de
+    cada respuesta recibida.
+    '''
+    muestras = muestras or MUESTRAS
+    timeout = timeout or TIMEOUT
+    sockets = {}
+    latencias = dict((servidor, []) for servidor in servidores)
+    try:
+        for servidor in servidores:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sockets[sock] = servidor
+            try:
+                # al conectar el socket solo se reciben paquetes del servidor
+                sock.connect((servidor, puerto or PUERTO))
+            except socket.error:
+                del sockets[sock]
+                sock.close()
+        for _ in range(muestras):
+            identificador = struct.unpack('!H', os.urandom(2))[0]
+            paquete = consulta(identificador)
+            enviados = {}
+            for sock in sockets:
+                try:
+                    sock.send(paquete)
+                except socket.error:
+                    continue
+                enviados[sock] = time.time()
+            limite = time.time() + timeout
+            while enviados:
+                restante = limite - time.time()
+                if restante <= 0:
+                    break
+                try:
+                    listos = select.select(list(enviados), [], [],
+                                           restante)[0]
+                except select.error as e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+                    raise
+                recibido = time.time()
+                for sock in listos:
+                    try:
+                        datos = sock.recv(512)
+                    except socket.error:
+                        # ICMP de puerto inalcanzable
+                        del enviados[sock]
+                        continue
+                    if es_respuesta(datos, identificador):
+                        latencias[sockets[sock]].append(
+                            recibido - enviados.pop(sock))
+    finally:
+        for sock in sockets:
+            sock.close()
+    return latencias
+
+
+def mediana(valores):
+    valores = sorted(valores)
+    mitad = len(valores) // 2
+    if len(valores) % 2:
+        return valores[mitad]
+    return (valores[mitad - 1] + valores[mitad]) / 2.0
+
+
+def similares(a, b):
+    '''
+    Indica si dos latencias son similares.
+    '''
+    menor, mayor = sorted((a, b))
+    return (mayor - menor <= DIFERENCIA_SIMILAR or
+            mayor <= menor * FACTOR_SIMILAR)
+
+
+def ordenar(servidores, latencias):
+    '''
+    Ordena los servidores por cantidad de respuestas y latencia mediana.
+    Devuelve tupla (servidores, rotar), donde `rotar` indica que todos los
+    servidores responden con latencias similares y se conserva el orden
+    original.
+    '''
+    def clave(servidor):
+        valores = latencias.get(servidor) or []
+        return (-len(valores), mediana(valores) if valores else 0)
+
+    claves = [clave(servidor) for servidor in servidores]
+    if len(servidores) > 1 and all(c[0] == claves[0][0] for c in claves) \
+            and claves[0][0] and \
+            all(similares(c[1], claves[0][1]) for c in claves):
+        return list(servidores), True
+    # sorted es estable: ante igualdad se conserva el orden original
+    return sorted(servidores, key=clave), False
+
+
+def ordenar_contexto(contexto, **kwargs):
+    '''
+    Mide los servidores dns1 y dns2 del contexto y devuelve diccionario con
+    dns1, dns2 y dns_opciones para los templates.
+    '''
+    servidores = [contexto[clave] for clave in ('dns1', 'dns2')
+                  if contexto.get(clave)]
+    if not servidores:
+        return {}
+    ordenados, rotar = ordenar(servidores, medir(servidores, **kwargs))
+    valores = {'dns1': ordenados[0],
+               'dns_opciones': OPCIONES + (' rotate' if rotar else '')}
+    if len(ordenados) > 1:
+        valores['dns2'] = ordenados[1]
+    return valores
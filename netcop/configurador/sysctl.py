@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+'''
+Ajustes del kernel (sysctl) segun el ancho de banda del enlace.
+
+Todo el trafico de la red local atraviesa el equipo, pero los limites de red
+del kernel quedan con los valores de la distribucion sin importar la
+velocidad del enlace. A partir de la velocidad maxima de bajada y subida
+(incluidas las franjas del horario semanal) y de la cantidad de hosts de la
+red local se calculan:
+
+* `nf_conntrack_max`: conexiones simultaneas que sigue el firewall, segun la
+  cantidad de hosts y la velocidad del enlace. La tabla de hash
+  (`nf_conntrack_buckets`) tiene un bucket cada cuatro conexiones;
+* `netdev_max_backlog`: paquetes que se encolan por CPU antes de procesarlos,
+  suficientes para una rafaga de 10 ms a la velocidad del enlace;
+* `rmem_max` y `wmem_max` (y el maximo de `tcp_rmem` y `tcp_wmem`): el doble
+  del producto ancho de banda-demora de la bajada y la subida
+  respectivamente, con una demora de 100 ms;
+* `tcp_congestion_control`: BBR si el kernel lo ofrece, que mantiene la
+  velocidad con perdidas y colas cortas, y en caso contrario CUBIC. En las
+  configuraciones de la flota, generadas en otro equipo, siempre CUBIC.
+
+Los valores nunca son menores a los del kernel. Los ajustes de conntrack se
+escriben con `-` para que no fallen si el modulo todavia no esta cargado.
+'''
+import os
+import glob
+from . import validacion
+
+# cantidad de hosts de la red local si no se especifica
+HOSTS = 50
+# conexiones simultaneas que se reservan por host...
+CONEXIONES_HOST = 1024
+# ...y por Mbit/s del enlace
+CONEXIONES_MBIT = 256
+CONNTRACK_MIN = 65536
+CONNTRACK_MAX = 2097152
+# conexiones por bucket de la tabla de hash de conntrack
+CONEXIONES_BUCKET = 4
+# tamanio de los paquetes
+MTU = 1500
+# segundos de rafaga a la velocidad del enlace que se pueden encolar
+RAFAGA = 0.01
+BACKLOG_MIN = 1000
+BACKLOG_MAX = 65536
+# demora de ida y vuelta para el producto ancho de banda-demora
+RTT = 0.1
+BUFFER_MIN = 212992
+BUFFER_MAX = 64 * 1024 * 1024
+# algoritmos de control de congestion en orden de preferencia
+CONGESTION = ('bbr', 'cubic')
+# algoritmo de las configuraciones para otros equipos, cuyo kernel no se
+# conoce
+CONGESTION_FLOTA = 'cubic'
+# algoritmos cargados en el kernel
+CONGESTION_DISPONIBLES = '/proc/sys/net/ipv4/tcp_available_congestion_control'
+# modulos del kernel, que se cargan al seleccionar el algoritmo
+MODULOS = '/lib/modules'
+
+
+def acotar(valor, minimo, maximo):
+    return max(minimo, min(maximo, valor))
+
+
+def potencia_de_2(valor):
+    '''
+    Devuelve la menor potencia de 2 mayor o igual a `valor`.
+    '''
+    potencia = 1
+    while potencia < valor:
+        potencia *= 2
+    return potencia
+
+
+def congestion_disponible(algoritmo, path=None, modulos=None):
+    '''
+    Indica si el kernel ofrece el algoritmo de control de congestion, ya sea
+    cargado o como modulo.
+    '''
+    try:
+        with open(path or CONGESTION_DISPONIBLES) as f:
+            if algoritmo in f.read().split():
+                return True
+    except IOError:
+        pass
+    patron = os.path.join(modulos or MODULOS, os.uname()[2], 'kernel', 'net',
+                          'ipv4', 'tcp_%s.ko*' % algoritmo)
+    return bool(glob.glob(patron))
+
+
+def congestion():
+    '''
+    Devuelve el algoritmo de control de congestion preferido que ofrece el
+    kernel.
+    '''
+    for algoritmo in CONGESTION[:-1]:
+        if congestion_disponible(algoritmo):
+            return algoritmo
+    return CONGESTION[-1]
+
+
+def velocidades_maximas(contexto):
+    '''
+    Devuelve tupla (bajada, subida) con las velocidades maximas en Mbit/s del
+    contexto, considerando las franjas del horario semanal.
+    '''
+    bajada, subida = float(contexto['bajada']), float(contexto['subida'])
+    for franja in validacion.horario(contexto.get('horario') or ''):
+        bajada, subida = max(bajada, franja[3]), max(subida, franja[4])
+    return bajada, subida
+
+
+def calcular(bajada, subida, hosts=None, algoritmo=None):
+    '''
+    Devuelve lista de tuplas (clave, valor) con los ajustes del kernel para
+    las velocidades en Mbit/s y la cantidad de hosts indicadas. Si no se
+    especifica el algoritmo de control de congestion se elige segun el
+    kernel de este equipo.
+    '''
+    hosts = hosts or HOSTS
+    conexiones = max(hosts * CONEXIONES_HOST,
+                     (bajada + subida) * CONEXIONES_MBIT)
+    conntrack = acotar(potencia_de_2(conexiones), CONNTRACK_MIN,
+                       CONNTRACK_MAX)
+    # paquetes por segundo que ingresan por ambas placas
+    paquetes = (bajada + subida) * 1e6 / 8 / MTU
+    backlog = acotar(potencia_de_2(paquetes * RAFAGA), BACKLOG_MIN,
+                     BACKLOG_MAX)
+
+    def buffer(velocidad):
+        bdp = velocidad * 1e6 / 8 * RTT
+        return acotar(potencia_de_2(2 * bdp), BUFFER_MIN, BUFFER_MAX)
+
+    rmem, wmem = buffer(bajada), buffer(subida)
+    return [
+        ('net.netfilter.nf_conntrack_max', conntrack),
+        ('net.netfilter.nf_conntrack_buckets', conntrack // CONEXIONES_BUCKET),
+        ('net.core.netdev_max_backlog', backlog),
+        ('net.core.rmem_max', rmem),
+        ('net.core.wmem_max', wmem),
+        # minimo y valor inicial del kernel
+        ('net.ipv4.tcp_rmem', '4096 131072 %d' % rmem),
+        ('net.ipv4.tcp_wmem', '4096 16384 %d' % wmem),
+        ('net.ipv4.tcp_congestion_control', algoritmo or congestion()),
+    ]
+
+
+def calcular_contexto(contexto, algoritmo=None):
+    '''
+    Devuelve la lista de ajustes del kernel para el contexto.
+    '''
+    bajada, subida = velocidades_maximas(contexto)
+    hosts = int(contexto['hosts']) if contexto.get('hosts') else None
+    return calcular(bajada, subida, hosts, algoritmo)
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+'''
+Medicion del tiempo de cada fase de la aplicacion de la configuracion.
+
+Las funciones del configurador delimitan sus fases con `tiempos.fase()`:
+
+```python
+with tiempos.fase('validar'):
+    validar(contexto)
+```
+
+Mientras no se haya iniciado una medicion con `iniciar()`, `fase()` devuelve
+un contexto vacio compartido, por lo que el costo de la instrumentacion es
+una llamada a funcion por fase.
+
+Las fases que se repiten en una ejecucion acumulan su duracion. Al terminar,
+los tiempos se registran en syslog en un unico mensaje y se agregan a un
+resumen en disco con la cantidad de ejecuciones y los valores p50, p95 y
+maximo de las ultimas ejecuciones de cada fase. El configurador mide todas
+las aplicaciones; `--timings` solo agrega la impresion por pantalla.
+'''
+import os
+import sys
+import json
+import math
+import time
+import syslog
+import tempfile
+import contextlib
+
+# resumen de las ultimas ejecuciones
+RESUMEN = '/var/lib/netcop/tiempos.json'
+# cantidad de muestras por fase que se conservan en el resumen
+MUESTRAS = 100
+
+
+def _clock_monotonic():
+    '''
+    Crea un reloj monotonico mediante clock_gettime(2).
+    '''
+    import ctypes
+    import ctypes.util
+
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                       use_errno=True)
+    CLOCK_MONOTONIC = 1
+
+    def monotonic():
+        valor = timespec()
+        libc.clock_gettime(CLOCK_MONOTONIC, ctypes.byref(valor))
+        return valor.tv_sec + valor.tv_nsec * 1e-9
+    return monotonic
+
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    def monotonic():
+        '''
+        Python 2 no posee time.monotonic(). El reloj se crea en el primer uso
+        para no cargar ctypes si no se miden los tiempos.
+        '''
+        global monotonic
+        monotonic = _clock_monotonic()
+        return monotonic()
+
+
+class _FaseNula(object):
+    '''
+    Contexto vacio utilizado cuando no se estan midiendo los tiempos.
+    '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _Fase(object):
+
+    def __init__(self, cronometro, nombre):
+        self.cronometro = cronometro
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.inicio = monotonic()
+        return self
+
+    def __exit__(self, *args):
+        self.cronometro.agregar(self.nombre, monotonic() - self.inicio)
+        return False
+
+
+class Cronometro(object):
+    '''
+    Acumula la duracion, en segundos, de cada fase de una ejecucion.
+    '''
+
+    def __init__(self):
+        self.inicio = monotonic()
+        self.fases = []
+        self._indices = {}
+
+    def agregar(self, nombre, segundos):
+        '''
+        Suma la duracion a la fase. Las fases se conservan en el orden en que
+        terminaron por primera vez.
+        '''
+        indice = self._indices.get(nombre)
+        if indice is None:
+            self._indices[nombre] = len(self.fases)
+            self.fases.append((nombre, segundos))
+        else:
+            self.fases[indice] = (nombre, self.fases[indice][1] + segundos)
+
+    def fase(self, nombre):
+        return _Fase(self, nombre)
+
+    @property
+    def total(self):
+        return monotonic() - self.inicio
+
+
+FASE_NULA = _FaseNula()
+_activo = None
+
+
+def fase(nombre):
+    '''
+    Devuelve un contexto que mide la duracion de la fase `nombre` si hay una
+    medicion en curso.
+    '''
+    if _activo is None:
+        return FASE_NULA
+    return _activo.fase(nombre)
+
+
+def iterar(nombre, iterable):
+    '''
+    Recorre `iterable` a medida que se consume, sumando a la fase `nombre` el
+    tiempo de obtener cada elemento. Permite medir un generador sin
+    materializarlo.
+    '''
+    iterador = iter(iterable)
+    while True:
+        with fase(nombre):
+            try:
+                elemento = next(iterador)
+            except StopIteration:
+                return
+        yield elemento
+
+
+def iniciar():
+    '''
+    Inicia la medicion de tiempos y devuelve el cronometro.
+    '''
+    global _activo
+    _activo = Cronometro()
+    return _activo
+
+
+def terminar():
+    '''
+    Termina la medicion en curso y devuelve lista de tuplas (fase, segundos)
+    que incluye el total de la ejecucion.
+    '''
+    global _activo
+    cronometro, _activo = _activo, None
+    if cronometro is None:
+        return []
+    return cronometro.fases + [('total', cronometro.total)]
+
+
+def registrar(fases):
+    '''
+    Registra los tiempos en syslog en un unico mensaje con formato JSON y
+    valores en milisegundos.
+    '''
+    valores = dict((nombre, round(segundos * 1000, 3))
+                   for nombre, segundos in fases)
+    syslog.syslog(syslog.LOG_INFO, "[*] Tiempos: %s" %
+                  json.dumps(valores, sort_keys=True))
+
+
+def formatear(fases):
+    '''
+    Devuelve los tiempos como texto, una fase por linea.
+    '''
+    return '\n'.join('%-40s %10.3f ms' % (nombre, segundos * 1000)
+                     for nombre, segundos in fases)
+
+
+def percentil(valores, p):
+    '''
+    Devuelve el percentil `p` (0 a 100) de la lista ordenada `valores`.
+    '''
+    indice = int(math.ceil(p / 100.0 * len(valores))) - 1
+    return valores[max(0, min(indice, len(valores) - 1))]
+
+
+def actualizar_resumen(fases, path=None):
+    '''
+    Agrega los tiempos de una ejecucion al resumen en disco. Los errores al
+    escribir el resumen se ignoran.
+    '''
+    path = path or RESUMEN
+    try:
+        with open(path) as f:
+            resumen = json.load(f)
+    except (IOError, ValueError):
+        resumen = {}
+    for nombre, segundos in fases:
+        datos = resumen.setdefault(nombre, {'cantidad': 0, 'muestras': []})
+        muestras = datos['muestras'] + [round(segundos * 1000, 3)]
+        datos['muestras'] = muestras[-MUESTRAS:]
+        datos['cantidad'] += 1
+        ordenadas = sorted(datos['muestras'])
+        datos['p50'] = percentil(ordenadas, 50)
+        datos['p95'] = percentil(ordenadas, 95)
+        datos['max'] = ordenadas[-1]
+    try:
+        directorio = os.path.dirname(path)
+        if not os.path.isdir(directorio):
+            os.makedirs(directorio, 0o755)
+        fd, temporal = tempfile.mkstemp(dir=directorio)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(resumen, f, sort_keys=True)
+        os.chmod(temporal, 0o644)
+        os.rename(temporal, path)
+    except (IOError, OSError) as e:
+        syslog.syslog(syslog.LOG_WARNING,
+                      "No se pudo actualizar %s: %s" % (path, str(e)))
+    return resumen
+
+
+@contextlib.contextmanager
+def medicion(mostrar=False):
+    '''
+    Mide los tiempos de las fases ejecutadas dentro del contexto. Al salir
+    los registra en syslog, actualiza el resumen y, si `mostrar` es
+    verdadero, los imprime por la salida estandar.
+    '''
+    iniciar()
+    try:
+        yield
+    finally:
+        fases = terminar()
+        registrar(fases)
+        actualizar_resumen(fases)
+        if mostrar:
+            sys.stdout.write(formatear(fases) + '\n')
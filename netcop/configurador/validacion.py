@@ -0,0 +1,556 @@
+# -*- coding: utf-8 -*-
+'''
+Validacion de los parametros de configuracion.
+
+Los parametros se describen en un esquema declarativo (campo -> conversor)
+y un conjunto de reglas que relacionan varios campos. El esquema se compila
+una unica vez al importar el modulo y la validacion informa todos los errores
+encontrados en lugar de detenerse en el primero.
+
+Las direcciones IPv4 se convierten a enteros, lo que permite verificar que la
+mascara de subred sea contigua y que el gateway pertenezca a la subred sin
+utilizar expresiones regulares.
+'''
+import re
+
+
+class ErrorValidacion(ValueError):
+    '''
+    Error lanzado cuando los parametros son incorrectos. El atributo
+    `errores` contiene la lista de todos los errores encontrados.
+    '''
+
+    def __init__(self, errores):
+        super(ErrorValidacion, self).__init__('; '.join(errores))
+        self.errores = errores
+
+
+# Conversores de campos
+# -------------------------------------------------------------------------
+# Reciben el valor como texto y devuelven el valor convertido. En caso de que
+# el formato sea invalido lanzan ValueError.
+REGEX_VELOCIDAD = re.compile(r'^\d+(\.\d+)?$')
+# nombre de interfaz de red (hasta 15 caracteres)
+REGEX_INTERFAZ = re.compile(r'^[A-Za-z][\w.-]{0,14}$')
+# subinterfaz VLAN: <dispositivo>.<id>
+REGEX_VLAN = re.compile(r'^(?P<dispositivo>[A-Za-z][\w-]*)\.(?P<id>\d+)$')
+# elemento de una lista separada por espacios
+REGEX_PALABRA = re.compile(r'\S+')
+# bridge principal, cuya configuracion se detalla en ip, mascara, etc.
+BRIDGE_PRINCIPAL = 'br0'
+# franja del horario semanal: <dias>@<inicio>-<fin>=<bajada>/<subida>
+REGEX_FRANJA = re.compile(r'^(?P<dias>[a-z,-]+)@(?P<inicio>\d\d:\d\d)-'
+                          r'(?P<fin>\d\d:\d\d)=(?P<bajada>[\d.]+)/'
+                          r'(?P<subida>[\d.]+)$')
+DIAS = ('lun', 'mar', 'mie', 'jue', 'vie', 'sab', 'dom')
+# offloads que se pueden modificar con `ethtool -K`
+OFFLOADS = ('rx', 'tx', 'sg', 'tso', 'gso', 'gro', 'lro', 'rxvlan', 'txvlan')
+# colas de las placas de red que se pueden modificar con `ethtool -G`
+ANILLOS = ('rx', 'rx-mini', 'rx-jumbo', 'tx')
+# perfiles de ajuste del bridge y de las placas de red. Los parametros de
+# ajuste que no se especifican toman el valor del perfil
+PERFILES_RED = {
+    # equipo en linea: sin STP ni demora de reenvio, para que reiniciar la
+    # red no corte la LAN, y sin agrupar paquetes en la placa de red, para
+    # que el control de ancho de banda trabaje con los paquetes reales. Sin
+    # gro/gso/tso/lro la CPU procesa cada paquete por separado, lo que en
+    # equipos de pocos recursos puede limitar la velocidad maxima; en ese
+    # caso conviene el perfil `kernel` o activar los offloads con `offloads`
+    'baja_latencia': {
+        'bridge_stp': 'no',
+        'bridge_fd': '0',
+        'bridge_maxwait': '0',
+        'offloads': 'gro=off,gso=off,tso=off,lro=off',
+    },
+    # valores por defecto del kernel
+    'kernel': {},
+}
+
+
+def booleano(valor):
+    '''
+    Convierte si/no (sin importar mayusculas) a booleano.
+    '''
+    valor = valor.lower()
+    if valor not in ('si', 'no'):
+        raise ValueError
+    return valor == 'si'
+
+
+def ip_a_entero(valor):
+    '''
+    Convierte una direccion IPv4 en notacion decimal con puntos a entero.
+    '''
+    partes = valor.split('.')
+    if len(partes) != 4:
+        raise ValueError
+    numero = 0
+    for parte in partes:
+        if not parte.isdigit() or len(parte) > 3:
+            raise ValueError
+        octeto = int(parte)
+        if octeto > 255:
+            raise ValueError
+        numero = numero << 8 | octeto
+    return numero
+
+
+def mascara_a_entero(valor):
+    '''
+    Convierte una mascara de subred a entero verificando que sea contigua.
+    '''
+    numero = ip_a_entero(valor)
+    invertida = ~numero & 0xffffffff
+    if not numero or invertida & (invertida + 1):
+        raise ValueError
+    return numero
+
+
+def velocidad(valor):
+    '''
+    Convierte un ancho de banda en Mbps, que puede tener decimales, a float.
+    '''
+    if not REGEX_VELOCIDAD.match(valor) or not float(valor) > 0:
+        raise ValueError
+    return float(valor)
+
+
+def entero(valor, minimo, maximo):
+    '''
+    Convierte un entero verificando que este entre `minimo` y `maximo`.
+    '''
+    if not valor.isdigit() or not minimo <= int(valor) <= maximo:
+        raise ValueError
+    return int(valor)
+
+
+def tamanio_cache(valor):
+    '''
+    Cantidad de nombres de la cache de nombres local (maximo de dnsmasq).
+    '''
+    return entero(valor, 0, 10000)
+
+
+def segundos(valor):
+    '''
+    Cantidad de segundos, hasta un dia.
+    '''
+    return entero(valor, 0, 86400)
+
+
+def demora_bridge(valor):
+    '''
+    Demora de reenvio del bridge en segundos.
+    '''
+    return entero(valor, 0, 30)
+
+
+def espera_bridge(valor):
+    '''
+    Segundos que ifupdown espera a que los puertos del bridge esten listos.
+    '''
+    return entero(valor, 0, 60)
+
+
+def mtu(valor):
+    '''
+    MTU de las placas de red, hasta el tamanio de los jumbo frames.
+    '''
+    return entero(valor, 68, 9216)
+
+
+def largo_cola(valor):
+    '''
+    Largo de la cola de transmision (txqueuelen) de las placas de red.
+    '''
+    return entero(valor, 0, 100000)
+
+
+def hosts(valor):
+    '''
+    Cantidad de hosts de la red local.
+    '''
+    return entero(valor, 1, 65535)
+
+
+def perfil_red(valor):
+    '''
+    Verifica el nombre del perfil de ajuste de red.
+    '''
+    if valor not in PERFILES_RED:
+        raise ValueError
+    return valor
+
+
+def asignaciones(valor, claves, convertir):
+    '''
+    Convierte una lista de asignaciones `clave=valor` separadas por coma a
+    lista de tuplas (clave, valor convertido), verificando las claves.
+    '''
+    resultado = []
+    for asignacion in valor.split(','):
+        clave, _, dato = asignacion.partition('=')
+        if clave not in claves:
+            raise ValueError
+        resultado.append((clave, convertir(dato)))
+    return resultado
+
+
+def offloads(valor):
+    '''
+    Convierte la lista de offloads de las placas de red (por ejemplo
+    `gro=off,tso=off`) a lista de tuplas (offload, activo).
+    '''
+    def estado(dato):
+        if dato not in ('on', 'off'):
+            raise ValueError
+        return dato == 'on'
+    return asignaciones(valor, OFFLOADS, estado)
+
+
+def anillos(valor):
+    '''
+    Convierte la lista de tamanios de colas de las placas de red (por ejemplo
+    `rx=256,tx=256`) a lista de tuplas (cola, tamanio).
+    '''
+    return asignaciones(valor, ANILLOS, lambda dato: entero(dato, 1, 65536))
+
+
+def interfaz(valor):
+    '''
+    Verifica el nombre de una interfaz de red.
+    '''
+    if not REGEX_INTERFAZ.match(valor):
+        raise ValueError
+    return valor
+
+
+def recorrer_vlans(valor):
+    '''
+    Recorre la lista de subinterfaces VLAN separadas por espacios (por
+    ejemplo `eth0.10 eth0.20`) devolviendo tuplas (nombre, dispositivo, id) a
+    medida que se consumen, sin armar la lista completa.
+    '''
+    for palabra in REGEX_PALABRA.finditer(valor):
+        nombre = palabra.group()
+        m = REGEX_VLAN.match(interfaz(nombre))
+        if not m or not 1 <= int(m.group('id')) <= 4094:
+            raise ValueError
+        yield nombre, m.group('dispositivo'), int(m.group('id'))
+
+
+def vlans(valor):
+    '''
+    Convierte la lista de subinterfaces VLAN separadas por espacios (por
+    ejemplo `eth0.10 eth0.20`) a lista de tuplas (nombre, dispositivo, id).
+    '''
+    return list(recorrer_vlans(valor))
+
+
+def recorrer_puentes(valor):
+    '''
+    Recorre la lista de bridges separados por espacios, cada uno con el
+    formato `nombre:puerto,puerto` (por ejemplo `br1:eth0.10,eth1.10`),
+    devolviendo tuplas (nombre, [puertos]) a medida que se consumen.
+    '''
+    for palabra in REGEX_PALABRA.finditer(valor):
+        nombre, _, puertos = palabra.group().partition(':')
+        puertos = [interfaz(p) for p in puertos.split(',') if p]
+        if not puertos:
+            raise ValueError
+        yield interfaz(nombre), puertos
+
+
+def puentes(valor):
+    '''
+    Convierte la lista de bridges separados por espacios, cada uno con el
+    formato `nombre:puerto,puerto` (por ejemplo `br1:eth0.10,eth1.10`), a
+    lista de tuplas (nombre, [puertos]).
+    '''
+    return list(recorrer_puentes(valor))
+
+
+def dias(valor):
+    '''
+    Convierte una lista de dias o rangos de dias separados por coma (por
+    ejemplo `lun-vie,dom`) a tupla ordenada de numeros de dia (0 = lunes).
+    '''
+    resultado = set()
+    for parte in valor.split(','):
+        desde, _, hasta = parte.partition('-')
+        desde = DIAS.index(desde)
+        hasta = DIAS.index(hasta) if hasta else desde
+        if hasta < desde:
+            raise ValueError
+        resultado.update(range(desde, hasta + 1))
+    return tuple(sorted(resultado))
+
+
+def hora(valor, fin=False):
+    '''
+    Convierte una hora HH:MM a minutos desde las 00:00. Si `fin` es verdadero
+    se acepta 24:00.
+    '''
+    horas, minutos = int(valor[:2]), int(valor[3:])
+    if minutos > 59 or horas > 24 or (horas == 24 and (minutos or not fin)):
+        raise ValueError
+    return horas * 60 + minutos
+
+
+def horario(valor):
+    '''
+    Convierte el horario semanal de velocidades, con franjas separadas por
+    espacios con el formato `dias@inicio-fin=bajada/subida` (por ejemplo
+    `lun-vie@08:00-18:00=10/2`), a lista de tuplas
+    (dias, inicio, fin, bajada, subida) con los horarios en minutos.
+    '''
+    resultado = []
+    for franja in valor.split():
+        m = REGEX_FRANJA.match(franja)
+        if not m:
+            raise ValueError
+        inicio = hora(m.group('inicio'))
+        fin = hora(m.group('fin'), fin=True)
+        if inicio >= fin:
+            raise ValueError
+        resultado.append((dias(m.group('dias')), inicio, fin,
+                          velocidad(m.group('bajada')),
+                          velocidad(m.group('subida'))))
+    return resultado
+
+
+# Reglas que relacionan varios campos
+# -------------------------------------------------------------------------
+# Reciben los parametros originales y los valores convertidos de los campos
+# validos, y devuelven un mensaje de error o None.
+def regla_ip_mascara(parametros, valores):
+    '''
+    Si se ingresa ip se debe ingresar mascara y viceversa.
+    '''
+    if bool(parametros.get('ip')) != bool(parametros.get('mascara')):
+        return 'Debe ingresar ip y mascara de subred'
+
+
+def regla_velocidades(parametros, valores):
+    '''
+    Subida y bajada son obligatorios.
+    '''
+    if not parametros.get('bajada') or not parametros.get('subida'):
+        return 'bajada y subida son obligatorios'
+
+
+def regla_gateway_en_subred(parametros, valores):
+    '''
+    El gateway debe pertenecer a la subred de la ip y ser distinto de ella.
+    '''
+    if not all(campo in valores for campo in ('ip', 'mascara', 'gateway')):
+        return
+    ip, mascara, gateway = valores['ip'], valores['mascara'], \
+        valores['gateway']
+    if ip & mascara != gateway & mascara or ip == gateway:
+        return 'gateway {0}: no pertenece a la subred de {1}/{2}'.format(
+            parametros['gateway'], parametros['ip'], parametros['mascara'])
+
+
+def regla_ip_de_host(parametros, valores):
+    '''
+    La ip no puede ser la direccion de red ni la de broadcast de la subred.
+    '''
+    if not all(campo in valores for campo in ('ip', 'mascara')):
+        return
+    ip, mascara = valores['ip'], valores['mascara']
+    host = ~mascara & 0xffffffff
+    # en las subredes /31 y /32 no hay direcciones de red ni de broadcast
+    if host > 1 and ip & host in (0, host):
+        return 'ip {0}: no es una direccion de host de la subred'.format(
+            parametros['ip'])
+
+
+def regla_vlans_repetidas(parametros, valores):
+    '''
+    Cada subinterfaz VLAN se declara una unica vez.
+    '''
+    vistas = set()
+    repetidas = set()
+    for nombre, _, _ in valores.get('vlans', []):
+        if nombre in vistas:
+            repetidas.add(nombre)
+        vistas.add(nombre)
+    if repetidas:
+        return 'vlans: {0} repetidas'.format(', '.join(sorted(repetidas)))
+
+
+def regla_puentes(parametros, valores):
+    '''
+    Los nombres de los bridges no se repiten ni coinciden con el bridge
+    principal, cada interfaz pertenece a un unico bridge y las subinterfaces
+    VLAN utilizadas como puertos deben estar declaradas en `vlans`.
+    '''
+    if 'puentes' not in valores:
+        return
+    declaradas = set(nombre for nombre, _, _ in valores.get('vlans', []))
+    nombres = set([BRIDGE_PRINCIPAL])
+    utilizados = set()
+    errores = []
+    for nombre, puertos in valores['puentes']:
+        if nombre in nombres:
+            errores.append('bridge {0} repetido'.format(nombre))
+        nombres.add(nombre)
+        for puerto in puertos:
+            if puerto in utilizados:
+                errores.append('{0} pertenece a mas de un bridge'.format(
+                    puerto))
+            elif REGEX_VLAN.match(puerto) and puerto not in declaradas:
+                errores.append('{0} no esta declarada en vlans'.format(
+                    puerto))
+            utilizados.add(puerto)
+    if errores:
+        return 'puentes: {0}'.format('; '.join(errores))
+
+
+def regla_horario(parametros, valores):
+    '''
+    Las franjas del horario no se superponen.
+    '''
+    ocupados = {}
+    superpuestos = []
+    for franja, (numeros, inicio, fin, _, _) in zip(
+            parametros.get('horario', '').split(),
+            valores.get('horario', [])):
+        for dia in numeros:
+            for otra, otro_inicio, otro_fin in ocupados.get(dia, []):
+                if inicio < otro_fin and otro_inicio < fin:
+                    superpuestos.append('{0} con {1}'.format(franja, otra))
+            ocupados.setdefault(dia, []).append((franja, inicio, fin))
+    if superpuestos:
+        return 'horario: franjas superpuestas {0}'.format(
+            ', '.join(sorted(set(superpuestos))))
+
+
+def regla_cache_dns(parametros, valores):
+    '''
+    La cache de nombres local necesita al menos un servidor de nombres.
+    '''
+    if valores.get('cache_dns') and not parametros.get('dns1'):
+        return 'cache_dns: debe ingresar dns1'
+
+
+def regla_bridge_fd(parametros, valores):
+    '''
+    Con STP el kernel solo acepta demoras de reenvio de 2 a 30 segundos.
+    '''
+    if valores.get('bridge_stp') and valores.get('bridge_fd', 2) < 2:
+        return 'bridge_fd: con bridge_stp=si debe ser de 2 a 30 segundos'
+
+
+# Esquema de parametros
+# -------------------------------------------------------------------------
+ESQUEMA = (
+    ('dhcp', booleano),
+    ('ip', ip_a_entero),
+    ('mascara', mascara_a_entero),
+    ('gateway', ip_a_entero),
+    ('dns1', ip_a_entero),
+    ('dns2', ip_a_entero),
+    ('dns_sondeo', booleano),
+    ('verificar', booleano),
+    ('cache_dns', booleano),
+    ('cache_dns_tamanio', tamanio_cache),
+    ('cache_dns_ttl_negativo', segundos),
+    ('perfil_red', perfil_red),
+    ('bridge_stp', booleano),
+    ('bridge_fd', demora_bridge),
+    ('bridge_maxwait', espera_bridge),
+    ('mtu', mtu),
+    ('txqueuelen', largo_cola),
+    ('offloads', offloads),
+    ('anillos', anillos),
+    ('hosts', hosts),
+    ('subida', velocidad),
+    ('bajada', velocidad),
+    ('vlans', vlans),
+    ('puentes', puentes),
+    ('horario', horario),
+)
+
+REGLAS = (
+    regla_ip_mascara,
+    regla_velocidades,
+    regla_gateway_en_subred,
+    regla_ip_de_host,
+    regla_vlans_repetidas,
+    regla_puentes,
+    regla_horario,
+    regla_cache_dns,
+    regla_bridge_fd,
+)
+
+
+class Validador(object):
+    '''
+    Validador compilado a partir de un esquema y una lista de reglas.
+    '''
+
+    def __init__(self, esquema, reglas):
+        self.campos = tuple(esquema)
+        self.reglas = tuple(reglas)
+
+    def errores(self, parametros):
+        '''
+        Devuelve la lista de errores de los parametros. Si los parametros son
+        correctos devuelve una lista vacia.
+        '''
+        errores = []
+        valores = {}
+        for campo, convertir in self.campos:
+            valor = parametros.get(campo)
+            if not valor:
+                continue
+            try:
+                valores[campo] = convertir(str(valor))
+            except ValueError:
+                errores.append('{field} {value}: formato invalido'.format(
+                    field=campo, value=valor))
+        for regla in self.reglas:
+            error = regla(parametros, valores)
+            if error:
+                errores.append(error)
+        return errores
+
+
+VALIDADOR = Validador(ESQUEMA, REGLAS)
+
+
+def claves_desconocidas(parametros, permitidas=()):
+    '''
+    Devuelve lista de errores con los parametros que no forman parte del
+    esquema ni de `permitidas`. Los valores que calcula el configurador (por
+    ejemplo `dns_opciones`) no se pueden especificar.
+    '''
+    conocidas = set(campo for campo, _ in ESQUEMA) | set(permitidas)
+    return ['{field}: parametro desconocido'.format(field=clave)
+            for clave in sorted(parametros) if clave not in conocidas]
+
+
+def validar(parametros):
+    '''
+    Valida los parametros. Devuelve True si son correctos y en caso contrario
+    lanza ErrorValidacion con todos los errores encontrados, incluidos los
+    parametros desconocidos.
+    '''
+    errores = claves_desconocidas(parametros) + VALIDADOR.errores(parametros)
+    if errores:
+        raise ErrorValidacion(errores)
+    return True
+
+
+def validar_lote(lote, permitidas=()):
+    '''
+    Valida un conjunto de configuraciones. Devuelve una lista con la lista de
+    errores de cada configuracion, en el mismo orden (vacia si es correcta).
+    Al igual que en `validar` se informan los parametros desconocidos, salvo
+    los de `permitidas`.
+    '''
+    errores = VALIDADOR.errores
+    return [claves_desconocidas(parametros, permitidas) + errores(parametros)
+            for parametros in lote]
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+'''
+Verificacion de la red luego de aplicar la configuracion.
+
+Que `ip` o `systemctl` terminen sin error no garantiza que el equipo siga
+conectado: un gateway o servidor de nombres equivocado lo deja fuera de la
+red hasta que alguien lo configure en forma local. Luego de aplicar cambios de
+red o de servidores de nombres se verifica, en forma concurrente y con un
+tiempo limite total, que:
+
+* el bridge tenga la direccion esperada (o alguna direccion con DHCP);
+* el gateway responda ARP;
+* cada servidor de nombres responda una consulta, incluida la cache de
+  nombres local si esta habilitada.
+
+Si alguna verificacion falla, el configurador restaura los archivos
+anteriores y los vuelve a aplicar.
+'''
+import re
+import time
+import socket
+import threading
+import subprocess
+from . import configurador
+from . import sondeo
+
+# tiempo limite total de las verificaciones en segundos
+LIMITE = 5.0
+# intervalo entre consultas del estado de la red
+INTERVALO = 0.05
+# interfaz donde se espera la direccion
+INTERFAZ = 'br0'
+# tabla ARP del kernel
+ARP = '/proc/net/arp'
+# puerto discard, al que se envia un datagrama para forzar la consulta ARP
+PUERTO_DISCARD = 9
+# entrada de la tabla ARP resuelta
+ATF_COM = 0x2
+
+REGEX_INET = re.compile(r'\binet\s+(?P<ip>(\d+\.){3}\d+)/')
+
+
+def esperar(condicion, limite):
+    '''
+    Consulta `condicion` hasta que devuelva verdadero o se alcance el
+    instante `limite`. Devuelve el ultimo resultado.
+    '''
+    while True:
+        resultado = condicion()
+        if resultado or time.time() + INTERVALO > limite:
+            return resultado
+        time.sleep(INTERVALO)
+
+
+def direcciones(interfaz=None):
+    '''
+    Devuelve lista con las direcciones IPv4 de la interfaz.
+    '''
+    try:
+        salida = subprocess.check_output(
+            ['ip', '-4', '-o', 'addr', 'show', 'dev', interfaz or INTERFAZ])
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    return [m.group('ip') for m in REGEX_INET.finditer(salida.decode())]
+
+
+def verificar_direccion(ip, limite, interfaz=None):
+    '''
+    Verifica que la interfaz tenga la direccion `ip`, o alguna direccion si
+    `ip` es None.
+    '''
+    def asignada():
+        actuales = direcciones(interfaz)
+        return ip in actuales if ip else bool(actuales)
+
+    if not esperar(asignada, limite):
+        raise RuntimeError('%s no tiene la direccion %s' % (
+            interfaz or INTERFAZ, ip or 'asignada por DHCP'))
+
+
+def vecino_resuelto(ip, path=None):
+    '''
+    Indica si la tabla ARP tiene resuelta la direccion de hardware de `ip`.
+    '''
+    try:
+        with open(path or ARP) as f:
+            # la primera linea es el encabezado
+            for linea in list(f)[1:]:
+                campos = linea.split()
+                if len(campos) > 2 and campos[0] == ip:
+                    return bool(int(campos[2], 16) & ATF_COM)
+    except (IOError, ValueError):
+        pass
+    return False
+
+
+def verificar_gateway(gateway, limite):
+    '''
+    Verifica que el gateway responda ARP. Se envia un datagrama al gateway
+    para que el kernel lo consulte. Con DHCP se utiliza el gateway de la ruta
+    por defecto.
+    '''
+    if not gateway:
+        gateway = configurador.obtener_config_red()['gateway']
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.sendto(b'', (gateway, PUERTO_DISCARD))
+    except socket.error:
+        pass
+    finally:
+        sock.close()
+    if not esperar(lambda: vecino_resuelto(gateway), limite):
+        raise RuntimeError('el gateway %s no responde ARP' % gateway)
+
+
+def verificar_dns(servidores, limite):
+    '''
+    Verifica que cada servidor de nombres responda al menos una de dos
+    consultas.
+    '''
+    restante = max(limite - time.time(), INTERVALO)
+    latencias = sondeo.medir(servidores, muestras=2, timeout=restante / 2)
+    caidos = [servidor for servidor in servidores if not latencias[servidor]]
+    if caidos:
+        raise RuntimeError('no responde el servidor de nombres %s' %
+                           ', '.join(caidos))
+
+
+def verificaciones(contexto, limite):
+    '''
+    Devuelve lista de tuplas (funcion, argumentos) con las verificaciones
+    correspondientes al contexto.
+    '''
+    dhcp = str(contexto.get('dhcp', '')).lower() == 'si'
+    lista = [
+        (verificar_direccion, (None if dhcp else contexto.get('ip'),
+                               limite)),
+        (verificar_gateway, (None if dhcp else contexto.get('gateway'),
+                             limite)),
+    ]
+    servidores = [contexto[clave] for clave in ('dns1', 'dns2')
+                  if contexto.get(clave)]
+    if servidores and configurador.cache_dns_activa(contexto):
+        servidores.append(configurador.DIRECCION_CACHE_DNS)
+    if servidores:
+        lista.append((verificar_dns, (servidores, limite)))
+    return lista
+
+
+def verificar(contexto, limite=None):
+    '''
+    Ejecuta las verificaciones en paralelo. Devuelve lista con los errores
+    encontrados, vacia si la red funciona. Las verificaciones que no terminan
+    dentro del tiempo limite se informan como error.
+    '''
+    fin = time.time() + (limite or LIMITE)
+    errores = {}
+
+    def ejecutar(funcion, argumentos):
+        try:
+            funcion(*argumentos)
+        except Exception as e:
+            errores[funcion.__name__] = str(e)
+
+    hilos = []
+    for funcion, argumentos in verificaciones(contexto, fin):
+        hilo = threading.Thread(target=ejecutar, args=(funcion, argumentos),
+                                name=funcion.__name__)
+        hilo.daemon = True
+        hilo.start()
+        hilos.append(hilo)
+    for hilo in hilos:
+        # margen para que las verificaciones informen su propio error
+        hilo.join(max(fin - time.time(), 0) + INTERVALO * 2)
+        if hilo.is_alive() and hilo.name not in errores:
+            errores[hilo.name] = '%s: sin respuesta' % hilo.name
+    return [errores[hilo.name] for hilo in hilos if hilo.name in errores]
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import unittest
+import mock
+
+from netcop.configurador import ancho_banda
+
+
+class NetcopFalso(threading.Thread):
+    '''
+    Socket de control que responde `respuesta` a un unico cliente y guarda el
+    mensaje recibido.
+    '''
+
+    def __init__(self, path, respuesta):
+        super(NetcopFalso, self).__init__()
+        self.daemon = True
+        self.respuesta = respuesta
+        self.mensaje = None
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(1)
+
+    def run(self):
+        conexion, _ = self.sock.accept()
+        try:
+            self.mensaje = json.loads(conexion.makefile().readline())
+            conexion.sendall(self.respuesta)
+        finally:
+            conexion.close()
+            self.sock.close()
+
+
+class AnchoBandaTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.socket = os.path.join(self.directorio, 'netcop.sock')
+        self.pidfile = os.path.join(self.directorio, 'netcop.pid')
+        self.patches = [
+            mock.patch.object(ancho_banda, 'SOCKET', self.socket),
+            mock.patch.object(ancho_banda, 'PIDFILE', self.pidfile),
+            mock.patch('syslog.syslog'),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.directorio)
+
+    def escribir_pid(self, pid):
+        with open(self.pidfile, 'w') as f:
+            f.write('%d\n' % pid)
+
+    def test_confirmado(self):
+        '''
+        Prueba la notificacion por el socket de control con confirmacion.
+        '''
+        netcop = NetcopFalso(self.socket, b'{"ok": true}\n')
+        netcop.start()
+        assert ancho_banda.notificar('3', '0.5') == ancho_banda.CONFIRMADO
+        netcop.join(1)
+        assert netcop.mensaje == {'comando': 'velocidades', 'bajada': 3.0,
+                                  'subida': 0.5}
+
+    @mock.patch('os.kill')
+    def test_error_socket(self, mock_kill):
+        '''
+        Prueba que si netcop informa un error se le envie la senal.
+        '''
+        netcop = NetcopFalso(self.socket, b'{"ok": false, "error": "x"}\n')
+        netcop.start()
+        self.escribir_pid(1234)
+        assert ancho_banda.notificar(3, 1) == ancho_banda.SIN_CONFIRMACION
+        mock_kill.assert_called_with(1234, signal.SIGHUP)
+
+    @mock.patch('os.kill')
+    def test_senal(self, mock_kill):
+        '''
+        Prueba el envio de SIGHUP cuando no existe el socket de control.
+        '''
+        self.escribir_pid(1234)
+        assert ancho_banda.notificar(3, 1) == ancho_banda.SIN_CONFIRMACION
+        mock_kill.assert_called_with(1234, signal.SIGHUP)
+
+    @mock.patch('os.kill')
+    def test_no_notificado(self, mock_kill):
+        '''
+        Prueba el resultado cuando netcop no se esta ejecutando.
+        '''
+        assert ancho_banda.notificar(3, 1) == ancho_banda.NO_NOTIFICADO
+        mock_kill.assert_not_called()
+        self.escribir_pid(1234)
+        mock_kill.side_effect = OSError(3, 'No such process')
+        assert ancho_banda.notificar(3, 1) == ancho_banda.NO_NOTIFICADO
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+
+from netcop.configurador import cache
+
+
+class CacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        os.chmod(self.directorio, 0o755)
+        self.patcher = mock.patch.object(cache, 'DIRECTORIO', self.directorio)
+        self.patcher.start()
+        self.archivo = os.path.join(self.directorio, 'br0')
+        with open(self.archivo, 'w') as f:
+            f.write('iface br0 inet dhcp\n')
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directorio)
+
+    def test_guardar_leer(self):
+        '''
+        Prueba guardar y leer la configuracion asociada a una clave.
+        '''
+        clave = cache.clave([self.archivo])
+        assert cache.leer(clave) is None
+        assert cache.guardar(clave, {'dhcp': 'si', 'bajada': '10'})
+        assert cache.leer(clave) == {'dhcp': 'si', 'bajada': '10'}
+        assert cache.leer(cache.clave([self.archivo, '/no/existe'])) is None
+
+    def test_clave_archivo_modificado(self):
+        '''
+        Prueba que la clave cambie al modificar o reemplazar un archivo.
+        '''
+        clave = cache.clave([self.archivo])
+        assert cache.clave([self.archivo]) == clave
+        with open(self.archivo, 'a') as f:
+            f.write('    bridge_ports eth0 eth1\n')
+        assert cache.clave([self.archivo]) != clave
+        clave = cache.clave([self.archivo])
+        nuevo = self.archivo + '.nuevo'
+        shutil.copy2(self.archivo, nuevo)
+        os.rename(nuevo, self.archivo)
+        assert cache.clave([self.archivo]) != clave
+
+    def test_clave_estado_red(self):
+        '''
+        Prueba que la clave cambie cuando cambia el estado de red.
+        '''
+        with mock.patch.object(cache, 'huella_red', return_value='a'):
+            clave = cache.clave([self.archivo])
+        with mock.patch.object(cache, 'huella_red', return_value='b'):
+            assert cache.clave([self.archivo]) != clave
+
+    def test_invalidar(self):
+        '''
+        Prueba borrar la cache.
+        '''
+        clave = cache.clave([self.archivo])
+        cache.guardar(clave, {'dhcp': 'si'})
+        cache.invalidar()
+        assert cache.leer(clave) is None
+        cache.invalidar()
+
+    def test_directorio_inseguro(self):
+        '''
+        Prueba que no se utilice un directorio en el que otros usuarios
+        pueden escribir.
+        '''
+        clave = cache.clave([self.archivo])
+        cache.guardar(clave, {'dhcp': 'si'})
+        os.chmod(self.directorio, 0o777)
+        assert cache.leer(clave) is None
+        assert not cache.guardar(clave, {'dhcp': 'no'})
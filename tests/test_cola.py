@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import mock
+
+from netcop.configurador import cola
+
+
+class ColaTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.temporal = os.path.join(self.directorio, 'netcop-cfg.tmp')
+        self.aplicados = []
+        self.patches = [
+            mock.patch.object(cola, 'DIRECTORIO', self.directorio),
+            mock.patch('netcop.configurador.configurador.TMP_CONFIG_FILE',
+                       self.temporal),
+            mock.patch('netcop.configurador.configurador.procesar_temporal',
+                       side_effect=self.procesar_temporal),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.directorio)
+
+    def procesar_temporal(self, path):
+        with open(path) as f:
+            contenido = f.read()
+        self.aplicados.append(contenido)
+        if contenido == 'error':
+            raise ValueError('bajada invalida')
+        # como procesar_temporal, solo se borra si se aplico con exito
+        os.remove(path)
+        return ['aplicar %s' % contenido]
+
+    def escribir(self, contenido):
+        with open(self.temporal, 'w') as f:
+            f.write(contenido)
+
+    def test_sin_temporal(self):
+        assert cola.enviar() is None
+        assert self.aplicados == []
+
+    def test_enviar(self):
+        '''
+        Prueba la aplicacion de un envio. El archivo temporal se borra al
+        encolarlo.
+        '''
+        self.escribir('bajada=1')
+        resultado = cola.enviar()
+        assert resultado == {'desde': 1, 'hasta': 1, 'error': None,
+                             'acciones': ['aplicar bajada=1']}
+        assert self.aplicados == ['bajada=1']
+        assert not os.path.exists(self.temporal)
+
+    def test_envios_absorbidos(self):
+        '''
+        Prueba que los envios que no empezaron a aplicarse se apliquen una
+        unica vez con la ultima configuracion.
+        '''
+        self.escribir('bajada=1')
+        assert cola.encolar() == 1
+        self.escribir('bajada=2')
+        assert cola.encolar() == 2
+        resultado = cola.esperar(1)
+        assert resultado['acciones'] == ['aplicar bajada=2']
+        assert (resultado['desde'], resultado['hasta']) == (1, 2)
+        assert cola.esperar(2) == resultado
+        assert self.aplicados == ['bajada=2']
+
+    def test_error(self):
+        '''
+        Prueba que el error se informe a todos los envios absorbidos.
+        '''
+        self.escribir('bajada=1')
+        cola.encolar()
+        self.escribir('error')
+        cola.encolar()
+        with self.assertRaises(ValueError):
+            cola.esperar(2)
+        with self.assertRaises(RuntimeError):
+            cola.esperar(1)
+        # el siguiente envio reemplaza al que fallo y se aplica normalmente
+        self.escribir('bajada=3')
+        assert cola.enviar()['acciones'] == ['aplicar bajada=3']
+        assert self.aplicados == ['error', 'bajada=3']
+        assert not cola.pendiente()
+
+    def test_reintento(self):
+        '''
+        Prueba que si la aplicacion falla la instantanea quede pendiente y la
+        siguiente ejecucion la vuelva a aplicar sin el archivo temporal.
+        '''
+        self.escribir('bajada=1')
+        with mock.patch('netcop.configurador.configurador.procesar_temporal',
+                        side_effect=IOError('red no disponible')):
+            with self.assertRaises(IOError):
+                cola.enviar()
+        assert cola.pendiente()
+        assert not os.path.exists(self.temporal)
+        resultado = cola.enviar()
+        assert resultado['acciones'] == ['aplicar bajada=1']
+        assert (resultado['desde'], resultado['hasta']) == (1, 1)
+        assert not cola.pendiente()
+        assert cola.enviar() is None
+        assert self.aplicados == ['bajada=1']
+
+    def test_envios_concurrentes(self):
+        '''
+        Prueba que los envios recibidos mientras se aplica la configuracion
+        esperen y se apliquen juntos en una unica ejecucion.
+        '''
+        iniciada = threading.Event()
+        continuar = threading.Event()
+        procesar_temporal = self.procesar_temporal
+
+        def procesar_lento(path):
+            iniciada.set()
+            continuar.wait(5)
+            return procesar_temporal(path)
+
+        resultados = {}
+
+        def enviar(secuencia=None):
+            if secuencia is None:
+                resultados[1] = cola.enviar()
+            else:
+                resultados[secuencia] = cola.esperar(secuencia)
+
+        with mock.patch('netcop.configurador.configurador.procesar_temporal',
+                        side_effect=procesar_lento):
+            self.escribir('bajada=1')
+            hilos = [threading.Thread(target=enviar)]
+            hilos[0].start()
+            assert iniciada.wait(5)
+            for secuencia in (2, 3, 4):
+                self.escribir('bajada=%d' % secuencia)
+                assert cola.encolar() == secuencia
+                hilos.append(threading.Thread(target=enviar,
+                                              args=(secuencia,)))
+                hilos[-1].start()
+            continuar.set()
+            for hilo in hilos:
+                hilo.join(5)
+        assert self.aplicados == ['bajada=1', 'bajada=4']
+        assert resultados[1]['acciones'] == ['aplicar bajada=1']
+        assert resultados[2] == resultados[3] == resultados[4]
+        assert (resultados[2]['desde'], resultados[2]['hasta']) == (2, 4)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import mock
+
+from netcop.configurador import config
+
+
+class ConfigTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.path = os.path.join(self.directorio, 'netcop.config')
+
+    def tearDown(self):
+        shutil.rmtree(self.directorio)
+
+    def escribir(self, contenido):
+        with open(self.path, 'w') as f:
+            f.write(contenido)
+
+    def test_valores_por_defecto(self):
+        '''
+        Prueba que sin archivo se utilicen los valores de Default, y que las
+        claves faltantes se completen.
+        '''
+        configuracion = config.Configuracion(self.path)
+        assert configuracion.DATABASE == config.Default.DATABASE
+        self.escribir('[database]\nuser=netcop\n')
+        assert configuracion.DATABASE['user'] == 'netcop'
+        assert configuracion.DATABASE['host'] == 'localhost'
+        assert configuracion.NETCOP == config.Default.NETCOP
+        with self.assertRaises(AttributeError):
+            configuracion.OTRA
+
+    @mock.patch('netcop.configurador.config.leer')
+    def test_lectura_bajo_demanda(self, mock_leer):
+        '''
+        Prueba que el archivo se lea al consultarlo y se vuelva a leer solo
+        si cambia.
+        '''
+        mock_leer.return_value = {'NETCOP': {'outside': 'eth0'}}
+        self.escribir('[netcop]\n')
+        configuracion = config.Configuracion(self.path)
+        mock_leer.assert_not_called()
+        configuracion.NETCOP
+        configuracion.NETCOP
+        assert mock_leer.call_count == 1
+        self.escribir('[netcop]\noutside=eth2\n')
+        configuracion.NETCOP
+        assert mock_leer.call_count == 2
+
+    def test_inmutable(self):
+        self.escribir('[netcop]\noutside=eth2\n')
+        configuracion = config.Configuracion(self.path)
+        configuracion.NETCOP['outside'] = 'eth9'
+        assert configuracion.NETCOP['outside'] == 'eth2'
+        secciones = configuracion.secciones()
+        secciones['NETCOP']['outside'] = 'eth9'
+        secciones.pop('DATABASE')
+        assert configuracion.secciones()['NETCOP']['outside'] == 'eth2'
+        assert 'DATABASE' in configuracion.secciones()
+
+    def test_concurrente(self):
+        '''
+        Prueba que varios hilos obtengan la configuracion con una unica
+        lectura.
+        '''
+        self.escribir('[netcop]\noutside=eth2\n')
+        configuracion = config.Configuracion(self.path)
+        leer = config.leer
+        resultados = []
+        with mock.patch('netcop.configurador.config.leer',
+                        side_effect=leer) as mock_leer:
+            hilos = [threading.Thread(
+                target=lambda: resultados.append(configuracion.NETCOP))
+                for _ in range(8)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join(5)
+        assert mock_leer.call_count == 1
+        assert [r['outside'] for r in resultados] == ['eth2'] * 8
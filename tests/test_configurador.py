@@ -1,8 +1,17 @@
 # -*- coding: utf-8 -*-
+import os
+import sys
+import shutil
+import tempfile
+import socket
+import syslog
 import unittest
+import subprocess
 import mock
 
 from netcop.configurador import configurador
+from netcop.configurador import tiempos
+from netcop.configurador import validacion
 
 
 class ConfiguradorTests(unittest.TestCase):
@@ -45,8 +54,8 @@ class ConfiguradorTests(unittest.TestCase):
             'bajada': '1',
             'dns1': '1.1.1.1',
             'ip': '1.1.1.1',
-            'mascara': '1.1.1.1',
-            'gateway': '1.1.1.1',
+            'mascara': '255.255.255.0',
+            'gateway': '1.1.1.254',
         }
         assert configurador.validar(parametros)
 
@@ -105,8 +114,8 @@ class ConfiguradorTests(unittest.TestCase):
         parametros = {
             'dns1': '1.1.1.1',
             'ip': '1.1.1.1',
-            'mascara': '1.1.1.1',
-            'gateway': '1.1.1.1',
+            'mascara': '255.255.255.0',
+            'gateway': '1.1.1.254',
         }
         with self.assertRaises(ValueError):
             assert configurador.validar(parametros)
@@ -212,12 +221,14 @@ class ConfiguradorTests(unittest.TestCase):
         assert config['subida'] == '11'
         mock_open.assert_any_call(configurador.NETCOP_CONFIG_FILE)
 
+    @mock.patch('netcop.configurador.netlink.consultar')
     @mock.patch('subprocess.check_output')
-    def test_obtener_parametros_network(self, mock_output):
+    def test_obtener_parametros_network(self, mock_output, mock_netlink):
         '''
         Prueba la lectura de parametros de configuracion de red actuamente
-        aplicada.
+        aplicada cuando netlink no esta disponible.
         '''
+        mock_netlink.side_effect = socket.error('no soportado')
         mock_open = mock.mock_open()
         mock_output.return_value = '''
         7: br0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc noqueue state
@@ -257,6 +268,45 @@ class ConfiguradorTests(unittest.TestCase):
         assert config['dhcp'] == 'si'
         mock_open.assert_any_call(configurador.NETWORK_CONFIG_FILE)
 
+    def test_parsear_reglas_por_archivo(self):
+        '''
+        Prueba que cada archivo se lea solo con sus propias reglas.
+        '''
+        lineas = [
+            'iface br0 inet static\n',
+            '# nameserver 8.8.8.8\n',
+            'nameserver 1.1.1.1\n',
+            'velocidad_bajada=3\n',
+            'velocidad_subida=0.5\n',
+            'horario=lun@08:00-18:00=10/2 \n',
+        ]
+        assert configurador.parsear_red(lineas) == {}
+        assert configurador.parsear_netcop(lineas) == {
+            'bajada': '3', 'subida': '0.5',
+            'horario': 'lun@08:00-18:00=10/2'}
+        assert configurador.parsear_dns(lineas) == {'dns1': '1.1.1.1'}
+        assert configurador.parsear_red(['iface br0 inet dhcp\n']) == \
+            {'dhcp': 'dhcp'}
+
+    @mock.patch('syslog.syslog')
+    @mock.patch('netcop.configurador.configurador.obtener_config_red')
+    def test_obtener_config_debug(self, mock_config_red, mock_syslog):
+        '''
+        Prueba que se registre un unico mensaje de depuracion por archivo y
+        solo si esta habilitado.
+        '''
+        mock_config_red.return_value = {}
+        mock_open = mock.mock_open(read_data='nameserver 1.1.1.1\n' * 50)
+        with mock.patch('netcop.configurador.configurador.open', mock_open):
+            with mock.patch('syslog.setlogmask') as mock_mask:
+                mock_mask.return_value = syslog.LOG_UPTO(syslog.LOG_DEBUG)
+                configurador.obtener_config()
+                assert mock_syslog.call_count == 4
+                mock_syslog.reset_mock()
+                mock_mask.return_value = syslog.LOG_UPTO(syslog.LOG_INFO)
+                configurador.obtener_config()
+                mock_syslog.assert_not_called()
+
     def test_obtener_parametros_dns(self):
         '''
         Prueba la lectura de parametros de configuracion de dns
@@ -271,6 +321,45 @@ class ConfiguradorTests(unittest.TestCase):
         assert config['dns2'] == '200.67.220.220'
         mock_open.assert_any_call(configurador.DNS_CONFIG_FILE)
 
+    @mock.patch('netcop.configurador.configurador.syslog')
+    @mock.patch('netcop.configurador.configurador.obtener_config')
+    def test_actualizar_cache(self, mock_config, mock_syslog):
+        '''
+        Prueba que la cache se complete desde el proceso que aplica los
+        cambios y que un error al leer la configuracion solo se registre.
+        '''
+        configurador.actualizar_cache()
+        mock_config.assert_called_once_with(usar_cache=True)
+        mock_config.side_effect = IOError('no existe')
+        configurador.actualizar_cache()
+        assert mock_syslog.syslog.called
+
+    @mock.patch('netcop.configurador.cache.guardar')
+    @mock.patch('netcop.configurador.cache.leer')
+    @mock.patch('netcop.configurador.configurador.obtener_config_red')
+    def test_obtener_config_cache(self, mock_config_red, mock_leer,
+                                  mock_guardar):
+        '''
+        Prueba que se utilice la cache solo cuando se solicita.
+        '''
+        mock_leer.return_value = {'dhcp': 'si', 'bajada': '10'}
+        config = configurador.obtener_config(usar_cache=True)
+        assert config == {'dhcp': 'si', 'bajada': '10'}
+        mock_config_red.assert_not_called()
+        # sin resultado guardado se lee la configuracion y se guarda
+        mock_leer.return_value = None
+        mock_config_red.return_value = {}
+        mock_open = mock.mock_open(read_data='nameserver 1.1.1.1')
+        with mock.patch('netcop.configurador.configurador.open', mock_open):
+            config = configurador.obtener_config(usar_cache=True)
+        assert config['dns1'] == '1.1.1.1'
+        mock_guardar.assert_called_with(mock.ANY, config)
+        # sin cache
+        mock_leer.reset_mock()
+        with mock.patch('netcop.configurador.configurador.open', mock_open):
+            configurador.obtener_config()
+        mock_leer.assert_not_called()
+
     @mock.patch('subprocess.call')
     def test_aplicar_cambios(self, mock_call):
         '''
@@ -333,19 +422,307 @@ class ConfiguradorTests(unittest.TestCase):
         mock_validar.assert_called()
         mock_config_red.assert_called()
 
+    @mock.patch('netcop.configurador.sondeo.ordenar_contexto')
+    def test_modelo_sondeo(self, mock_ordenar):
+        '''
+        Prueba que con dns_sondeo=si se ordenen los servidores de nombres y
+        que las opciones de resolv.conf nunca se tomen del contexto.
+        '''
+        contexto = {'dhcp': 'si', 'dns1': '8.8.8.8', 'dns2': '1.1.1.1',
+                    'dns_opciones': 'ndots:1\nnameserver 6.6.6.6'}
+        mock_ordenar.return_value = {'dns1': '1.1.1.1', 'dns2': '8.8.8.8',
+                                     'dns_opciones': 'timeout:1 attempts:2'}
+        assert configurador.modelo_sondeo(contexto) == {'dns_opciones': None}
+        mock_ordenar.assert_not_called()
+        archivos = dict(configurador.renderizar(contexto))
+        resolv = b''.join(archivos[configurador.DNS_CONFIG_FILE])
+        assert b'6.6.6.6' not in resolv and b'options' not in resolv
+        contexto['dns_sondeo'] = 'SI'
+        assert configurador.modelo_sondeo(contexto) == \
+            mock_ordenar.return_value
+        # las configuraciones de la flota no se miden desde este equipo
+        assert configurador.modelo_sondeo(contexto, sondear=False) == \
+            {'dns_opciones': None}
+        resolv = b''.join(dict(configurador.renderizar(contexto))[
+            configurador.DNS_CONFIG_FILE])
+        assert b'nameserver 1.1.1.1\nnameserver 8.8.8.8\n' \
+            b'options timeout:1 attempts:2\n' in resolv
+
+    @mock.patch('netcop.configurador.netlink.consultar')
+    def test_obtener_config_red_netlink(self, mock_netlink):
+        '''
+        Prueba la lectura de la configuracion de red mediante netlink.
+        '''
+        mock_netlink.return_value = ('172.18.124.129', '172.18.124.189', 25)
+        with mock.patch('subprocess.check_output') as mock_output:
+            config = configurador.obtener_config_red()
+        mock_output.assert_not_called()
+        assert config == {
+            'ip': '172.18.124.189',
+            'mascara': '255.255.255.128',
+            'gateway': '172.18.124.129',
+        }
+
+    @mock.patch('netcop.configurador.escritura.escribir')
     @mock.patch('netcop.configurador.configurador.obtener_contexto')
-    def test_configurar(self, mock_contexto):
+    def test_configurar(self, mock_contexto, mock_escribir):
         '''
         Prueba la funcion que provee el contexto a los templates.
         '''
         mock_contexto.return_value = {}
-        mock_open = mock.mock_open()
+        mock_open = mock.mock_open(read_data='configuracion anterior')
         with mock.patch('netcop.configurador.configurador.open', mock_open):
             configurador.configurar()
         mock_contexto.assert_called()
-        mock_open.assert_any_call(configurador.NETCOP_CONFIG_FILE, 'w')
-        mock_open.assert_any_call(configurador.NETWORK_CONFIG_FILE, 'w')
-        mock_open.assert_any_call(configurador.DNS_CONFIG_FILE, 'w')
+        escritos = [path for path, _ in mock_escribir.call_args[0][0]]
+        assert configurador.NETCOP_CONFIG_FILE in escritos
+        assert configurador.NETWORK_CONFIG_FILE in escritos
+        assert configurador.DNS_CONFIG_FILE in escritos
+
+    @mock.patch('netcop.configurador.cache.invalidar')
+    @mock.patch('netcop.configurador.escritura.escribir')
+    @mock.patch('netcop.configurador.configurador.renderizar')
+    def test_configurar_sin_cambios(self, mock_renderizar, mock_escribir,
+                                    mock_invalidar):
+        '''
+        Prueba que solo se reemplacen los archivos cuyo contenido cambio y
+        que el contenido se genere en su propia fase antes de escribirlo.
+        '''
+        path = configurador.NETWORK_CONFIG_FILE
+        mock_renderizar.return_value = [(path, iter([b'iface ', b'br0']))]
+        escritos = {}
+
+        def escribir(archivos, comparar):
+            # el contenido se consume recien al escribir
+            for destino, contenido in archivos:
+                escritos[destino] = b''.join(contenido)
+            return [path]
+
+        mock_escribir.side_effect = escribir
+        tiempos.iniciar()
+        try:
+            cambios = configurador.configurar({})
+        finally:
+            fases = [nombre for nombre, _ in tiempos.terminar()]
+        assert cambios == [path]
+        assert escritos == {path: b'iface br0'}
+        assert mock_escribir.call_args[1] == {'comparar': True}
+        mock_invalidar.assert_called()
+        assert 'renderizar %s' % path in fases
+
+    def test_renderizar_interfaces(self):
+        '''
+        Prueba la generacion de las subinterfaces VLAN y los bridges
+        adicionales.
+        '''
+        contexto = {'dhcp': 'si', 'outside': 'eth0', 'inside': 'eth1',
+                    'perfil_red': 'kernel', 'vlans': 'eth0.10 eth1.10',
+                    'puentes': 'br1:eth0.10,eth1.10'}
+        archivos = dict((path, b''.join(contenido)) for path, contenido
+                        in configurador.renderizar(contexto))
+        br0 = archivos[configurador.NETWORK_CONFIG_FILE].decode('utf-8')
+        assert 'iface br0 inet dhcp\n    bridge_ports eth0 eth1\n\n' \
+            'auto eth0.10\niface eth0.10 inet manual\n' \
+            '    vlan-raw-device eth0\n\n' in br0
+        assert br0.endswith('auto br1\niface br1 inet manual\n'
+                            '    bridge_ports eth0.10 eth1.10\n')
+        # se puede volver a leer la configuracion generada
+        params = configurador.parsear_red(br0.splitlines(True))
+        assert params == {'dhcp': 'dhcp', 'vlans': 'eth0.10 eth1.10',
+                          'puentes': 'br1:eth0.10,eth1.10'}
+
+    def test_modelo_red(self):
+        '''
+        Prueba que las subinterfaces VLAN y los bridges se generan cada vez
+        que se recorren, sin guardarlos en una lista.
+        '''
+        modelo = configurador.modelo_red({'vlans': 'eth0.10 eth1.10',
+                                          'puentes': 'br1:eth0.10,eth1.10'})
+        assert not isinstance(modelo['vlans'], list)
+        for _ in range(2):
+            assert [v['nombre'] for v in modelo['vlans']] == ['eth0.10',
+                                                               'eth1.10']
+            assert list(modelo['puentes']) == [
+                {'nombre': 'br1', 'puertos': ['eth0.10', 'eth1.10']}]
+
+    def test_renderizar_ajustes(self):
+        '''
+        Prueba los ajustes del perfil por defecto y los que se especifican
+        en el contexto.
+        '''
+        contexto = {'dhcp': 'si', 'outside': 'eth0', 'inside': 'eth1'}
+        archivos = dict((path, b''.join(contenido)) for path, contenido
+                        in configurador.renderizar(contexto))
+        br0 = archivos[configurador.NETWORK_CONFIG_FILE].decode('utf-8')
+        assert '    bridge_ports eth0 eth1\n    bridge_stp off\n' \
+            '    bridge_fd 0\n    bridge_maxwait 0\n' \
+            '    pre-up ethtool -K eth0 gro off gso off tso off lro off ' \
+            '|| true\n' in br0
+        contexto.update(perfil_red='kernel', mtu='9000', txqueuelen='500',
+                        anillos='rx=4096')
+        archivos = dict((path, b''.join(contenido)) for path, contenido
+                        in configurador.renderizar(contexto))
+        br0 = archivos[configurador.NETWORK_CONFIG_FILE].decode('utf-8')
+        assert '    bridge_ports eth0 eth1\n' \
+            '    pre-up ip link set dev eth0 mtu 9000 txqueuelen 500\n' \
+            '    pre-up ethtool -G eth0 rx 4096 || true\n' in br0
+        assert 'bridge_stp' not in br0 and 'ethtool -K' not in br0
+
+    def test_modelo_ajustes(self):
+        '''
+        Prueba que al activar STP no se utilice la demora de reenvio del
+        perfil, que el kernel no acepta.
+        '''
+        ajustes = configurador.modelo_ajustes({'bridge_stp': 'si'})['ajustes']
+        assert ajustes['bridge_stp'] is True
+        assert ajustes['bridge_fd'] is None
+        assert ajustes['bridge_maxwait'] == 0
+        assert ajustes['offloads'] == [('gro', False), ('gso', False),
+                                       ('tso', False), ('lro', False)]
+        ajustes = configurador.modelo_ajustes({'perfil_red': 'kernel'})
+        assert ajustes == {'ajustes': {
+            'bridge_stp': None, 'bridge_fd': None, 'bridge_maxwait': None,
+            'mtu': None, 'txqueuelen': None, 'offloads': [], 'anillos': []}}
+
+    def test_cache_dns(self):
+        '''
+        Prueba que con la cache de nombres local resolv.conf apunte a
+        127.0.0.1 y que se informen los servidores reales.
+        '''
+        directorio = tempfile.mkdtemp()
+        try:
+            rutas = dict((constante, os.path.join(directorio, nombre))
+                         for constante, nombre in (
+                             ('DNS_CONFIG_FILE', 'resolv.conf'),
+                             ('NETWORK_CONFIG_FILE', 'br0'),
+                             ('NETCOP_CONFIG_FILE', 'netcop.config'),
+                             ('DNSMASQ_CONFIG_FILE', 'dnsmasq.d/netcop.conf'),
+                             ('DNSMASQ_RESOLV_FILE', 'dnsmasq.resolv'),
+                             ('SYSCTL_CONFIG_FILE', '90-netcop.conf')))
+            os.mkdir(os.path.join(directorio, 'dnsmasq.d'))
+            contexto = {'dhcp': 'si', 'dns1': '8.8.8.8', 'dns2': '1.1.1.1',
+                        'cache_dns': 'si', 'cache_dns_tamanio': '5000',
+                        'bajada': '3', 'subida': '1'}
+            with mock.patch.multiple(configurador, **rutas), \
+                    mock.patch('netcop.configurador.configurador.'
+                               'obtener_config_red', return_value={}):
+                archivos = dict((path, b''.join(contenido)) for path, contenido
+                                in configurador.renderizar(contexto))
+                assert b'nameserver 127.0.0.1\n' in \
+                    archivos[rutas['DNS_CONFIG_FILE']]
+                assert b'8.8.8.8' not in archivos[rutas['DNS_CONFIG_FILE']]
+                dnsmasq = archivos[rutas['DNSMASQ_CONFIG_FILE']]
+                assert b'cache-size=5000\n' in dnsmasq
+                assert b'neg-ttl=60\n' in dnsmasq
+                assert ('resolv-file=%s\n' % rutas['DNSMASQ_RESOLV_FILE']
+                        ).encode('utf-8') in dnsmasq
+                configurador.configurar(contexto, sorted(archivos.items()))
+                config = configurador.obtener_config()
+                assert config['cache_dns'] == 'si'
+                assert (config['dns1'], config['dns2']) == ('8.8.8.8',
+                                                            '1.1.1.1')
+                assert config['cache_dns_tamanio'] == '5000'
+                # sin dnsmasq instalado no se generan sus archivos
+                shutil.rmtree(os.path.join(directorio, 'dnsmasq.d'))
+                assert len(configurador.archivos_configuracion()) == 4
+                temporal = os.path.join(directorio, 'netcop-cfg.tmp')
+                with open(temporal, 'w') as f:
+                    f.write('dhcp=si\ndns1=8.8.8.8\ncache_dns=si\n'
+                            'bajada=3\nsubida=1\n')
+                with self.assertRaises(validacion.ErrorValidacion):
+                    configurador.obtener_contexto(temporal)
+        finally:
+            shutil.rmtree(directorio)
+
+    @mock.patch('subprocess.call')
+    def test_aplicar_cambios_dnsmasq(self, mock_call):
+        '''
+        Prueba que dnsmasq se reinicie solo si cambia su configuracion y que
+        si cambian sus servidores de nombres se le indique volver a leerlos.
+        '''
+        mock_call.return_value = 0
+        contexto = {'cache_dns': 'si'}
+        acciones = configurador.aplicar_cambios(
+            [configurador.DNSMASQ_RESOLV_FILE], contexto)
+        assert acciones == ['reload dnsmasq.service']
+        acciones = configurador.aplicar_cambios(
+            [configurador.DNSMASQ_CONFIG_FILE,
+             configurador.DNSMASQ_RESOLV_FILE], contexto)
+        assert acciones == ['restart dnsmasq.service']
+        acciones = configurador.aplicar_cambios(
+            [configurador.DNSMASQ_CONFIG_FILE], {'cache_dns': 'no'})
+        assert acciones == ['stop dnsmasq.service']
+        # con la cache deshabilitada no se recarga
+        assert configurador.aplicar_cambios(
+            [configurador.DNSMASQ_RESOLV_FILE], {}) == []
+        mock_call.return_value = 1
+        with self.assertRaises(RuntimeError):
+            configurador.aplicar_cambios([configurador.DNSMASQ_CONFIG_FILE],
+                                         contexto)
+
+    @mock.patch('subprocess.call')
+    def test_aplicar_cambios_sysctl(self, mock_call):
+        '''
+        Prueba que los ajustes del kernel se apliquen sin reiniciar la red.
+        '''
+        mock_call.return_value = 0
+        acciones = configurador.aplicar_cambios(
+            [configurador.SYSCTL_CONFIG_FILE], {})
+        assert acciones == ['aplicar %s' % configurador.SYSCTL_CONFIG_FILE]
+        mock_call.assert_called_once_with(
+            ['sysctl', '-q', '-e', '-p', configurador.SYSCTL_CONFIG_FILE])
+        mock_call.return_value = 255
+        with self.assertRaises(RuntimeError):
+            configurador.aplicar_cambios([configurador.SYSCTL_CONFIG_FILE],
+                                         {})
+
+    @mock.patch('netcop.configurador.sysctl.congestion')
+    def test_renderizar_sysctl(self, mock_congestion):
+        '''
+        Prueba que se puedan volver a leer los ajustes del kernel generados.
+        '''
+        mock_congestion.return_value = 'cubic'
+        contexto = {'bajada': '300', 'subida': '50', 'hosts': '20'}
+        archivos = dict((path, b''.join(contenido)) for path, contenido
+                        in configurador.renderizar(contexto))
+        sysctl = archivos[configurador.SYSCTL_CONFIG_FILE].decode('utf-8')
+        assert '\n-net.netfilter.nf_conntrack_max = 131072\n' in sysctl
+        assert '\nnet.ipv4.tcp_congestion_control = cubic\n' in sysctl
+        params = configurador.parsear_sysctl(sysctl.splitlines(True))
+        assert params['hosts'] == '20'
+        assert params['nf_conntrack_max'] == '131072'
+        assert params['rmem_max'] == '8388608'
+        assert params['tcp_rmem'] == '4096 131072 8388608'
+        with mock.patch.object(configurador, 'SYSCTL_CONFIG_FILE',
+                               '/no/existe'):
+            assert configurador.leer_sysctl() == {}
+
+    @mock.patch('subprocess.call')
+    def test_aplicar_cambios_sin_red(self, mock_call):
+        '''
+        Prueba que no se reinicie la red cuando solo cambiaron los servidores
+        de nombre o la configuracion de netcop.
+        '''
+        acciones = configurador.aplicar_cambios([
+            configurador.DNS_CONFIG_FILE,
+            configurador.NETCOP_CONFIG_FILE,
+        ])
+        assert acciones == []
+        mock_call.assert_not_called()
+
+    @mock.patch('subprocess.call')
+    def test_aplicar_cambios_red(self, mock_call):
+        '''
+        Prueba que se reinicie la red cuando cambio la configuracion del
+        bridge.
+        '''
+        mock_call.return_value = 0
+        acciones = configurador.aplicar_cambios([
+            configurador.NETWORK_CONFIG_FILE,
+        ])
+        assert acciones == ['reiniciar networking.service']
+        mock_call.assert_called_with(['systemctl', 'restart',
+                                      'networking.service'])
 
     def test_get_mascara(self):
         '''
@@ -355,3 +732,185 @@ class ConfiguradorTests(unittest.TestCase):
         assert configurador.get_mascara(17) == '255.255.128.0'
         assert configurador.get_mascara(21) == '255.255.248.0'
         assert configurador.get_mascara(24) == '255.255.255.0'
+
+    @mock.patch('netcop.configurador.configurador.actualizar_cache')
+    @mock.patch('netcop.configurador.historial.registrar')
+    @mock.patch('netcop.configurador.configurador.borrar_temporal')
+    @mock.patch('netcop.configurador.configurador.verificar_cambios')
+    @mock.patch('netcop.configurador.configurador.estado_anterior')
+    @mock.patch('netcop.configurador.configurador.aplicar_cambios')
+    @mock.patch('netcop.configurador.configurador.configurar')
+    @mock.patch('netcop.configurador.configurador.obtener_contexto')
+    def test_procesar_temporal(self, mock_contexto, mock_configurar,
+                               mock_aplicar, mock_anterior, mock_verificar,
+                               mock_borrar, mock_registrar, mock_cache):
+        '''
+        Prueba el procesamiento completo del archivo temporal.
+        '''
+        mock_aplicar.return_value = ['reiniciar networking.service']
+        mock_verificar.return_value = ['verificar red']
+        acciones = configurador.procesar_temporal()
+        assert acciones == ['reiniciar networking.service', 'verificar red']
+        contexto = mock_contexto.return_value
+        mock_anterior.assert_called_with(contexto)
+        mock_configurar.assert_called_with(contexto)
+        mock_aplicar.assert_called_with(mock_configurar.return_value,
+                                        contexto)
+        mock_verificar.assert_called_with(mock_configurar.return_value,
+                                          contexto,
+                                          mock_anterior.return_value)
+        mock_registrar.assert_called_with(contexto, [
+            configurador.NETWORK_CONFIG_FILE,
+            configurador.DNS_CONFIG_FILE,
+            configurador.NETCOP_CONFIG_FILE,
+            configurador.SYSCTL_CONFIG_FILE,
+        ])
+        mock_borrar.assert_called()
+        # la cache se completa con la configuracion aplicada
+        mock_cache.assert_called_once_with()
+
+    @mock.patch('netcop.configurador.verificacion.verificar')
+    @mock.patch('netcop.configurador.configurador.aplicar_cambios')
+    @mock.patch('netcop.configurador.configurador.configurar')
+    def test_verificar_cambios(self, mock_configurar, mock_aplicar,
+                               mock_verificar):
+        '''
+        Prueba que si la red no supera la verificacion se restauren y se
+        vuelvan a aplicar los archivos anteriores.
+        '''
+        archivos = [(configurador.DNS_CONFIG_FILE, b'nameserver 8.8.8.8')]
+        anterior = (archivos, {'dns1': '8.8.8.8'})
+        contexto = {'dns1': '10.0.0.1'}
+        # sin cambios de red no se verifica
+        assert configurador.verificar_cambios(
+            [configurador.NETCOP_CONFIG_FILE], contexto, anterior) == []
+        assert configurador.verificar_cambios(
+            [configurador.DNS_CONFIG_FILE], contexto, None) == []
+        mock_verificar.assert_not_called()
+        mock_verificar.return_value = []
+        assert configurador.verificar_cambios(
+            [configurador.DNS_CONFIG_FILE], contexto, anterior) == \
+            ['verificar red']
+        mock_configurar.assert_not_called()
+        mock_verificar.return_value = ['no responde 10.0.0.1']
+        with self.assertRaises(RuntimeError):
+            configurador.verificar_cambios(
+                [configurador.DNS_CONFIG_FILE], contexto, anterior)
+        mock_verificar.assert_called_with(contexto)
+        mock_configurar.assert_called_once_with({'dns1': '8.8.8.8'},
+                                                archivos)
+        mock_aplicar.assert_called_once_with(mock_configurar.return_value,
+                                             {'dns1': '8.8.8.8'})
+
+    @mock.patch('netcop.configurador.configurador.obtener_config')
+    def test_estado_anterior(self, mock_config):
+        directorio = tempfile.mkdtemp()
+        try:
+            resolv = os.path.join(directorio, 'resolv.conf')
+            with open(resolv, 'wb') as f:
+                f.write(b'nameserver 8.8.8.8\n')
+            mock_config.return_value = {'dns1': '8.8.8.8', 'dhcp': 'no'}
+            with mock.patch.object(configurador, 'DNS_CONFIG_FILE', resolv), \
+                    mock.patch.object(configurador, 'NETWORK_CONFIG_FILE',
+                                      '/no/existe'), \
+                    mock.patch.object(configurador, 'NETCOP_CONFIG_FILE',
+                                      '/no/existe'), \
+                    mock.patch.object(configurador, 'SYSCTL_CONFIG_FILE',
+                                      '/no/existe'):
+                archivos, anterior = configurador.estado_anterior(
+                    {'dns2': '8.8.4.4', 'outside': 'eth0', 'dhcp': 'si'})
+            assert archivos == [(resolv, b'nameserver 8.8.8.8\n')]
+            assert anterior == {'dns1': '8.8.8.8', 'dhcp': 'no',
+                                'outside': 'eth0'}
+        finally:
+            shutil.rmtree(directorio)
+
+    @mock.patch('netcop.configurador.configurador.actualizar_cache')
+    @mock.patch('netcop.configurador.historial.registrar')
+    @mock.patch('netcop.configurador.historial.leer_archivos')
+    @mock.patch('netcop.configurador.historial.obtener')
+    @mock.patch('netcop.configurador.configurador.aplicar_cambios')
+    @mock.patch('netcop.configurador.configurador.configurar')
+    @mock.patch('netcop.configurador.configurador.renderizar')
+    def test_restaurar(self, mock_renderizar, mock_configurar, mock_aplicar,
+                       mock_obtener, mock_leer, mock_registrar, mock_cache):
+        '''
+        Prueba que la restauracion copie los archivos guardados sin
+        renderizar los templates.
+        '''
+        mock_obtener.return_value = {'contexto': {'bajada': '3'}}
+        mock_leer.return_value = [(configurador.DNS_CONFIG_FILE, b'x')]
+        mock_configurar.return_value = [configurador.DNS_CONFIG_FILE]
+        mock_aplicar.return_value = []
+        assert configurador.restaurar(3) == []
+        mock_obtener.assert_called_with(3)
+        mock_configurar.assert_called_with(
+            {'bajada': '3'}, [(configurador.DNS_CONFIG_FILE, b'x')])
+        mock_renderizar.assert_not_called()
+        mock_registrar.assert_called_with(
+            {'bajada': '3'}, [configurador.DNS_CONFIG_FILE], origen=3)
+        mock_cache.assert_called_once_with()
+
+    @mock.patch('subprocess.call')
+    @mock.patch('netcop.configurador.red.aplicar')
+    def test_aplicar_cambios_en_caliente(self, mock_aplicar, mock_call):
+        '''
+        Prueba que los cambios de red se apliquen en caliente si se especifica
+        el contexto.
+        '''
+        mock_aplicar.return_value = ['ip addr replace 10.0.0.2/24 dev br0']
+        acciones = configurador.aplicar_cambios(
+            [configurador.NETWORK_CONFIG_FILE], {'ip': '10.0.0.2'})
+        assert acciones == ['ip addr replace 10.0.0.2/24 dev br0']
+        mock_aplicar.assert_called_with({'ip': '10.0.0.2'})
+        mock_call.assert_not_called()
+
+    @mock.patch('subprocess.call')
+    @mock.patch('netcop.configurador.ancho_banda.notificar')
+    def test_aplicar_cambios_ancho_banda(self, mock_notificar, mock_call):
+        '''
+        Prueba que los cambios de ancho de banda se notifiquen a netcop sin
+        modificar la red.
+        '''
+        mock_notificar.return_value = 'confirmado'
+        acciones = configurador.aplicar_cambios(
+            [configurador.NETCOP_CONFIG_FILE], {'bajada': '3', 'subida': '1'})
+        assert acciones == ['notificar velocidades a netcop (confirmado)']
+        mock_notificar.assert_called_with(3.0, 1.0)
+        mock_call.assert_not_called()
+        # con horario se notifican las velocidades de la franja activa
+        contexto = {'bajada': '3', 'subida': '1',
+                    'horario': 'lun-dom@00:00-24:00=10/2'}
+        configurador.aplicar_cambios([configurador.NETCOP_CONFIG_FILE],
+                                     contexto)
+        mock_notificar.assert_called_with(10.0, 2.0)
+
+    @mock.patch('syslog.syslog')
+    @mock.patch('subprocess.call')
+    @mock.patch('netcop.configurador.red.aplicar')
+    def test_aplicar_cambios_en_caliente_error(self, mock_aplicar, mock_call,
+                                               mock_syslog):
+        '''
+        Prueba que se reinicie la red si no se puede aplicar en caliente.
+        '''
+        mock_aplicar.side_effect = RuntimeError('ip: codigo de salida 2')
+        mock_call.return_value = 0
+        acciones = configurador.aplicar_cambios(
+            [configurador.NETWORK_CONFIG_FILE], {'ip': '10.0.0.2'})
+        assert acciones == ['reiniciar networking.service']
+        mock_call.assert_called_with(['systemctl', 'restart',
+                                      'networking.service'])
+
+    def test_importacion_liviana(self):
+        '''
+        Prueba que el camino de lectura no importe los modulos que solo se
+        utilizan al aplicar la configuracion.
+        '''
+        codigo = (
+            'import sys\n'
+            'import netcop.configurador.configurador\n'
+            'for m in ("jinja2", "configparser",\n'
+            '          "netcop.configurador.config"):\n'
+            '    assert m not in sys.modules, m\n'
+        )
+        assert subprocess.call([sys.executable, '-c', codigo]) == 0
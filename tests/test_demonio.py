@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import mock
+
+from netcop.configurador import demonio
+from netcop.configurador import tiempos
+
+
+class DemonioTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.fd = demonio.iniciar_inotify(self.directorio)
+        self.patch = mock.patch.object(
+            tiempos, 'RESUMEN', os.path.join(self.directorio, 'tiempos.json'))
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        os.close(self.fd)
+        shutil.rmtree(self.directorio)
+
+    def escribir(self, nombre, contenido='dhcp=si\n'):
+        with open(os.path.join(self.directorio, nombre), 'w') as f:
+            f.write(contenido)
+
+    def test_esperar_archivo_cerrado(self):
+        '''
+        Prueba que se detecte el cierre del archivo temporal luego de ser
+        escrito.
+        '''
+        self.escribir('netcop-cfg.tmp')
+        demonio.esperar_archivo(self.fd, 'netcop-cfg.tmp')
+
+    def test_esperar_archivo_movido(self):
+        '''
+        Prueba que se detecte el archivo temporal cuando la UI lo renombra.
+        '''
+        self.escribir('.parcial')
+        os.rename(os.path.join(self.directorio, '.parcial'),
+                  os.path.join(self.directorio, 'netcop-cfg.tmp'))
+        demonio.esperar_archivo(self.fd, 'netcop-cfg.tmp')
+
+    def test_esperar_archivo_ignora_otros(self):
+        '''
+        Prueba que los eventos de otros archivos del directorio no despierten
+        al demonio.
+        '''
+        hilo = threading.Thread(target=demonio.esperar_archivo,
+                                args=(self.fd, 'netcop-cfg.tmp'))
+        hilo.daemon = True
+        hilo.start()
+        self.escribir('otro.tmp')
+        hilo.join(0.2)
+        assert hilo.is_alive()
+        self.escribir('netcop-cfg.tmp')
+        hilo.join(2)
+        assert not hilo.is_alive()
+
+    def test_iniciar_inotify_error(self):
+        '''
+        Prueba el tratamiento de errores cuando no existe el directorio.
+        '''
+        with self.assertRaises(OSError):
+            demonio.iniciar_inotify(os.path.join(self.directorio, 'no'))
+
+    @mock.patch('syslog.syslog')
+    @mock.patch('netcop.configurador.cola.pendiente')
+    @mock.patch('netcop.configurador.cola.enviar')
+    @mock.patch('netcop.configurador.configurador.existe_archivo_temporal')
+    def test_procesar(self, mock_existe, mock_procesar, mock_pendiente,
+                      mock_syslog):
+        '''
+        Prueba que se aplique el archivo temporal solo cuando existe o quedo
+        pendiente una aplicacion que fallo, y que los tiempos se registren
+        aunque no se muestren.
+        '''
+        mock_existe.return_value = False
+        mock_pendiente.return_value = False
+        assert not demonio.procesar()
+        mock_procesar.assert_not_called()
+        mock_pendiente.return_value = True
+        assert demonio.procesar()
+        mock_procesar.assert_called_once_with()
+        mock_pendiente.return_value = False
+        mock_existe.return_value = True
+        assert demonio.procesar()
+        assert mock_procesar.call_count == 2
+        assert os.path.isfile(tiempos.RESUMEN)
+        assert any('Tiempos' in c[0][1] for c in mock_syslog.call_args_list)
+
+    @mock.patch('syslog.syslog')
+    @mock.patch('netcop.configurador.cola.enviar')
+    @mock.patch('netcop.configurador.configurador.existe_archivo_temporal')
+    def test_procesar_error(self, mock_existe, mock_procesar, mock_syslog):
+        '''
+        Prueba que un error al aplicar la configuracion no detenga el demonio.
+        '''
+        mock_existe.return_value = True
+        mock_procesar.side_effect = ValueError('bajada invalida')
+        assert not demonio.procesar()
+        mock_syslog.assert_called()
+
+    def test_esperar_archivo_timeout(self):
+        '''
+        Prueba que la espera termine al cumplirse el tiempo maximo.
+        '''
+        assert not demonio.esperar_archivo(self.fd, 'netcop-cfg.tmp', 0.05)
+        self.escribir('netcop-cfg.tmp')
+        assert demonio.esperar_archivo(self.fd, 'netcop-cfg.tmp', 1)
+
+    @mock.patch('syslog.syslog')
+    @mock.patch('netcop.configurador.ancho_banda.notificar')
+    def test_aplicar_horario(self, mock_notificar, mock_syslog):
+        '''
+        Prueba que se notifique a netcop solo cuando cambia el perfil activo
+        del horario de netcop.config.
+        '''
+        netcop = {'velocidad_bajada': '3', 'velocidad_subida': '1'}
+        with mock.patch('netcop.configurador.config.CONFIGURACION') as conf:
+            conf.NETCOP = netcop
+            assert demonio.aplicar_horario() == (None, None)
+            netcop['horario'] = 'lun-dom@00:00-24:00=10/2'
+            mock_notificar.return_value = 'confirmado'
+            perfil, espera = demonio.aplicar_horario()
+            assert perfil == (10.0, 2.0)
+            assert 0 < espera <= 7 * 24 * 3600
+            mock_notificar.assert_called_once_with(10.0, 2.0)
+            demonio.aplicar_horario(perfil)
+            assert mock_notificar.call_count == 1
+            # si netcop no se esta ejecutando se vuelve a intentar en poco
+            # tiempo, sin esperar a la proxima transicion
+            netcop['horario'] = 'lun-dom@00:00-24:00=20/2'
+            mock_notificar.return_value = 'no notificado'
+            assert demonio.aplicar_horario(perfil) == (
+                None, demonio.REINTENTO_HORARIO)
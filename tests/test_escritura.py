@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+import mock
+
+from netcop.configurador import escritura
+
+
+class EscrituraTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directorio)
+
+    def path(self, *partes):
+        return os.path.join(self.directorio, *partes)
+
+    def leer(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_escribir(self):
+        '''
+        Prueba la escritura de varios archivos nuevos y existentes.
+        '''
+        os.mkdir(self.path('etc'))
+        with open(self.path('etc', 'br0'), 'wb') as f:
+            f.write(b'anterior')
+        escritura.escribir([
+            (self.path('etc', 'br0'), b'iface br0 inet dhcp\n'),
+            (self.path('resolv.conf'), b'nameserver 1.1.1.1\n'),
+        ])
+        assert self.leer(self.path('etc', 'br0')) == b'iface br0 inet dhcp\n'
+        assert self.leer(self.path('resolv.conf')) == b'nameserver 1.1.1.1\n'
+        assert sorted(os.listdir(self.directorio)) == ['etc', 'resolv.conf']
+        assert os.listdir(self.path('etc')) == ['br0']
+
+    def test_escribir_permisos(self):
+        '''
+        Prueba que se conserven los permisos del archivo reemplazado y que los
+        archivos nuevos sean legibles por todos.
+        '''
+        with open(self.path('netcop.config'), 'wb') as f:
+            f.write(b'anterior')
+        os.chmod(self.path('netcop.config'), 0o600)
+        escritura.escribir([
+            (self.path('netcop.config'), b'[netcop]\n'),
+            (self.path('resolv.conf'), b'nameserver 1.1.1.1\n'),
+        ])
+        modo = stat.S_IMODE(os.stat(self.path('netcop.config')).st_mode)
+        assert modo == 0o600
+        modo = stat.S_IMODE(os.stat(self.path('resolv.conf')).st_mode)
+        assert modo == escritura.PERMISOS_POR_DEFECTO
+
+    def test_escribir_enlace(self):
+        '''
+        Prueba que se reemplace el archivo apuntado por un enlace simbolico y
+        no el enlace.
+        '''
+        with open(self.path('resolv.real'), 'wb') as f:
+            f.write(b'anterior')
+        os.symlink(self.path('resolv.real'), self.path('resolv.conf'))
+        escritura.escribir([(self.path('resolv.conf'), b'nameserver 1.1.1.1')])
+        assert os.path.islink(self.path('resolv.conf'))
+        assert self.leer(self.path('resolv.real')) == b'nameserver 1.1.1.1'
+
+    def test_escribir_error(self):
+        '''
+        Prueba que ante un error no se modifique ningun archivo ni queden
+        temporales.
+        '''
+        with open(self.path('br0'), 'wb') as f:
+            f.write(b'anterior')
+        with self.assertRaises(OSError):
+            escritura.escribir([
+                (self.path('br0'), b'nuevo'),
+                (self.path('no', 'existe'), b'nuevo'),
+            ])
+        assert self.leer(self.path('br0')) == b'anterior'
+        assert os.listdir(self.directorio) == ['br0']
+
+    def test_escribir_error_sincronizando(self):
+        '''
+        Prueba que un error al sincronizar no deje temporales ni archivos
+        truncados.
+        '''
+        with open(self.path('br0'), 'wb') as f:
+            f.write(b'anterior')
+        with mock.patch('os.fdatasync') as mock_sync:
+            mock_sync.side_effect = OSError(5, 'Input/output error')
+            with self.assertRaises(OSError):
+                escritura.escribir([(self.path('br0'), b'nuevo')])
+        assert self.leer(self.path('br0')) == b'anterior'
+        assert os.listdir(self.directorio) == ['br0']
+
+    @mock.patch('netcop.configurador.escritura.sincronizar_directorio')
+    def test_escribir_sincroniza_directorios(self, mock_sincronizar):
+        '''
+        Prueba que se sincronice una sola vez cada directorio.
+        '''
+        escritura.escribir([
+            (self.path('a'), b'a'),
+            (self.path('b'), b'b'),
+        ])
+        mock_sincronizar.assert_called_once_with(
+            os.path.realpath(self.directorio))
+
+    def test_escribir_generador(self):
+        '''
+        Prueba la escritura de un contenido generado por bloques.
+        '''
+        bloques = (('linea %d\n' % i).encode('ascii') for i in range(5000))
+        escritura.escribir([(self.path('br0'), bloques)])
+        contenido = self.leer(self.path('br0'))
+        assert contenido == b''.join(('linea %d\n' % i).encode('ascii')
+                                     for i in range(5000))
+
+    def test_escribir_comparar(self):
+        '''
+        Prueba que al comparar solo se reemplacen los archivos que cambiaron,
+        incluso si el contenido nuevo es prefijo del actual o viceversa.
+        '''
+        archivos = {'igual': b'abc' * 30000, 'distinto': b'abc' * 30000,
+                    'corto': b'abc' * 30000, 'largo': b'abc'}
+        for nombre, contenido in archivos.items():
+            with open(self.path(nombre), 'wb') as f:
+                f.write(contenido)
+        inodos = dict((nombre, os.stat(self.path(nombre)).st_ino)
+                      for nombre in archivos)
+        nuevos = [
+            (self.path('igual'), iter([b'abc' * 20000, b'abc' * 10000])),
+            (self.path('distinto'), iter([b'abc' * 20000, b'x'])),
+            (self.path('corto'), iter([b'abc' * 100])),
+            (self.path('largo'), iter([b'abc', b'def'])),
+            (self.path('nuevo'), b'nuevo'),
+        ]
+        escritos = escritura.escribir(nuevos, comparar=True)
+        assert escritos == [self.path(n) for n in ('distinto', 'corto',
+                                                   'largo', 'nuevo')]
+        assert os.stat(self.path('igual')).st_ino == inodos['igual']
+        assert self.leer(self.path('distinto')) == b'abc' * 20000 + b'x'
+        assert self.leer(self.path('corto')) == b'abc' * 100
+        assert self.leer(self.path('largo')) == b'abcdef'
+        assert self.leer(self.path('nuevo')) == b'nuevo'
+        assert escritura.escribir([(self.path('nuevo'), b'nuevo')],
+                                  comparar=True) == []
+
+    def test_hash_archivo(self):
+        with open(self.path('br0'), 'wb') as f:
+            f.write(b'abc')
+        assert escritura.hash_archivo(self.path('br0')) == (
+            'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad')
+        assert escritura.hash_archivo(self.path('no')) is None
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import mock
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from netcop.configurador import configurador
+from netcop.configurador import flota
+
+CSV = '''nombre,dhcp,ip,mascara,gateway,dns1,dns2,bajada,subida
+oficina-1,si,,,,,,1024,1024
+oficina-2,no,192.168.1.122,255.255.255.0,192.168.1.1,192.168.1.1,,3,0.5
+oficina-3,no,192.168.1.122,255.0.255.0,192.168.1.1,192.168.1.1,,3,1
+'''
+
+
+class FlotaTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.destino = os.path.join(self.directorio, 'salida')
+
+    def tearDown(self):
+        shutil.rmtree(self.directorio)
+
+    def escribir(self, nombre, contenido):
+        path = os.path.join(self.directorio, nombre)
+        with open(path, 'w') as f:
+            f.write(contenido)
+        return path
+
+    def leer(self, *partes):
+        with open(os.path.join(self.destino, *partes)) as f:
+            return f.read()
+
+    def test_leer_filas_csv(self):
+        '''
+        Prueba la lectura de un archivo CSV. Las columnas vacias se ignoran.
+        '''
+        filas = list(flota.leer_filas(self.escribir('equipos.csv', CSV)))
+        assert len(filas) == 3
+        assert filas[0] == {'nombre': 'oficina-1', 'dhcp': 'si',
+                            'bajada': '1024', 'subida': '1024'}
+
+    def test_leer_filas_jsonl(self):
+        '''
+        Prueba la lectura de un archivo JSONL. Los valores se convierten a
+        texto.
+        '''
+        path = self.escribir('equipos.jsonl', '\n'.join([
+            json.dumps({'dhcp': 'si', 'bajada': 10, 'subida': 0.5}),
+            '',
+            json.dumps({'nombre': 'b', 'dhcp': 'si'}),
+        ]))
+        filas = list(flota.leer_filas(path))
+        assert len(filas) == 2
+        assert filas[0] == {'dhcp': 'si', 'bajada': '10', 'subida': '0.5'}
+
+    def test_procesar_fila(self):
+        '''
+        Prueba la generacion de los archivos de un equipo.
+        '''
+        fila = {'nombre': 'oficina-2', 'ip': '192.168.1.122',
+                'mascara': '255.255.255.0', 'gateway': '192.168.1.1',
+                'dns1': '8.8.8.8', 'bajada': '3', 'subida': '0.5',
+                'outside': 'eth2'}
+        assert flota.procesar_fila((self.destino, 1, fila, False)) == \
+            (1, 'oficina-2', [])
+        br0 = self.leer('oficina-2', 'etc', 'network', 'interfaces.d', 'br0')
+        assert 'address 192.168.1.122' in br0
+        assert 'bridge_ports eth2 eth1' in br0
+        assert 'nameserver 8.8.8.8' in self.leer('oficina-2', 'etc',
+                                                 'resolv.conf')
+        netcop = self.leer('oficina-2', 'etc', 'netcop', 'netcop.config')
+        assert 'velocidad_subida=0.5' in netcop
+        # no depende del kernel del equipo que genera las configuraciones
+        assert 'net.ipv4.tcp_congestion_control = cubic\n' in self.leer(
+            'oficina-2', 'etc', 'sysctl.d', '90-netcop.conf')
+
+    def test_procesar_fila_cache_dns(self):
+        '''
+        Prueba que se generen los archivos de dnsmasq aunque no este
+        instalado en el equipo que genera las configuraciones.
+        '''
+        fila = {'nombre': 'oficina-4', 'dhcp': 'si', 'dns1': '8.8.8.8',
+                'cache_dns': 'si', 'bajada': '3', 'subida': '1'}
+        with mock.patch.object(configurador, 'DNSMASQ_CONFIG_FILE',
+                               '/no/existe/netcop.conf'):
+            assert flota.procesar_fila((self.destino, 1, fila, False)) == \
+                (1, 'oficina-4', [])
+        assert 'nameserver 127.0.0.1' in self.leer('oficina-4', 'etc',
+                                                   'resolv.conf')
+        assert 'cache-size=1000' in self.leer('oficina-4', 'no', 'existe',
+                                              'netcop.conf')
+        assert 'nameserver 8.8.8.8' in self.leer('oficina-4', 'etc', 'netcop',
+                                                 'dnsmasq.resolv')
+
+    def test_procesar_fila_errores(self):
+        '''
+        Prueba que las filas invalidas no generen archivos.
+        '''
+        numero, nombre, errores = flota.procesar_fila(
+            (self.destino, 7, {'nombre': '../x', 'bajada': '1'}, False))
+        assert (numero, nombre) == (7, '../x')
+        assert 'nombre ../x: formato invalido' in errores
+        assert 'Debe ingresar ip o dhcp=si' in errores
+        assert 'bajada y subida son obligatorios' in errores
+        assert not os.path.exists(self.destino)
+        # las columnas desconocidas se rechazan, las de netcop.config no
+        numero, nombre, errores = flota.procesar_fila(
+            (self.destino, 8, {'dhcp': 'si', 'bajada': '1', 'subida': '1',
+                               'outside': 'eth2', 'database': 'netcop',
+                               'subdia': '1'}, False))
+        assert errores == ['subdia: parametro desconocido']
+
+    def test_generar(self):
+        '''
+        Prueba la generacion en paralelo. Los resultados se devuelven en el
+        orden de las filas aunque se envien en varios lotes.
+        '''
+        filas = [{'dhcp': 'si', 'bajada': str(i), 'subida': '1'}
+                 for i in range(1, 40)]
+        filas[10]['subida'] = '0'
+        resultados = list(flota.generar(iter(filas), self.destino,
+                                        procesos=2, tamano_chunk=2))
+        assert [numero for numero, _, _ in resultados] == list(range(1, 40))
+        assert [numero for numero, _, e in resultados if e] == [11]
+        assert len(os.listdir(self.destino)) == 38
+
+    def test_generar_nombres_repetidos(self):
+        '''
+        Prueba que las filas con un nombre ya utilizado se informen como error
+        sin sobrescribir la configuracion de la primera.
+        '''
+        filas = [{'nombre': 'a', 'dhcp': 'si', 'bajada': '1', 'subida': '1'},
+                 {'nombre': 'a', 'dhcp': 'si', 'bajada': '2', 'subida': '1'},
+                 {'dhcp': 'si', 'bajada': '3', 'subida': '1'},
+                 {'nombre': '3', 'dhcp': 'si', 'bajada': '4', 'subida': '1'}]
+        resultados = list(flota.generar(iter(filas), self.destino,
+                                        procesos=2))
+        assert resultados == [(1, 'a', []),
+                              (2, 'a', ['nombre a: repetido']),
+                              (3, '3', []),
+                              (4, '3', ['nombre 3: repetido'])]
+        assert sorted(os.listdir(self.destino)) == ['3', 'a']
+        assert 'velocidad_bajada=1\n' in self.leer('a', 'etc', 'netcop',
+                                                   'netcop.config')
+
+    def test_ejecutar(self):
+        '''
+        Prueba el informe de errores de cada fila.
+        '''
+        path = self.escribir('equipos.csv', CSV)
+        with mock.patch('sys.stdout', new_callable=StringIO) as salida:
+            assert flota.ejecutar(path, self.destino, procesos=2) == 1
+        assert sorted(os.listdir(self.destino)) == ['oficina-1', 'oficina-2']
+        assert salida.getvalue() == (
+            'fila 3 (oficina-3): mascara 255.0.255.0: formato invalido\n'
+            '2 configuraciones generadas, 1 con errores\n')
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+
+from netcop.configurador import historial
+
+CONTEXTO = {'ip': '192.168.1.122', 'mascara': '255.255.255.0',
+            'gateway': '192.168.1.1', 'bajada': '3', 'subida': '1'}
+
+
+class HistorialTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.historial = os.path.join(self.directorio, 'historial')
+        self.br0 = os.path.join(self.directorio, 'br0')
+        self.netcop = os.path.join(self.directorio, 'netcop.config')
+        self.patch = mock.patch.object(historial, 'DIRECTORIO',
+                                       self.historial)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        shutil.rmtree(self.directorio)
+
+    def archivos(self, bajada):
+        '''
+        Escribe los archivos de configuracion y devuelve sus paths.
+        '''
+        for path, contenido in ((self.br0, b'iface br0 inet dhcp'),
+                                (self.netcop, b'velocidad_bajada=' + bajada)):
+            with open(path, 'wb') as f:
+                f.write(contenido)
+        return [self.br0, self.netcop]
+
+    def objetos(self):
+        return os.listdir(os.path.join(self.historial, 'objetos'))
+
+    def test_registrar(self):
+        '''
+        Prueba que los archivos que no cambian se guarden una unica vez.
+        '''
+        assert historial.registrar(CONTEXTO, self.archivos(b'3')) == 1
+        assert historial.registrar(CONTEXTO, self.archivos(b'5')) == 2
+        assert len(self.objetos()) == 3
+        entradas = historial.listar()
+        assert [e['version'] for e in entradas] == [1, 2]
+        assert entradas[0]['contexto'] == CONTEXTO
+        leidos = [(path, b''.join(contenido)) for path, contenido
+                  in historial.leer_archivos(entradas[0])]
+        assert leidos == [(self.br0, b'iface br0 inet dhcp'),
+                          (self.netcop, b'velocidad_bajada=3')]
+        assert os.stat(self.historial).st_mode & 0o777 == 0o700
+
+    def test_obtener(self):
+        historial.registrar(CONTEXTO, self.archivos(b'3'))
+        historial.registrar(CONTEXTO, self.archivos(b'3'), origen=1)
+        assert historial.obtener(2)['origen'] == 1
+        with self.assertRaises(ValueError):
+            historial.obtener(3)
+
+    def test_linea_incompleta(self):
+        '''
+        Prueba que se ignore una linea escrita a medias.
+        '''
+        historial.registrar(CONTEXTO, self.archivos(b'3'))
+        with open(os.path.join(self.historial, 'historial.jsonl'), 'a') as f:
+            f.write('{"version": 2, "fe')
+        assert [e['version'] for e in historial.listar()] == [1]
+
+    @mock.patch('syslog.syslog')
+    def test_registrar_error(self, mock_syslog):
+        '''
+        Prueba que un error al registrar no interrumpa la aplicacion.
+        '''
+        paths = self.archivos(b'3')
+        open(self.historial, 'w').close()
+        assert historial.registrar(CONTEXTO, paths) is None
+        os.remove(self.historial)
+        assert historial.registrar(CONTEXTO, paths + ['/no/existe']) is None
+        assert mock_syslog.call_count == 2
+
+    def test_compactar(self):
+        '''
+        Prueba que al duplicar la cantidad de versiones a conservar se
+        conserven las ultimas versiones y sus objetos, y que la numeracion
+        continue.
+        '''
+        with mock.patch.object(historial, 'CONSERVAR', 3):
+            for bajada in (b'1', b'2', b'3', b'4', b'5'):
+                historial.registrar(CONTEXTO, self.archivos(bajada))
+            assert len(historial.listar()) == 5
+            historial.registrar(CONTEXTO, self.archivos(b'6'))
+            assert [e['version'] for e in historial.listar()] == [4, 5, 6]
+            assert len(self.objetos()) == 4
+            assert historial.registrar(CONTEXTO, self.archivos(b'1')) == 7
+
+    def test_resumen(self):
+        historial.registrar(CONTEXTO, self.archivos(b'3'))
+        historial.registrar(dict(CONTEXTO, dhcp='si'),
+                            self.archivos(b'3'), origen=1)
+        primera, segunda = historial.listar()
+        assert '192.168.1.122/255.255.255.0 gw 192.168.1.1' in \
+            historial.resumen(primera)
+        assert 'dhcp' in historial.resumen(segunda)
+        assert '(restaura la version 1)' in historial.resumen(segunda)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+import mock
+
+from netcop.configurador import horario
+
+HORARIO = 'lun-vie@08:00-18:00=10/2 vie@18:00-20:00=5/1 dom@22:00-24:00=1/1'
+
+
+def instante(dia, hora, minuto=0, segundo=0):
+    '''
+    Devuelve el instante en hora local del dia de la semana (0 = lunes) de
+    la semana del lunes 1 de enero de 2024.
+    '''
+    return time.mktime((2024, 1, 1 + dia, hora, minuto, segundo, 0, 0, -1))
+
+
+class HorarioTests(unittest.TestCase):
+
+    def test_transiciones(self):
+        '''
+        Prueba que las franjas contiguas se unan y que el domingo a las 24:00
+        se vuelva al perfil base el lunes a las 00:00.
+        '''
+        plan = horario.Planificador(HORARIO, 3, 1)
+        dia = horario.MINUTOS_DIA
+        assert plan.transiciones == [
+            (0, (3.0, 1.0)),
+            (480, (10.0, 2.0)), (1080, (3.0, 1.0)),
+            (dia + 480, (10.0, 2.0)), (dia + 1080, (3.0, 1.0)),
+            (2 * dia + 480, (10.0, 2.0)), (2 * dia + 1080, (3.0, 1.0)),
+            (3 * dia + 480, (10.0, 2.0)), (3 * dia + 1080, (3.0, 1.0)),
+            (4 * dia + 480, (10.0, 2.0)), (4 * dia + 1080, (5.0, 1.0)),
+            (4 * dia + 1200, (3.0, 1.0)),
+            (6 * dia + 1320, (1.0, 1.0)),
+        ]
+
+    def test_transicion_unica(self):
+        '''
+        Prueba que una franja que cubre la semana completa no genere
+        transiciones redundantes.
+        '''
+        plan = horario.Planificador('lun-dom@00:00-24:00=10/2', 3, 1)
+        assert plan.transiciones == [(0, (10.0, 2.0))]
+        assert plan.perfil(instante(3, 12)) == (10.0, 2.0)
+        plan = horario.Planificador('lun@00:00-12:00=10/2', 3, 1)
+        assert plan.transiciones == [(0, (10.0, 2.0)), (720, (3.0, 1.0))]
+        assert plan.perfil(instante(6, 23, 59)) == (3.0, 1.0)
+
+    def test_perfil(self):
+        plan = horario.Planificador(HORARIO, 3, 1)
+        assert plan.perfil(instante(0, 7, 59, 59)) == (3.0, 1.0)
+        assert plan.perfil(instante(0, 8)) == (10.0, 2.0)
+        assert plan.perfil(instante(4, 19, 30)) == (5.0, 1.0)
+        assert plan.perfil(instante(5, 12)) == (3.0, 1.0)
+        assert plan.perfil(instante(6, 23, 30)) == (1.0, 1.0)
+
+    def test_siguiente(self):
+        plan = horario.Planificador(HORARIO, 3, 1)
+        assert plan.siguiente(instante(0, 7, 59, 30)) == 30
+        assert plan.siguiente(instante(0, 8)) == 10 * 3600
+        # la franja del domingo termina a las 0 del lunes siguiente
+        assert plan.siguiente(instante(6, 23)) == 3600
+        assert horario.Planificador('', 3, 1).siguiente() is None
+
+    @mock.patch('netcop.configurador.horario.bisect.bisect_right')
+    def test_perfil_constante(self, mock_bisect):
+        '''
+        Prueba que entre transiciones el perfil activo no se vuelva a
+        buscar.
+        '''
+        mock_bisect.return_value = 2
+        plan = horario.Planificador(HORARIO, 3, 1)
+        for minuto in range(0, 600, 5):
+            assert plan.perfil(instante(0, 8, 0, minuto)) == (10.0, 2.0)
+        assert mock_bisect.call_count == 1
+
+    def test_perfil_contexto(self):
+        contexto = {'bajada': '3', 'subida': '1'}
+        assert horario.perfil_contexto(contexto) == (3.0, 1.0)
+        contexto['horario'] = HORARIO
+        assert horario.perfil_contexto(contexto, instante(1, 9)) == \
+            (10.0, 2.0)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import socket
+import struct
+import unittest
+
+from netcop.configurador import netlink
+
+
+def ruta(gateway, interfaz, seq=netlink.SEQ_RUTA):
+    payload = netlink.RTMSG.pack(socket.AF_INET, 32, 0, 0, 254, 0, 0, 1, 0)
+    payload += netlink.atributo(netlink.RTA_DST, socket.inet_aton('8.8.8.8'))
+    if gateway:
+        payload += netlink.atributo(netlink.RTA_GATEWAY,
+                                    socket.inet_aton(gateway))
+    payload += netlink.atributo(netlink.RTA_OIF, struct.pack('=i', interfaz))
+    return netlink.mensaje(netlink.RTM_NEWROUTE, 0, seq, payload)
+
+
+def direccion(interfaz, ip, prefijo, flags=0):
+    payload = netlink.IFADDRMSG.pack(socket.AF_INET, prefijo, flags, 0,
+                                     interfaz)
+    payload += netlink.atributo(netlink.IFA_ADDRESS, socket.inet_aton(ip))
+    payload += netlink.atributo(netlink.IFA_LOCAL, socket.inet_aton(ip))
+    return netlink.mensaje(netlink.RTM_NEWADDR, 2, netlink.SEQ_DIRECCIONES,
+                           payload)
+
+
+def fin():
+    return netlink.mensaje(netlink.NLMSG_DONE, 2, netlink.SEQ_DIRECCIONES,
+                           struct.pack('=i', 0))
+
+
+class NetlinkTests(unittest.TestCase):
+
+    def test_solicitud(self):
+        '''
+        Prueba que la solicitud contenga la consulta de ruta y el dump de
+        direcciones en un mismo datagrama.
+        '''
+        mensajes = netlink.parsear_mensajes(netlink.solicitud())
+        assert [(t, s) for t, s, _ in mensajes] == [
+            (netlink.RTM_GETROUTE, netlink.SEQ_RUTA),
+            (netlink.RTM_GETADDR, netlink.SEQ_DIRECCIONES),
+        ]
+        attrs = netlink.parsear_atributos(mensajes[0][2][netlink.RTMSG.size:])
+        assert socket.inet_ntoa(attrs[netlink.RTA_DST]) == '8.8.8.8'
+
+    def test_respuesta(self):
+        '''
+        Prueba el procesamiento de la respuesta del kernel. Se debe elegir la
+        direccion primaria de la interfaz de salida.
+        '''
+        respuesta = netlink.Respuesta()
+        respuesta.procesar(ruta('172.18.124.129', 7))
+        assert not respuesta.completa
+        respuesta.procesar(direccion(1, '127.0.0.1', 8) +
+                           direccion(7, '172.18.124.200', 25,
+                                     netlink.IFA_F_SECONDARY) +
+                           direccion(7, '172.18.124.189', 25))
+        respuesta.procesar(fin())
+        assert respuesta.completa
+        assert respuesta.resultado() == ('172.18.124.129', '172.18.124.189',
+                                         25)
+
+    def test_respuesta_sin_gateway(self):
+        '''
+        Prueba el tratamiento de errores cuando no hay ruta por defecto.
+        '''
+        respuesta = netlink.Respuesta()
+        respuesta.procesar(ruta(None, 7) + direccion(7, '10.0.0.1', 8) +
+                           fin())
+        with self.assertRaises(ValueError):
+            respuesta.resultado()
+
+    def test_respuesta_error(self):
+        '''
+        Prueba el tratamiento de errores informados por el kernel.
+        '''
+        respuesta = netlink.Respuesta()
+        error = netlink.mensaje(netlink.NLMSG_ERROR, 0, netlink.SEQ_RUTA,
+                                struct.pack('=i', -101))
+        with self.assertRaises(OSError):
+            respuesta.procesar(error)
+
+    def test_consultar(self):
+        '''
+        Prueba la consulta real al kernel.
+        '''
+        try:
+            gateway, ip, prefijo = netlink.consultar()
+        except (socket.error, OSError, ValueError) as e:
+            self.skipTest('netlink no disponible: %s' % e)
+        socket.inet_aton(gateway)
+        socket.inet_aton(ip)
+        assert 0 <= prefijo <= 32
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+
+from netcop.configurador import plantillas
+
+
+class PlantillasTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        os.chmod(self.directorio, 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.directorio)
+
+    def test_obtener_entorno(self):
+        '''
+        Prueba que el entorno se cree una unica vez por proceso.
+        '''
+        with mock.patch.multiple(plantillas, _entorno=None,
+                                 DIRECTORIO_CACHE=self.directorio):
+            entorno = plantillas.obtener_entorno()
+            assert plantillas.obtener_entorno() is entorno
+            template = plantillas.obtener_template('resolv.jinja')
+            assert plantillas.obtener_template('resolv.jinja') is template
+
+    def test_crear_entorno_cache(self):
+        '''
+        Prueba que el codigo compilado de los templates se guarde en la cache.
+        '''
+        entorno = plantillas.crear_entorno(directorio_cache=self.directorio)
+        assert not entorno.auto_reload
+        assert entorno.bytecode_cache is not None
+        entorno.get_template('br0.jinja')
+        assert os.listdir(self.directorio)
+        # otro proceso reutiliza el codigo compilado
+        entorno = plantillas.crear_entorno(directorio_cache=self.directorio)
+        with mock.patch.object(entorno, 'compile') as mock_compile:
+            template = entorno.get_template('br0.jinja')
+            mock_compile.assert_not_called()
+        assert 'iface br0 inet dhcp' in template.render(dhcp='si')
+
+    def test_crear_entorno_cache_insegura(self):
+        '''
+        Prueba que no se utilice una cache en la que otros usuarios puedan
+        escribir.
+        '''
+        os.chmod(self.directorio, 0o777)
+        entorno = plantillas.crear_entorno(directorio_cache=self.directorio)
+        assert entorno.bytecode_cache is None
+
+    def test_crear_entorno_debug(self):
+        '''
+        Prueba que en modo debug se utilicen los templates desde su codigo
+        fuente.
+        '''
+        entorno = plantillas.crear_entorno(debug=True,
+                                           directorio_cache=self.directorio)
+        assert entorno.auto_reload
+        assert entorno.bytecode_cache is None
+
+    def test_modo_debug(self):
+        '''
+        Prueba la variable de entorno que activa el modo debug.
+        '''
+        with mock.patch.dict(os.environ, {plantillas.VARIABLE_DEBUG: '1'}):
+            assert plantillas.modo_debug()
+        with mock.patch.dict(os.environ, {plantillas.VARIABLE_DEBUG: '0'}):
+            assert not plantillas.modo_debug()
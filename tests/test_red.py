@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+
+from netcop.configurador import red
+
+ESTATICA = {
+    'ip': '192.168.1.122',
+    'mascara': '255.255.255.0',
+    'gateway': '192.168.1.1',
+    'dhcp': False,
+    'puertos': set(['eth0', 'eth1']),
+}
+
+
+def contexto(**valores):
+    contexto = {'outside': 'eth0', 'inside': 'eth1', 'ip': '192.168.1.122',
+                'mascara': '255.255.255.0', 'gateway': '192.168.1.1'}
+    contexto.update(valores)
+    return contexto
+
+
+class RedTests(unittest.TestCase):
+
+    def test_get_prefijo(self):
+        assert red.get_prefijo('255.255.255.0') == 24
+        assert red.get_prefijo('255.255.128.0') == 17
+
+    def test_sin_cambios(self):
+        assert red.calcular_delta(ESTATICA, contexto()) == []
+
+    def test_cambio_direccion(self):
+        '''
+        Prueba el cambio de direccion. La nueva direccion se agrega antes de
+        quitar la anterior, para que el bridge no quede sin direccion, y se
+        vuelve a agregar la ruta por defecto porque el kernel la elimina al
+        quitar la direccion anterior.
+        '''
+        comandos = red.calcular_delta(ESTATICA, contexto(
+            ip='192.168.1.10', mascara='255.255.0.0'))
+        assert comandos == [
+            ['sysctl', '-q', '-w', 'net.ipv4.conf.br0.promote_secondaries=1'],
+            ['ip', 'addr', 'replace', '192.168.1.10/16', 'dev', 'br0'],
+            ['ip', 'addr', 'del', '192.168.1.122/24', 'dev', 'br0'],
+            ['ip', 'route', 'replace', 'default', 'via', '192.168.1.1',
+             'dev', 'br0'],
+        ]
+
+    def test_cambio_gateway(self):
+        comandos = red.calcular_delta(ESTATICA, contexto(
+            gateway='192.168.1.254'))
+        assert comandos == [
+            ['ip', 'route', 'replace', 'default', 'via', '192.168.1.254',
+             'dev', 'br0'],
+        ]
+
+    def test_estatica_a_dhcp(self):
+        comandos = red.calcular_delta(ESTATICA, contexto(dhcp='si'))
+        assert comandos[0] == ['ip', 'addr', 'del', '192.168.1.122/24',
+                               'dev', 'br0']
+        assert comandos[1][0] == 'dhclient'
+        assert comandos[1][-2:] == ['-1', 'br0']
+        # si el cliente DHCP ya se esta ejecutando no hay cambios
+        actual = dict(ESTATICA, dhcp=True)
+        assert red.calcular_delta(actual, contexto(dhcp='SI')) == []
+
+    def test_dhcp_a_estatica(self):
+        actual = dict(ESTATICA, dhcp=True, ip='192.168.1.50')
+        comandos = red.calcular_delta(actual, contexto(dhcp='no'))
+        assert comandos[0][0] == 'dhclient'
+        assert comandos[0][-2:] == ['-x', 'br0']
+        assert comandos[1:] == [
+            ['sysctl', '-q', '-w', 'net.ipv4.conf.br0.promote_secondaries=1'],
+            ['ip', 'addr', 'replace', '192.168.1.122/24', 'dev', 'br0'],
+            ['ip', 'addr', 'del', '192.168.1.50/24', 'dev', 'br0'],
+            ['ip', 'route', 'replace', 'default', 'via', '192.168.1.1',
+             'dev', 'br0'],
+        ]
+
+    def test_cambio_puertos(self):
+        '''
+        Prueba que el cambio de interfaces del bridge requiera reiniciar.
+        '''
+        with self.assertRaises(RuntimeError):
+            red.calcular_delta(ESTATICA, contexto(outside='eth2'))
+        with self.assertRaises(RuntimeError):
+            red.calcular_delta(dict(ESTATICA, puertos=None), contexto())
+
+    def test_cambio_vlans(self):
+        '''
+        Prueba que el cambio de VLAN o bridges adicionales requiera reiniciar.
+        '''
+        actual = dict(ESTATICA, vlans=set(['eth0.10', 'eth1.10']),
+                      puentes={'br1': set(['eth0.10', 'eth1.10'])})
+        nuevo = contexto(vlans='eth0.10 eth1.10',
+                         puentes='br1:eth0.10,eth1.10')
+        assert red.calcular_delta(actual, nuevo) == []
+        with self.assertRaises(RuntimeError):
+            red.calcular_delta(actual, contexto(vlans='eth0.10 eth1.10'))
+        with self.assertRaises(RuntimeError):
+            red.calcular_delta(ESTATICA, nuevo)
+
+    def test_vlans_actuales(self):
+        directorio = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directorio, 'config')
+            with open(path, 'w') as f:
+                f.write('VLAN Dev name    | VLAN ID\n'
+                        'Name-Type: VLAN_NAME_TYPE_RAW_PLUS_VID_NO_PAD\n'
+                        'eth0.10        | 10  | eth0\n'
+                        'eth1.10        | 10  | eth1\n')
+            with mock.patch.object(red, 'VLANS', path):
+                assert red.vlans_actuales() == set(['eth0.10', 'eth1.10'])
+            with mock.patch.object(red, 'VLANS', '/no/existe'):
+                assert red.vlans_actuales() == set()
+        finally:
+            shutil.rmtree(directorio)
+
+    @mock.patch('subprocess.call')
+    @mock.patch('netcop.configurador.red.estado_actual')
+    def test_aplicar(self, mock_estado, mock_call):
+        mock_estado.return_value = dict(ESTATICA)
+        mock_call.return_value = 0
+        acciones = red.aplicar(contexto(gateway='192.168.1.254'))
+        assert acciones == [
+            'ip route replace default via 192.168.1.254 dev br0']
+        mock_call.assert_called_once_with(
+            ['ip', 'route', 'replace', 'default', 'via', '192.168.1.254',
+             'dev', 'br0'])
+
+    @mock.patch('subprocess.call')
+    @mock.patch('netcop.configurador.red.estado_actual')
+    def test_aplicar_error(self, mock_estado, mock_call):
+        '''
+        Prueba que se detenga en el primer comando que falla.
+        '''
+        mock_estado.return_value = dict(ESTATICA)
+        mock_call.return_value = 2
+        with self.assertRaises(RuntimeError):
+            red.aplicar(contexto(ip='192.168.1.10'))
+        assert mock_call.call_count == 1
+        mock_estado.side_effect = AttributeError
+        with self.assertRaises(RuntimeError):
+            red.aplicar(contexto())
+
+    def test_dhcp_activo(self):
+        directorio = tempfile.mkdtemp()
+        try:
+            pidfile = os.path.join(directorio, 'dhclient.br0.pid')
+            with mock.patch.object(red, 'DHCLIENT_PID', pidfile):
+                assert not red.dhcp_activo()
+                with open(pidfile, 'w') as f:
+                    f.write('%d\n' % os.getpid())
+                assert red.dhcp_activo()
+        finally:
+            shutil.rmtree(directorio)
+
+    def test_puertos_bridge(self):
+        with mock.patch.object(red, 'PUERTOS_BRIDGE', '/no/existe'):
+            assert red.puertos_bridge() is None
+
+    def test_delta_ajustes(self):
+        '''
+        Prueba que solo se modifiquen los ajustes que difieren de los
+        actuales y que no se modifiquen los que no se pudieron leer.
+        '''
+        puerto = {'mtu': 1500, 'txqueuelen': 1000,
+                  'offloads': {'gro': True, 'tso': False},
+                  'anillos': {'rx': 256, 'tx': 256}}
+        ajustes = {'stp': True, 'forward_delay': 1500,
+                   'puertos': {'eth0': puerto, 'eth1': dict(puerto, mtu=None)}}
+        actual = dict(ESTATICA, ajustes=ajustes)
+        comandos = red.calcular_delta(actual, contexto(
+            mtu='9000', offloads='gro=off,gso=off,tso=off',
+            anillos='rx=256,tx=512'))
+        assert comandos == [
+            ['ip', 'link', 'set', 'dev', 'br0', 'type', 'bridge',
+             'stp_state', '0', 'forward_delay', '0'],
+            ['ip', 'link', 'set', 'dev', 'eth0', 'mtu', '9000'],
+            ['ethtool', '-K', 'eth0', 'gro', 'off'],
+            ['ethtool', '-G', 'eth0', 'tx', '512'],
+            ['ethtool', '-K', 'eth1', 'gro', 'off'],
+            ['ethtool', '-G', 'eth1', 'tx', '512'],
+        ]
+        ajustes.update(stp=False, forward_delay=0)
+        assert red.calcular_delta(actual, contexto(perfil_red='kernel')) == []
+
+    @mock.patch('netcop.configurador.red.ethtool')
+    def test_ajustes_actuales(self, mock_ethtool):
+        '''
+        Prueba la lectura de los offloads y colas, omitiendo los offloads
+        que la placa no permite modificar.
+        '''
+        mock_ethtool.side_effect = lambda opcion, interfaz: {
+            '-k': 'Features for eth0:\n'
+                  'rx-checksumming: on\n'
+                  'generic-receive-offload: on\n'
+                  'large-receive-offload: off [fixed]\n'
+                  'tx-tcp-segmentation: on\n',
+            '-g': 'Ring parameters for eth0:\n'
+                  'Pre-set maximums:\n'
+                  'RX:\t\t4096\n'
+                  'TX:\t\t4096\n'
+                  'Current hardware settings:\n'
+                  'RX:\t\t256\n'
+                  'RX Mini:\tn/a\n'
+                  'TX:\t\t512\n',
+        }[opcion]
+        with mock.patch.object(red, 'AJUSTES_BRIDGE', '/no/existe'):
+            ajustes = red.ajustes_actuales(['eth0'])
+        assert ajustes['stp'] is None
+        assert ajustes['puertos']['eth0']['offloads'] == {'rx': True,
+                                                          'gro': True}
+        assert ajustes['puertos']['eth0']['anillos'] == {'rx': 256, 'tx': 512}
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import os
+import stat
+import shutil
+import tempfile
+import threading
+import unittest
+import mock
+
+from netcop.configurador import servidor
+
+
+class ServidorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.path = os.path.join(self.directorio, 'configurador.sock')
+        self.servidor = servidor.crear_servidor(self.path, grupo=None)
+        self.hilo = threading.Thread(target=self.servidor.serve_forever)
+        self.hilo.daemon = True
+        self.hilo.start()
+
+    def tearDown(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        shutil.rmtree(self.directorio)
+
+    def test_permisos(self):
+        '''
+        Prueba que el socket solo pueda ser utilizado por el duenio y su
+        grupo.
+        '''
+        modo = stat.S_IMODE(os.stat(self.path).st_mode)
+        assert modo == servidor.PERMISOS
+
+    @mock.patch('netcop.configurador.configurador.obtener_config')
+    def test_consultar(self, mock_config):
+        '''
+        Prueba la consulta de la configuracion aplicada.
+        '''
+        mock_config.return_value = {'ip': '192.168.1.253', 'dhcp': 'no',
+                                    'dns1': '192.168.1.1'}
+        config = servidor.consultar(self.path)
+        assert config == {'ip': '192.168.1.253', 'dhcp': 'no',
+                          'dns1': '192.168.1.1'}
+        mock_config.assert_called_with(usar_cache=True)
+
+    @mock.patch('syslog.syslog')
+    @mock.patch('netcop.configurador.configurador.obtener_config')
+    def test_consultar_error(self, mock_config, mock_syslog):
+        '''
+        Prueba que los errores se informen al cliente.
+        '''
+        mock_config.side_effect = IOError('/etc/resolv.conf')
+        with self.assertRaises(RuntimeError):
+            servidor.consultar(self.path)
+
+    @mock.patch('netcop.configurador.configurador.obtener_config')
+    def test_consultas_concurrentes(self, mock_config):
+        '''
+        Prueba que una consulta lenta no bloquee a las demas.
+        '''
+        iniciada = threading.Event()
+        liberar = threading.Event()
+        llamadas = []
+
+        def obtener_config(usar_cache):
+            llamadas.append(True)
+            if len(llamadas) == 1:
+                iniciada.set()
+                liberar.wait(5)
+            return {'bajada': str(len(llamadas))}
+
+        mock_config.side_effect = obtener_config
+        lenta = threading.Thread(target=servidor.consultar, args=(self.path,))
+        lenta.daemon = True
+        lenta.start()
+        assert iniciada.wait(2)
+        try:
+            assert servidor.consultar(self.path, timeout=2) == {'bajada': '2'}
+        finally:
+            liberar.set()
+            lenta.join(5)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import time
+import socket
+import struct
+import threading
+import unittest
+
+from netcop.configurador import sondeo
+
+
+class ServidorDNS(threading.Thread):
+    '''
+    Servidor de nombres de prueba que responde cada consulta con la demora
+    indicada, o no responde si la demora es None.
+    '''
+
+    def __init__(self, direccion, puerto, demora):
+        super(ServidorDNS, self).__init__()
+        self.daemon = True
+        self.demora = demora
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((direccion, puerto))
+        self.sock.settimeout(0.05)
+        self.puerto = self.sock.getsockname()[1]
+        self.detener = threading.Event()
+
+    def run(self):
+        while not self.detener.is_set():
+            try:
+                datos, origen = self.sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            if self.demora is None:
+                continue
+            time.sleep(self.demora)
+            identificador = struct.unpack('!H', datos[:2])[0]
+            respuesta = struct.pack('!HHHHHH', identificador, 0x8180, 1, 0,
+                                    0, 0) + datos[12:]
+            self.sock.sendto(respuesta, origen)
+
+    def cerrar(self):
+        self.detener.set()
+        self.join(1)
+        self.sock.close()
+
+
+class SondeoTests(unittest.TestCase):
+
+    def setUp(self):
+        self.servidores = []
+
+    def tearDown(self):
+        for servidor in self.servidores:
+            servidor.cerrar()
+
+    def iniciar(self, *demoras):
+        '''
+        Inicia un servidor de prueba por demora en 127.0.0.2, 127.0.0.3,
+        etc., todos en el mismo puerto. Devuelve el puerto.
+        '''
+        puerto = 0
+        for i, demora in enumerate(demoras):
+            servidor = ServidorDNS('127.0.0.%d' % (i + 2), puerto, demora)
+            puerto = servidor.puerto
+            servidor.start()
+            self.servidores.append(servidor)
+        return puerto
+
+    def test_es_respuesta(self):
+        consulta = sondeo.consulta(7)
+        assert not sondeo.es_respuesta(consulta, 7)
+        respuesta = struct.pack('!HH', 7, 0x8180) + consulta[4:]
+        assert sondeo.es_respuesta(respuesta, 7)
+        assert not sondeo.es_respuesta(respuesta, 8)
+        servfail = struct.pack('!HH', 7, 0x8182) + consulta[4:]
+        assert not sondeo.es_respuesta(servfail, 7)
+
+    def test_ordenar_por_latencia(self):
+        '''
+        Prueba que el servidor rapido pase a ser el primario.
+        '''
+        puerto = self.iniciar(0.08, 0)
+        valores = sondeo.ordenar_contexto(
+            {'dns1': '127.0.0.2', 'dns2': '127.0.0.3'}, puerto=puerto)
+        assert valores == {'dns1': '127.0.0.3', 'dns2': '127.0.0.2',
+                           'dns_opciones': sondeo.OPCIONES}
+
+    def test_latencias_similares(self):
+        '''
+        Prueba que con latencias similares se respete el orden y se rote.
+        '''
+        puerto = self.iniciar(0, 0)
+        valores = sondeo.ordenar_contexto(
+            {'dns1': '127.0.0.2', 'dns2': '127.0.0.3'}, puerto=puerto)
+        assert (valores['dns1'], valores['dns2']) == ('127.0.0.2',
+                                                      '127.0.0.3')
+        assert valores['dns_opciones'].endswith(' rotate')
+
+    def test_sin_respuesta(self):
+        '''
+        Prueba que el servidor que no responde pase al final sin esperar
+        mas que el tiempo maximo de cada ronda.
+        '''
+        puerto = self.iniciar(None, 0.01)
+        inicio = time.time()
+        latencias = sondeo.medir(['127.0.0.2', '127.0.0.3'], muestras=2,
+                                 timeout=0.2, puerto=puerto)
+        assert time.time() - inicio < 1
+        assert latencias['127.0.0.2'] == []
+        assert len(latencias['127.0.0.3']) == 2
+        assert sondeo.ordenar(['127.0.0.2', '127.0.0.3'], latencias) == \
+            (['127.0.0.3', '127.0.0.2'], False)
+
+    def test_ordenar(self):
+        latencias = {'a': [0.01, 0.5, 0.02], 'b': [0.03, 0.03, 0.03],
+                     'c': [0.001]}
+        assert sondeo.ordenar(['c', 'b', 'a'], latencias) == \
+            (['a', 'b', 'c'], False)
+        assert sondeo.ordenar(['a'], latencias) == (['a'], False)
+        assert sondeo.ordenar(['x', 'y'], {}) == (['x', 'y'], False)
+
+    def test_sin_servidores(self):
+        assert sondeo.ordenar_contexto({'dhcp': 'si'}) == {}
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+
+from netcop.configurador import sysctl
+
+
+class SysctlTests(unittest.TestCase):
+
+    def test_potencia_de_2(self):
+        assert sysctl.potencia_de_2(1) == 1
+        assert sysctl.potencia_de_2(1000) == 1024
+        assert sysctl.potencia_de_2(1024) == 1024
+        assert sysctl.potencia_de_2(1024.5) == 2048
+
+    @mock.patch('netcop.configurador.sysctl.congestion')
+    def test_calcular(self, mock_congestion):
+        '''
+        Prueba que los ajustes crezcan con la velocidad y los hosts sin bajar
+        de los valores del kernel ni superar los maximos.
+        '''
+        mock_congestion.return_value = 'bbr'
+        ajustes = dict(sysctl.calcular(2, 1, hosts=10))
+        assert ajustes['net.netfilter.nf_conntrack_max'] == \
+            sysctl.CONNTRACK_MIN
+        assert ajustes['net.netfilter.nf_conntrack_buckets'] == 16384
+        assert ajustes['net.core.netdev_max_backlog'] == sysctl.BACKLOG_MIN
+        assert ajustes['net.core.rmem_max'] == sysctl.BUFFER_MIN
+        assert ajustes['net.ipv4.tcp_congestion_control'] == 'bbr'
+        ajustes = dict(sysctl.calcular(1000, 100, hosts=500))
+        assert ajustes['net.netfilter.nf_conntrack_max'] == 524288
+        assert ajustes['net.core.netdev_max_backlog'] == 1024
+        # 1000 Mbit/s * 100 ms = 12.5 MB
+        assert ajustes['net.core.rmem_max'] == 32 * 1024 * 1024
+        assert ajustes['net.core.wmem_max'] == 4 * 1024 * 1024
+        assert ajustes['net.ipv4.tcp_wmem'] == '4096 16384 4194304'
+        ajustes = dict(sysctl.calcular(100000, 100000, hosts=65535))
+        assert ajustes['net.netfilter.nf_conntrack_max'] == \
+            sysctl.CONNTRACK_MAX
+        assert ajustes['net.core.netdev_max_backlog'] == sysctl.BACKLOG_MAX
+        assert ajustes['net.core.rmem_max'] == sysctl.BUFFER_MAX
+        ajustes = dict(sysctl.calcular(10, 2, algoritmo='cubic'))
+        assert ajustes['net.ipv4.tcp_congestion_control'] == 'cubic'
+        assert mock_congestion.call_count == 3
+
+    def test_velocidades_maximas(self):
+        '''
+        Prueba que se consideren las franjas del horario semanal.
+        '''
+        contexto = {'bajada': '10', 'subida': '5',
+                    'horario': 'sab,dom@00:00-24:00=50/2'}
+        assert sysctl.velocidades_maximas(contexto) == (50.0, 5.0)
+        del contexto['horario']
+        assert sysctl.velocidades_maximas(contexto) == (10.0, 5.0)
+
+    def test_congestion(self):
+        '''
+        Prueba que se elija BBR si esta cargado o existe el modulo.
+        '''
+        directorio = tempfile.mkdtemp()
+        try:
+            disponibles = os.path.join(directorio, 'disponibles')
+            with open(disponibles, 'w') as f:
+                f.write('reno cubic\n')
+            modulos = os.path.join(directorio, 'modules')
+            with mock.patch.multiple(sysctl,
+                                     CONGESTION_DISPONIBLES=disponibles,
+                                     MODULOS=modulos):
+                assert sysctl.congestion() == 'cubic'
+                ipv4 = os.path.join(modulos, os.uname()[2], 'kernel', 'net',
+                                    'ipv4')
+                os.makedirs(ipv4)
+                open(os.path.join(ipv4, 'tcp_bbr.ko.xz'), 'w').close()
+                assert sysctl.congestion() == 'bbr'
+            with open(disponibles, 'w') as f:
+                f.write('reno cubic bbr\n')
+            assert sysctl.congestion_disponible('bbr', path=disponibles,
+                                                modulos='/no/existe')
+        finally:
+            shutil.rmtree(directorio)
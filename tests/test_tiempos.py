@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import shutil
+import syslog
+import tempfile
+import unittest
+from mock import patch
+
+from netcop.configurador import tiempos
+
+
+class TiemposTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.resumen = os.path.join(self.directorio, 'tiempos.json')
+
+    def tearDown(self):
+        tiempos.terminar()
+        shutil.rmtree(self.directorio)
+
+    def test_fase_sin_medicion(self):
+        '''
+        Prueba que sin una medicion en curso no se registren fases.
+        '''
+        assert tiempos.fase('validar') is tiempos.FASE_NULA
+        assert tiempos.terminar() == []
+
+    def test_medir_fases(self):
+        '''
+        Prueba que se registren las fases en orden y el total.
+        '''
+        tiempos.iniciar()
+        with tiempos.fase('leer_temporal'):
+            pass
+        with tiempos.fase('validar'):
+            pass
+        fases = tiempos.terminar()
+        assert [nombre for nombre, _ in fases] == ['leer_temporal', 'validar',
+                                                   'total']
+        assert all(segundos >= 0 for _, segundos in fases)
+        assert fases[-1][1] >= fases[0][1] + fases[1][1]
+        assert tiempos.fase('validar') is tiempos.FASE_NULA
+
+    def test_fase_repetida(self):
+        '''
+        Prueba que las fases repetidas acumulen su duracion.
+        '''
+        cronometro = tiempos.iniciar()
+        cronometro.agregar('escribir', 0.5)
+        cronometro.agregar('validar', 0.25)
+        cronometro.agregar('escribir', 0.125)
+        fases = tiempos.terminar()
+        assert fases[:2] == [('escribir', 0.625), ('validar', 0.25)]
+
+    def test_iterar(self):
+        '''
+        Prueba que se mida un generador sin consumirlo por adelantado.
+        '''
+        generados = []
+
+        def generador():
+            for bloque in (b'a', b'b'):
+                generados.append(bloque)
+                yield bloque
+
+        tiempos.iniciar()
+        iterador = tiempos.iterar('renderizar', generador())
+        assert generados == []
+        assert next(iterador) == b'a'
+        assert generados == [b'a']
+        assert list(iterador) == [b'b']
+        assert [nombre for nombre, _ in tiempos.terminar()] == [
+            'renderizar', 'total']
+
+    def test_fase_con_error(self):
+        '''
+        Prueba que la fase se registre aunque lance una excepcion.
+        '''
+        tiempos.iniciar()
+        with self.assertRaises(ValueError):
+            with tiempos.fase('validar'):
+                raise ValueError
+        assert tiempos.terminar()[0][0] == 'validar'
+
+    def test_monotonic(self):
+        assert tiempos.monotonic() <= tiempos.monotonic()
+
+    def test_percentil(self):
+        valores = list(range(1, 101))
+        assert tiempos.percentil(valores, 50) == 50
+        assert tiempos.percentil(valores, 95) == 95
+        assert tiempos.percentil(valores, 100) == 100
+        assert tiempos.percentil([7], 95) == 7
+
+    @patch('syslog.syslog')
+    def test_registrar(self, mock_syslog):
+        '''
+        Prueba que los tiempos se registren en un unico mensaje en ms.
+        '''
+        tiempos.registrar([('validar', 0.0015), ('total', 0.25)])
+        assert mock_syslog.call_count == 1
+        prioridad, mensaje = mock_syslog.call_args[0]
+        assert prioridad == syslog.LOG_INFO
+        valores = json.loads(mensaje.split(': ', 1)[1])
+        assert valores == {'validar': 1.5, 'total': 250.0}
+
+    def test_actualizar_resumen(self):
+        '''
+        Prueba el resumen de varias ejecuciones y el limite de muestras.
+        '''
+        with patch.object(tiempos, 'MUESTRAS', 3):
+            for segundos in (0.004, 0.001, 0.003, 0.002):
+                tiempos.actualizar_resumen([('validar', segundos)],
+                                           self.resumen)
+        with open(self.resumen) as f:
+            resumen = json.load(f)
+        assert resumen['validar'] == {
+            'cantidad': 4,
+            'muestras': [1.0, 3.0, 2.0],
+            'p50': 2.0,
+            'p95': 3.0,
+            'max': 3.0,
+        }
+
+    @patch('syslog.syslog')
+    def test_actualizar_resumen_error(self, mock_syslog):
+        '''
+        Prueba que los errores al escribir el resumen no interrumpan.
+        '''
+        path = os.path.join(self.directorio, 'archivo', 'tiempos.json')
+        open(os.path.join(self.directorio, 'archivo'), 'w').close()
+        resumen = tiempos.actualizar_resumen([('total', 0.1)], path)
+        assert resumen['total']['cantidad'] == 1
+        assert mock_syslog.call_args[0][0] == syslog.LOG_WARNING
+
+    @patch('syslog.syslog')
+    def test_medicion(self, mock_syslog):
+        '''
+        Prueba que la medicion registre y guarde los tiempos al terminar.
+        '''
+        with patch.object(tiempos, 'RESUMEN', self.resumen):
+            with tiempos.medicion():
+                with tiempos.fase('validar'):
+                    pass
+        assert mock_syslog.call_count == 1
+        with open(self.resumen) as f:
+            assert sorted(json.load(f)) == ['total', 'validar']
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from netcop.configurador import validacion
+
+
+class ValidacionTests(unittest.TestCase):
+
+    def parametros(self, **kwargs):
+        parametros = {
+            'ip': '192.168.1.122',
+            'mascara': '255.255.255.0',
+            'gateway': '192.168.1.1',
+            'dns1': '192.168.1.1',
+            'bajada': '3',
+            'subida': '0.5',
+        }
+        parametros.update(kwargs)
+        return parametros
+
+    def test_ip_a_entero(self):
+        '''
+        Prueba la conversion de direcciones IPv4 a entero.
+        '''
+        assert validacion.ip_a_entero('0.0.0.0') == 0
+        assert validacion.ip_a_entero('192.168.1.1') == 0xc0a80101
+        assert validacion.ip_a_entero('255.255.255.255') == 0xffffffff
+        for valor in ('256.1.1.1', '1.1.1', '1.1.1.1.1', '1.1.1.a', '1..1.1',
+                      ' 1.1.1.1', '-1.1.1.1', '0001.1.1.1'):
+            with self.assertRaises(ValueError):
+                validacion.ip_a_entero(valor)
+
+    def test_mascara_contigua(self):
+        '''
+        Prueba que solo se acepten mascaras de subred contiguas.
+        '''
+        assert validacion.mascara_a_entero('255.255.255.0') == 0xffffff00
+        assert validacion.mascara_a_entero('255.255.128.0') == 0xffff8000
+        assert validacion.mascara_a_entero('255.255.255.255') == 0xffffffff
+        for valor in ('255.0.255.0', '1.1.1.1', '255.255.255.1', '0.0.0.0'):
+            with self.assertRaises(ValueError):
+                validacion.mascara_a_entero(valor)
+
+    def test_velocidad_decimal(self):
+        '''
+        Prueba que se acepten anchos de banda con decimales y mayores a cero.
+        '''
+        assert validacion.validar(self.parametros())
+        assert validacion.velocidad('1024') == 1024
+        for valor in ('0', '0.0', '1,5', '.5', '1.', '-1', 'abc'):
+            with self.assertRaises(ValueError):
+                validacion.velocidad(valor)
+
+    def test_gateway_en_subred(self):
+        '''
+        Prueba que el gateway pertenezca a la subred de la ip.
+        '''
+        with self.assertRaises(ValueError):
+            validacion.validar(self.parametros(gateway='192.168.2.1'))
+        with self.assertRaises(ValueError):
+            validacion.validar(self.parametros(gateway='192.168.1.122'))
+        assert validacion.validar(self.parametros(mascara='255.255.0.0',
+                                                  gateway='192.168.2.1'))
+
+    def test_ip_de_host(self):
+        '''
+        Prueba que la ip no sea la direccion de red ni la de broadcast.
+        '''
+        with self.assertRaises(ValueError):
+            validacion.validar(self.parametros(ip='192.168.1.0'))
+        with self.assertRaises(ValueError):
+            validacion.validar(self.parametros(ip='192.168.1.255'))
+
+    def test_todos_los_errores(self):
+        '''
+        Prueba que se informen todos los errores juntos.
+        '''
+        with self.assertRaises(validacion.ErrorValidacion) as contexto:
+            validacion.validar({'dhcp': 'talvez', 'ip': '300.1.1.1',
+                                'dns1': 'x', 'bajada': '10'})
+        errores = contexto.exception.errores
+        assert len(errores) == 5
+        assert 'dhcp talvez: formato invalido' in errores
+        assert 'Debe ingresar ip y mascara de subred' in errores
+        assert 'bajada y subida son obligatorios' in errores
+
+    def test_validar_lote(self):
+        '''
+        Prueba la validacion de un conjunto de configuraciones.
+        '''
+        lote = [
+            self.parametros(),
+            self.parametros(mascara='255.0.255.0'),
+            {'dhcp': 'si', 'bajada': '1024', 'subida': '1024'},
+            {},
+            self.parametros(nombre='equipo', bajda='3'),
+        ]
+        errores = validacion.validar_lote(lote)
+        assert len(errores) == 5
+        assert errores[0] == []
+        assert errores[1] == ['mascara 255.0.255.0: formato invalido']
+        assert errores[2] == []
+        assert errores[3] == ['bajada y subida son obligatorios']
+        assert errores[4] == ['bajda: parametro desconocido',
+                              'nombre: parametro desconocido']
+        assert validacion.validar_lote(lote[4:], permitidas=['nombre']) == [
+            ['bajda: parametro desconocido']]
+
+    def test_vlans(self):
+        '''
+        Prueba la conversion de la lista de subinterfaces VLAN.
+        '''
+        assert validacion.vlans('eth0.10  eth1.4094') == [
+            ('eth0.10', 'eth0', 10), ('eth1.4094', 'eth1', 4094)]
+        for valor in ('eth0', 'eth0.0', 'eth0.4095', 'eth0.x',
+                      'interfazmuylarga.10'):
+            with self.assertRaises(ValueError):
+                validacion.vlans(valor)
+
+    def test_puentes(self):
+        '''
+        Prueba la conversion de la lista de bridges adicionales.
+        '''
+        assert validacion.puentes('br1:eth0.10,eth1.10 br2:eth2') == [
+            ('br1', ['eth0.10', 'eth1.10']), ('br2', ['eth2'])]
+        for valor in ('br1', 'br1:', ':eth0', 'br1:eth0,e/th1'):
+            with self.assertRaises(ValueError):
+                validacion.puentes(valor)
+
+    def test_validar_puentes(self):
+        '''
+        Prueba las reglas de los bridges adicionales.
+        '''
+        assert validacion.validar(self.parametros(
+            vlans='eth0.10 eth1.10', puentes='br1:eth0.10,eth1.10'))
+        with self.assertRaises(validacion.ErrorValidacion) as contexto:
+            validacion.validar(self.parametros(
+                vlans='eth0.10 eth0.10',
+                puentes='br0:eth2 br1:eth0.10,eth0.20 br1:eth0.10'))
+        assert contexto.exception.errores == [
+            'vlans: eth0.10 repetidas',
+            'puentes: bridge br0 repetido; eth0.20 no esta declarada en '
+            'vlans; bridge br1 repetido; eth0.10 pertenece a mas de un '
+            'bridge',
+        ]
+
+    def test_horario(self):
+        '''
+        Prueba la conversion del horario semanal de velocidades.
+        '''
+        assert validacion.horario(
+            'lun-mie,vie@08:00-18:30=10/2 dom@20:00-24:00=0.5/0.5') == [
+            ((0, 1, 2, 4), 480, 1110, 10.0, 2.0),
+            ((6,), 1200, 1440, 0.5, 0.5)]
+        for valor in ('lun@18:00-08:00=1/1', 'vie-lun@00:00-01:00=1/1',
+                      'lun@00:00-24:01=1/1', 'lun@24:00-24:00=1/1',
+                      'lun@08:00-09:00=0/1', 'xyz@08:00-09:00=1/1',
+                      'lun@8:00-9:00=1/1', 'lun@08:00-09:00=1'):
+            with self.assertRaises(ValueError):
+                validacion.horario(valor)
+
+    def test_validar_horario(self):
+        '''
+        Prueba que las franjas del horario no se superpongan.
+        '''
+        assert validacion.validar(self.parametros(
+            horario='lun-vie@08:00-18:00=10/2 vie@18:00-20:00=5/1'))
+        with self.assertRaises(validacion.ErrorValidacion) as contexto:
+            validacion.validar(self.parametros(
+                horario='lun-vie@08:00-18:00=10/2 vie@17:00-20:00=5/1'))
+        assert contexto.exception.errores == [
+            'horario: franjas superpuestas vie@17:00-20:00=5/1 con '
+            'lun-vie@08:00-18:00=10/2']
+
+    def test_validar_cache_dns(self):
+        '''
+        Prueba los parametros de la cache de nombres local.
+        '''
+        assert validacion.validar(self.parametros(
+            cache_dns='si', cache_dns_tamanio='10000',
+            cache_dns_ttl_negativo='0'))
+        with self.assertRaises(validacion.ErrorValidacion) as contexto:
+            validacion.validar(self.parametros(
+                dns1='', cache_dns='si', cache_dns_tamanio='10001',
+                cache_dns_ttl_negativo='-1'))
+        assert contexto.exception.errores == [
+            'cache_dns_tamanio 10001: formato invalido',
+            'cache_dns_ttl_negativo -1: formato invalido',
+            'cache_dns: debe ingresar dns1',
+        ]
+
+    def test_ajustes_red(self):
+        '''
+        Prueba la conversion de los offloads y colas de las placas de red.
+        '''
+        assert validacion.offloads('gro=off,tso=on') == [('gro', False),
+                                                         ('tso', True)]
+        assert validacion.anillos('rx=512,tx=256') == [('rx', 512),
+                                                       ('tx', 256)]
+        for valor in ('gro=no', 'xyz=off', 'gro', ''):
+            with self.assertRaises(ValueError):
+                validacion.offloads(valor)
+        for valor in ('rx=0', 'rx=65537', 'rx-xyz=1', 'rx=abc'):
+            with self.assertRaises(ValueError):
+                validacion.anillos(valor)
+
+    def test_validar_ajustes_red(self):
+        '''
+        Prueba que con STP la demora de reenvio sea de al menos 2 segundos.
+        '''
+        assert validacion.validar(self.parametros(
+            perfil_red='kernel', bridge_stp='si', bridge_fd='2', mtu='9000',
+            txqueuelen='0', offloads='gro=on'))
+        with self.assertRaises(validacion.ErrorValidacion) as contexto:
+            validacion.validar(self.parametros(
+                perfil_red='xyz', bridge_stp='si', bridge_fd='0', mtu='67'))
+        assert contexto.exception.errores == [
+            'perfil_red xyz: formato invalido',
+            'mtu 67: formato invalido',
+            'bridge_fd: con bridge_stp=si debe ser de 2 a 30 segundos',
+        ]
+
+    def test_claves_desconocidas(self):
+        '''
+        Prueba que se rechacen los parametros que no forman parte del
+        esquema, como las opciones de resolv.conf que calcula el
+        configurador.
+        '''
+        with self.assertRaises(validacion.ErrorValidacion) as contexto:
+            validacion.validar(self.parametros(
+                dns_opciones='ndots:1\nnameserver 6.6.6.6'))
+        assert contexto.exception.errores == [
+            'dns_opciones: parametro desconocido']
+        assert validacion.claves_desconocidas(
+            self.parametros(nombre='equipo'), permitidas=['nombre']) == []
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import mock
+
+from netcop.configurador import verificacion
+from tests.test_sondeo import ServidorDNS
+
+ARP = '''IP address       HW type     Flags       HW address            Mask
+192.168.1.1      0x1         0x2         02:fc:00:00:00:05     *        br0
+192.168.1.2      0x1         0x0         00:00:00:00:00:00     *        br0
+'''
+
+
+class VerificacionTests(unittest.TestCase):
+
+    def test_verificar_direccion(self):
+        '''
+        Prueba la verificacion de la direccion sobre la interfaz loopback.
+        '''
+        limite = time.time() + 0.5
+        verificacion.verificar_direccion('127.0.0.1', limite, interfaz='lo')
+        verificacion.verificar_direccion(None, limite, interfaz='lo')
+        with self.assertRaises(RuntimeError):
+            verificacion.verificar_direccion('127.0.0.9', time.time(),
+                                             interfaz='lo')
+
+    def test_vecino_resuelto(self):
+        directorio = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directorio, 'arp')
+            with open(path, 'w') as f:
+                f.write(ARP)
+            assert verificacion.vecino_resuelto('192.168.1.1', path)
+            # consulta ARP sin respuesta
+            assert not verificacion.vecino_resuelto('192.168.1.2', path)
+            assert not verificacion.vecino_resuelto('192.168.1.3', path)
+            assert not verificacion.vecino_resuelto('192.168.1.1',
+                                                    '/no/existe')
+        finally:
+            shutil.rmtree(directorio)
+
+    @mock.patch('netcop.configurador.verificacion.vecino_resuelto')
+    def test_verificar_gateway(self, mock_vecino):
+        mock_vecino.return_value = True
+        verificacion.verificar_gateway('127.0.0.1', time.time())
+        mock_vecino.assert_called_with('127.0.0.1')
+        mock_vecino.return_value = False
+        with self.assertRaises(RuntimeError):
+            verificacion.verificar_gateway('127.0.0.1', time.time() + 0.1)
+
+    def test_verificar_dns(self):
+        '''
+        Prueba la verificacion de servidores de nombres locales, uno de los
+        cuales no responde.
+        '''
+        servidor = ServidorDNS('127.0.0.2', 0, 0)
+        caido = ServidorDNS('127.0.0.3', servidor.puerto, None)
+        servidor.start()
+        caido.start()
+        try:
+            with mock.patch('netcop.configurador.sondeo.PUERTO',
+                            servidor.puerto):
+                limite = time.time() + 0.4
+                verificacion.verificar_dns(['127.0.0.2'], limite)
+                with self.assertRaises(RuntimeError) as error:
+                    verificacion.verificar_dns(['127.0.0.2', '127.0.0.3'],
+                                               limite)
+                assert '127.0.0.3' in str(error.exception)
+                assert '127.0.0.2' not in str(error.exception)
+        finally:
+            servidor.cerrar()
+            caido.cerrar()
+
+    def test_verificaciones(self):
+        limite = time.time()
+        contexto = {'ip': '192.168.1.122', 'gateway': '192.168.1.1',
+                    'dns1': '8.8.8.8', 'dns2': '8.8.4.4'}
+        assert verificacion.verificaciones(contexto, limite) == [
+            (verificacion.verificar_direccion, ('192.168.1.122', limite)),
+            (verificacion.verificar_gateway, ('192.168.1.1', limite)),
+            (verificacion.verificar_dns, (['8.8.8.8', '8.8.4.4'], limite)),
+        ]
+        contexto = {'dhcp': 'si', 'ip': '192.168.1.122'}
+        assert verificacion.verificaciones(contexto, limite) == [
+            (verificacion.verificar_direccion, (None, limite)),
+            (verificacion.verificar_gateway, (None, limite)),
+        ]
+
+    @mock.patch('netcop.configurador.verificacion.verificaciones')
+    def test_verificar(self, mock_verificaciones):
+        '''
+        Prueba que las verificaciones se ejecuten en paralelo y que las que
+        no terminan a tiempo se informen como error.
+        '''
+        def bien(limite):
+            time.sleep(0.1)
+
+        def mal(limite):
+            time.sleep(0.1)
+            raise RuntimeError('sin gateway')
+
+        def colgada(limite):
+            time.sleep(5)
+
+        mock_verificaciones.side_effect = lambda contexto, limite: [
+            (funcion, (limite,)) for funcion in (bien, mal, colgada)]
+        inicio = time.time()
+        errores = verificacion.verificar({}, limite=0.3)
+        assert time.time() - inicio < 1
+        assert errores == ['sin gateway', 'colgada: sin respuesta']
+        mock_verificaciones.side_effect = lambda contexto, limite: [
+            (bien, (limite,)), (bien, (limite,))]
+        inicio = time.time()
+        assert verificacion.verificar({}, limite=1) == []
+        assert time.time() - inicio < 0.19